@@ -2,17 +2,28 @@
 主應用入口
 只負責頁面路由和狀態管理，所有業務邏輯已分離
 """
+import logging
+import time
 import streamlit as st
+from typing import Optional, TYPE_CHECKING
 from config import AppConfig, TAIWAN_CITIES, get_city_display_name
 from database.supabase_client import SupabaseClient
-from api.ai_service import AIService
-from api.wardrobe_service import WardrobeService
-from api.weather_service import WeatherService
-from ui.components.weather_widget import render_weather_widget
-from ui.pages.upload_page import render_upload_page
-from ui.pages.wardrobe_page import render_wardrobe_page
-from ui.pages.recommendation_page import render_recommendation_page
 from ui.styles import render_simple_top_button
+
+# 服務與頁面模組會載入 Gemini SDK、PIL、NumPy 等重量級套件，
+# 延遲到實際使用時才匯入，登入頁面不必等待這些套件載入
+if TYPE_CHECKING:
+    from api.ai_service import AIService
+    from api.tag_cache import TagCache
+    from api.batch_tuner import AdaptiveBatchSizer
+    from api.job_queue import TagJobWorker
+    from utils.image_processing import MontageLayout
+    from utils.image_server import ImageServer
+    from api.wardrobe_service import WardrobeService
+    from api.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
 # 頁面配置
 st.set_page_config(
     page_title="2026 AI 時尚顧問", 
@@ -23,6 +34,117 @@ st.set_page_config(
 # 🔥 關鍵：先渲染 Top 按鈕（使用 components）
 render_simple_top_button()
 
+@st.cache_resource
+def get_tag_cache(db_path: str, use_phash: bool, phash_max_distance: int) -> 'TagCache':
+    """跨 Session 共用的 AI 標籤快取"""
+    from api.tag_cache import TagCache
+    return TagCache(db_path, use_phash=use_phash, phash_max_distance=phash_max_distance)
+
+@st.cache_resource
+def get_batch_sizer(
+    min_size: int,
+    max_size: int,
+    target_seconds: float,
+    max_payload_kb: int
+) -> 'AdaptiveBatchSizer':
+    """跨 Session 共用的批次大小調整器"""
+    from api.batch_tuner import AdaptiveBatchSizer
+    return AdaptiveBatchSizer(
+        min_size=min_size,
+        max_size=max_size,
+        target_seconds=target_seconds,
+        max_payload_bytes=max_payload_kb * 1024
+    )
+
+@st.cache_resource
+def get_tag_job_worker(
+    db_path: str,
+    max_attempts: int,
+    num_threads: int,
+    default_batch_size: int
+) -> 'TagJobWorker':
+    """
+    跨 Session 共用的背景標籤佇列與工作執行緒
+
+    建立時即啟動執行緒；程序設定 (Secrets / 環境變數) 的服務交由背景執行緒建立並登錄，
+    程序重啟前留在佇列的工作不必等使用者開啟上傳頁面就會繼續處理。
+    """
+    from api.job_queue import TagJobQueue, TagJobWorker
+    config = AppConfig.from_secrets() or AppConfig.from_env()
+    default_services = None
+    if config.gemini_api_key and config.supabase_url and config.supabase_key:
+        def default_services():
+            supabase_client = get_supabase_client(config.supabase_url, config.supabase_key)
+            return (
+                build_ai_service(config),
+                get_wardrobe_service(supabase_client, config.supabase_url, config.supabase_key)
+            )
+    worker = TagJobWorker(
+        TagJobQueue(db_path, max_attempts=max_attempts),
+        num_threads=num_threads,
+        default_batch_size=default_batch_size,
+        default_services=default_services
+    )
+    worker.ensure_running()
+    return worker
+
+@st.cache_resource
+def get_image_server(
+    store_dir: str,
+    port: int,
+    public_url: str,
+    max_mb: int,
+    max_age_days: int
+) -> 'ImageServer':
+    """跨 Session 共用的圖片伺服器"""
+    from utils.image_server import ImageServer
+    server = ImageServer(
+        store_dir,
+        port=port,
+        public_url=public_url,
+        max_bytes=max_mb * 1024 * 1024,
+        max_age_seconds=max_age_days * 86400
+    )
+    server.start()
+    return server
+
+@st.cache_resource(max_entries=4)
+def get_supabase_client(url: str, key: str) -> SupabaseClient:
+    """依連線設定共用的 Supabase 客戶端（設定變更時自動建立新的實例）"""
+    return SupabaseClient(url, key)
+
+@st.cache_resource(
+    max_entries=4,
+    hash_funcs={
+        # 標籤快取與批次調整器本身即為共用實例，以實例識別即可
+        "api.tag_cache.TagCache": id,
+        "api.batch_tuner.AdaptiveBatchSizer": id,
+        "utils.image_processing.MontageLayout": lambda layout: (layout.tile_size, layout.columns, layout.rows)
+    }
+)
+def get_ai_service(
+    api_key: str,
+    rate_limit_seconds: int,
+    tag_cache: Optional['TagCache'],
+    montage_layout: Optional['MontageLayout'],
+    batch_sizer: Optional['AdaptiveBatchSizer']
+) -> 'AIService':
+    """依設定共用的 AI 服務，避免每次 rerun 重新 configure 與建立模型"""
+    from api.ai_service import AIService
+    return AIService(api_key, rate_limit_seconds, tag_cache, montage_layout, batch_sizer)
+
+@st.cache_resource(max_entries=4)
+def get_wardrobe_service(_supabase_client: SupabaseClient, supabase_url: str, supabase_key: str) -> 'WardrobeService':
+    """對應 Supabase 客戶端的衣櫥服務（以連線設定區分實例）"""
+    from api.wardrobe_service import WardrobeService
+    return WardrobeService(_supabase_client)
+
+@st.cache_resource(max_entries=4)
+def get_weather_service(api_key: str, cache_hours: int, base_url: str) -> 'WeatherService':
+    """依設定共用的天氣服務，快取的天氣資料也跨 Session 共用"""
+    from api.weather_service import WeatherService
+    return WeatherService(api_key, cache_hours, base_url)
+
 def init_session_state():
     """初始化 Session State"""
     if 'config' not in st.session_state:
@@ -67,18 +189,17 @@ def render_sidebar():
             config.supabase_url = st.text_input("Supabase URL")
             config.supabase_key = st.text_input("Supabase Anon Key", type="password")
         
-        # 連接 Supabase
+        # 連接 Supabase（設定變更時會取得對應的新客戶端）
         if config.supabase_url and config.supabase_key:
-            if st.session_state.supabase_client is None:
-                try:
-                    st.session_state.supabase_client = SupabaseClient(
-                        config.supabase_url, 
-                        config.supabase_key
-                    )
-                    if not config.is_valid():
-                        st.success("✅ Supabase 已連接")
-                except Exception as e:
-                    st.error(f"❌ Supabase 連接失敗: {str(e)}")
+            try:
+                st.session_state.supabase_client = get_supabase_client(
+                    config.supabase_url, 
+                    config.supabase_key
+                )
+                if not config.is_valid():
+                    st.success("✅ Supabase 已連接")
+            except Exception as e:
+                st.error(f"❌ Supabase 連接失敗: {str(e)}")
         
         st.divider()
         
@@ -162,11 +283,79 @@ def render_login():
                     except Exception as e:
                         st.error(f"註冊失敗: {str(e)}")
 
+# 主要頁面（只執行目前選擇的頁面）
+VIEWS = ["📸 上傳入庫", "👔 我的衣櫥", "💡 今日推薦"]
+
+def build_ai_service(config: AppConfig) -> 'AIService':
+    """取得 AI 服務（只在需要 AI 的頁面呼叫）"""
+    from utils.image_processing import MontageLayout
+    tag_cache = None
+    if config.tag_cache_enabled:
+        tag_cache = get_tag_cache(
+            config.tag_cache_path,
+            config.tag_cache_use_phash,
+            config.tag_cache_phash_distance
+        )
+    batch_sizer = None
+    if config.adaptive_batch_size:
+        batch_sizer = get_batch_sizer(
+            config.batch_size_min,
+            config.max_batch_upload,
+            config.batch_target_seconds,
+            config.batch_max_payload_kb
+        )
+    return get_ai_service(
+        config.gemini_api_key,
+        config.api_rate_limit_seconds,
+        tag_cache,
+        MontageLayout.from_config(config) if config.montage_mode else None,
+        batch_sizer
+    )
+
+def account_session_memory(config: AppConfig):
+    """統計本 Session 的 session_state 佔用量，超過預算時捨棄可重建的鍵，並登錄到程序內的統計"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    from utils.session_memory import enforce_budget, get_session_registry, measure_state
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    
+    budget = config.session_state_budget_kb * 1024
+    sizes = measure_state(st.session_state.to_dict())
+    evicted = enforce_budget(st.session_state, sizes, budget)
+    if evicted:
+        logger.info("Session %s 超過狀態預算，已捨棄: %s", ctx.session_id, ", ".join(evicted))
+    get_session_registry().update(ctx.session_id, st.session_state.get('username'), sizes, budget, evicted)
+
+def record_rerun_timing(view: str, elapsed: float, config: AppConfig):
+    """記錄本次執行時間，於側邊欄顯示最近幾次的耗時與效能監控面板"""
+    from utils.perf import get_registry
+    get_registry().record(f"rerun[{view}]", elapsed)
+    
+    timings = st.session_state.setdefault('rerun_timings', [])
+    timings.append((view, elapsed * 1000))
+    del timings[:-20]
+    
+    with st.sidebar:
+        recent = [ms for v, ms in timings if v == view]
+        st.caption(
+            f"⏱️ 本次執行 {elapsed * 1000:.0f} ms · "
+            f"{view} 平均 {sum(recent) / len(recent):.0f} ms ({len(recent)} 次)"
+        )
+        
+        # 面板統計整個程序，只在設定啟用時或對管理者顯示（重設僅限管理者）
+        is_admin = config.is_admin(st.session_state.get('username'))
+        if config.perf_panel_enabled or is_admin:
+            from ui.components.perf_panel import render_perf_panel
+            render_perf_panel(is_admin, st.session_state.user_id, st.session_state.get('username'))
+
 def main():
     """主程式"""
+    started = time.perf_counter()
     init_session_state()
     render_sidebar()
     
+    config = st.session_state.config
     st.title("🌟 個人穿搭 AI 助手")
     
     # 檢查是否已登入
@@ -174,34 +363,66 @@ def main():
         render_login()
         return
     
+    # 登入後才啟動背景標籤工作（處理重啟前未完成的工作），登入頁不載入佇列與影像模組
+    job_worker = get_tag_job_worker(
+        config.job_queue_path,
+        config.job_max_attempts,
+        config.tag_worker_threads,
+        config.max_batch_upload
+    )
+    
     # 渲染天氣小工具
-    config = st.session_state.config
+    weather_service = None
     if config.weather_api_key and st.session_state.supabase_client:
-        weather_service = WeatherService(config.weather_api_key)
+        from ui.components.weather_widget import render_weather_widget
+        weather_service = get_weather_service(config.weather_api_key, config.weather_cache_hours, config.weather_base_url)
         render_weather_widget(weather_service, st.session_state.selected_city)
     
-    # 主要內容區域
-    tab1, tab2, tab3 = st.tabs(["📸 上傳入庫", "👔 我的衣櫥", "💡 今日推薦"])
+    # 主要內容區域：st.tabs 會執行所有分頁，改用單選導覽只執行目前頁面
+    view = st.radio(
+        "頁面",
+        VIEWS,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="active_view"
+    )
+    
+    from utils.display_cache import configure_display_cache, set_image_server
+    configure_display_cache(config.display_cache_max_mb * 1024 * 1024)
+    if config.image_server_enabled:
+        set_image_server(get_image_server(
+            config.image_store_dir,
+            config.image_server_port,
+            config.image_server_public_url,
+            config.image_store_max_mb,
+            config.image_store_max_age_days
+        ))
+    else:
+        set_image_server(None)
     
-    # 初始化服務
-    ai_service = AIService(config.gemini_api_key, config.api_rate_limit_seconds)
-    wardrobe_service = WardrobeService(st.session_state.supabase_client)
-    weather_service = WeatherService(config.weather_api_key)
+    supabase_client = st.session_state.supabase_client
+    wardrobe_service = get_wardrobe_service(supabase_client, supabase_client.url, supabase_client.key)
     
-    with tab1:
-        render_upload_page(ai_service, wardrobe_service, config)
+    if view == VIEWS[0]:
+        from ui.pages.upload_page import render_upload_page
+        render_upload_page(build_ai_service(config), wardrobe_service, job_worker, config)
     
-    with tab2:
+    elif view == VIEWS[1]:
+        from ui.pages.wardrobe_page import render_wardrobe_page
         render_wardrobe_page(wardrobe_service, st.session_state.user_id)
     
-    with tab3:
+    else:
+        from ui.pages.recommendation_page import render_recommendation_page
         render_recommendation_page(
-            ai_service,
+            build_ai_service(config),
             wardrobe_service,
-            weather_service,
+            weather_service or get_weather_service(config.weather_api_key, config.weather_cache_hours, config.weather_base_url),
             st.session_state.user_id,
             st.session_state.selected_city
         )
+    
+    account_session_memory(config)
+    record_rerun_timing(view, time.perf_counter() - started, config)
 
 if __name__ == "__main__":
     main()
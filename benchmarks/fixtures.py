@@ -0,0 +1,128 @@
+"""
+基準測試用的固定衣物圖片集
+以程式產生可重現的單色衣物圖片與對應標籤，不需下載任何外部資源
+"""
+import io
+import json
+import os
+import random
+from PIL import Image, ImageDraw
+
+FIXTURE_COLORS = {
+    "紅色": (196, 40, 40),
+    "藍色": (40, 70, 180),
+    "黑色": (30, 30, 30),
+    "綠色": (40, 140, 70),
+    "黃色": (225, 190, 40),
+    "灰色": (128, 128, 128)
+}
+
+def _draw_top(draw, w, h, color):
+    draw.polygon([
+        (w * 0.30, h * 0.15), (w * 0.70, h * 0.15), (w * 0.92, h * 0.32),
+        (w * 0.80, h * 0.42), (w * 0.72, h * 0.36), (w * 0.72, h * 0.85),
+        (w * 0.28, h * 0.85), (w * 0.28, h * 0.36), (w * 0.20, h * 0.42),
+        (w * 0.08, h * 0.32)
+    ], fill=color)
+
+def _draw_bottom(draw, w, h, color):
+    draw.polygon([
+        (w * 0.30, h * 0.10), (w * 0.70, h * 0.10), (w * 0.76, h * 0.90),
+        (w * 0.56, h * 0.90), (w * 0.50, h * 0.35), (w * 0.44, h * 0.90),
+        (w * 0.24, h * 0.90)
+    ], fill=color)
+
+def _draw_jacket(draw, w, h, color):
+    _draw_top(draw, w, h, color)
+    draw.line([(w * 0.50, h * 0.15), (w * 0.50, h * 0.85)], fill=(220, 220, 220), width=6)
+    draw.polygon([(w * 0.40, h * 0.15), (w * 0.50, h * 0.30), (w * 0.60, h * 0.15)], fill=(240, 240, 240))
+
+def _draw_shoes(draw, w, h, color):
+    draw.ellipse((w * 0.10, h * 0.45, w * 0.48, h * 0.70), fill=color)
+    draw.ellipse((w * 0.52, h * 0.45, w * 0.90, h * 0.70), fill=color)
+    draw.rectangle((w * 0.10, h * 0.62, w * 0.90, h * 0.66), fill=(235, 235, 235))
+
+def _draw_accessory(draw, w, h, color):
+    draw.rectangle((w * 0.25, h * 0.40, w * 0.75, h * 0.80), fill=color)
+    draw.arc((w * 0.35, h * 0.20, w * 0.65, h * 0.55), 180, 360, fill=color, width=10)
+
+FIXTURE_SHAPES = {
+    "上衣": _draw_top,
+    "下身": _draw_bottom,
+    "外套": _draw_jacket,
+    "鞋子": _draw_shoes,
+    "配件": _draw_accessory
+}
+
+def generate_fixtures(directory: str, size: int = 800) -> list:
+    """
+    產生固定的衣物圖片集 (類別 × 顏色)
+
+    Args:
+        directory: 輸出目錄
+        size: 圖片邊長
+
+    Returns:
+        標籤列表 [{"file", "category", "color"}, ...]
+    """
+    os.makedirs(directory, exist_ok=True)
+    labels = []
+    for cat_idx, (category, draw_fn) in enumerate(FIXTURE_SHAPES.items()):
+        for color_idx, (color_name, rgb) in enumerate(FIXTURE_COLORS.items()):
+            img = Image.new('RGB', (size, size), (246, 244, 240))
+            draw_fn(ImageDraw.Draw(img), size, size, rgb)
+            file_name = f"{cat_idx:02d}_{color_idx:02d}.jpg"
+            img.save(os.path.join(directory, file_name), format='JPEG', quality=90)
+            labels.append({"file": file_name, "category": category, "color": color_name})
+
+    with open(os.path.join(directory, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump(labels, f, ensure_ascii=False, indent=2)
+    return labels
+
+def load_fixtures(directory: str) -> list:
+    """
+    讀取圖片集（不存在時自動產生）
+
+    Returns:
+        [(圖片 bytes, 標籤), ...]
+    """
+    labels_path = os.path.join(directory, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding="utf-8") as f:
+            labels = json.load(f)
+    else:
+        labels = generate_fixtures(directory)
+
+    fixtures = []
+    for label in labels:
+        with open(os.path.join(directory, label["file"]), "rb") as f:
+            fixtures.append((f.read(), label))
+    return fixtures
+
+def generate_wardrobe_images(count: int, size: tuple = (240, 300), seed: int = 0) -> list:
+    """
+    產生 count 張互不重複 (感知雜湊也不相近) 的衣物 JPEG，用於大量衣物的情境
+
+    Args:
+        count: 張數
+        size: (寬, 高)
+        seed: 亂數種子，相同參數會得到相同圖片
+
+    Returns:
+        [JPEG bytes, ...]
+    """
+    rng = random.Random(seed)
+    shapes = list(FIXTURE_SHAPES.values())
+    images = []
+    for idx in range(count):
+        # 低解析度的隨機色塊放大作為背景，讓每張圖片的 dHash 都不同
+        background = Image.new('RGB', (8, 10))
+        background.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(8 * 10)])
+        img = background.resize(size, Image.BICUBIC)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        shapes[idx % len(shapes)](ImageDraw.Draw(img), size[0], size[1], color)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
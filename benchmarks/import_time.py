@@ -0,0 +1,114 @@
+"""
+匯入時間報告
+以 python -X importtime 量測匯入 app.py（登入頁面所需）的時間，列出最慢的模組，
+並檢查重量級套件在匯入與執行登入頁面（未登入的第一次執行）後都沒有被載入，可作為冷啟動的回歸檢查
+
+用法:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --top 30 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# 登入頁面不應載入的套件（只在使用到的頁面或服務中延遲匯入）
+LAZY_MODULES = ("google.generativeai", "supabase", "PIL", "numpy")
+
+def measure(module: str = "app") -> list:
+    """
+    在新的 Python 程序中匯入模組並解析 -X importtime 輸出
+
+    Returns:
+        [(模組名稱, 自身 μs, 累計 μs), ...]，依輸出順序
+    """
+    code = f"import sys; sys.path[:0] = ['src', '.']; import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"匯入 {module} 失敗:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def rendered_modules(script: str = "app.py") -> list:
+    """
+    在新的 Python 程序中以 AppTest 執行一次未登入的頁面
+
+    單純匯入 app 看不到執行時才匯入的模組（例如 main() 中啟動的服務），因此另外實際執行一次。
+
+    Returns:
+        執行後 sys.modules 中的模組名稱
+    """
+    code = (
+        "import json, sys; sys.path[:0] = ['src', '.']\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        f"at = AppTest.from_file({os.path.abspath(os.path.join(ROOT, script))!r}, default_timeout=60).run()\n"
+        "if at.exception:\n"
+        "    sys.exit(at.exception[0].message)\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"執行 {script} 失敗:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def _lazy_roots(names) -> list:
+    """names 中屬於 LAZY_MODULES 的套件"""
+    names = list(names)
+    return sorted({
+        lazy for lazy in LAZY_MODULES for name in names
+        if name == lazy or name.startswith(lazy + ".")
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py 匯入時間報告")
+    parser.add_argument("--module", default="app", help="要量測的模組")
+    parser.add_argument("--top", type=int, default=20, help="列出最慢的模組數")
+    parser.add_argument("--budget-ms", type=float, default=0, help="總匯入時間上限，超過時回傳錯誤 (0 = 不檢查)")
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total_ms = next((cumulative for name, _, cumulative in rows if name == args.module), 0) / 1000
+    print(f"匯入 {args.module}: {total_ms:.0f} ms（共 {len(rows)} 個模組）\n")
+
+    print(f"{'累計 ms':>9} {'自身 ms':>9}  模組")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} {self_us / 1000:9.1f}  {name}")
+
+    failed = False
+    roots = _lazy_roots(name for name, _, _ in rows)
+    if roots:
+        print(f"\n❌ 以下套件應延遲匯入，但在匯入 {args.module} 時已載入: {', '.join(roots)}")
+        failed = True
+    else:
+        print(f"\n✅ 匯入時未載入延遲匯入的套件 ({', '.join(LAZY_MODULES)})")
+
+    if args.module == "app":
+        roots = _lazy_roots(rendered_modules())
+        if roots:
+            print(f"❌ 以下套件應延遲匯入，但在執行登入頁面時已載入: {', '.join(roots)}")
+            failed = True
+        else:
+            print("✅ 執行登入頁面時未載入延遲匯入的套件")
+
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"❌ 匯入時間 {total_ms:.0f} ms 超過上限 {args.budget_ms:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+衣物資料模型的記憶體基準測試
+以 tracemalloc 量測每 1,000 件衣物佔用的記憶體:
+
+    dict_dataclass   沒有 __slots__ 的 dataclass (先前的 ClothingItem 配置)，含 base64 圖片
+    dict_metadata    同上但不含圖片 (與 slots_lazy 比較物件本身的開銷)
+    slots_eager      ClothingItem 並直接帶入 base64 圖片 (get_wardrobe(with_images=True))
+    slots_lazy       ClothingItem 只含中繼資料，圖片為延遲讀取的 handle (get_wardrobe() 預設)
+    prompt_views     slots_lazy 的衣物再建立推薦 prompt 用的中繼資料檢視
+    prompt_dicts     先前的 prompt 摘要 (to_dict() 後去掉 image_data)
+
+另以本機 Supabase 替身量測 get_wardrobe 兩種模式的耗時與傳輸量。
+
+用法:
+    python benchmarks/item_memory.py
+    python benchmarks/item_memory.py --items 5000 --output item_memory.json
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+from fixtures import generate_wardrobe_images
+from stubs import StubEnvironment
+
+@dataclass
+class DictItem:
+    """沒有 __slots__、圖片直接存為字串的衣物 (對照組)"""
+    id: Optional[int] = None
+    name: str = ""
+    category: str = ""
+    color: str = ""
+    style: str = ""
+    warmth: int = 5
+    image_data: Optional[str] = None
+    image_hash: Optional[str] = None
+    phash: Optional[str] = None
+    raw_hash: Optional[str] = None
+    user_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+def _rows(images: list) -> list:
+    """資料庫回傳的資料列（含 base64 圖片）"""
+    created = datetime(2026, 1, 1).isoformat()
+    return [
+        {
+            "id": idx + 1,
+            "name": f"衣物{idx}",
+            "category": "上衣",
+            "color": "藍色",
+            "style": "休閒",
+            "warmth": 5,
+            "image_data": base64.b64encode(img_bytes).decode("utf-8"),
+            "image_hash": f"{idx:064x}",
+            "phash": f"{idx:016x}",
+            "raw_hash": f"{idx:064x}",
+            "user_id": "1",
+            "created_at": created
+        }
+        for idx, img_bytes in enumerate(images)
+    ]
+
+def _copy(text: str) -> str:
+    """建立內容相同的新字串"""
+    return (text + " ")[:-1]
+
+def _traced_bytes(build) -> int:
+    """build() 建立的物件在建立完成後仍佔用的 bytes"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        current = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return current
+
+def measure_layouts(rows: list) -> dict:
+    """各種配置每 1,000 件的 KB（資料列本身不計入，只計建立的物件）"""
+    from database.models import PROMPT_FIELDS, ClothingItem
+
+    metadata_rows = [{k: v for k, v in row.items() if k != "image_data"} for row in rows]
+    per_thousand = 1000 / len(rows)
+
+    def dict_dataclass():
+        # 複製字串以模擬每次查詢都從 JSON 解析出新的 base64 內容
+        return [
+            DictItem(**{**row, "image_data": _copy(row["image_data"]), "created_at": datetime.fromisoformat(row["created_at"])})
+            for row in rows
+        ]
+
+    def dict_metadata():
+        return [
+            DictItem(**{**row, "created_at": datetime.fromisoformat(row["created_at"])})
+            for row in metadata_rows
+        ]
+
+    def slots_eager():
+        return [ClothingItem.from_dict({**row, "image_data": _copy(row["image_data"])}) for row in rows]
+
+    def load_image(item_id):
+        return None
+
+    def slots_lazy():
+        return [ClothingItem.from_dict(row, load_image) for row in metadata_rows]
+
+    lazy_items = slots_lazy()
+
+    def prompt_views():
+        return [item.metadata(PROMPT_FIELDS) for item in lazy_items]
+
+    def prompt_dicts():
+        # 先前的做法：to_dict() 後再去掉 image_data
+        return [{k: v for k, v in item.to_dict().items() if k != "image_data"} for item in lazy_items]
+
+    results = {}
+    for name, build in (
+        ("dict_dataclass", dict_dataclass),
+        ("dict_metadata", dict_metadata),
+        ("slots_eager", slots_eager),
+        ("slots_lazy", slots_lazy),
+        ("prompt_views", prompt_views),
+        ("prompt_dicts", prompt_dicts)
+    ):
+        results[name] = round(_traced_bytes(build) * per_thousand / 1024, 1)
+    return results
+
+def measure_fetch(env: StubEnvironment, images: list, repeats: int) -> dict:
+    """以替身資料庫量測 get_wardrobe 的耗時與回應大小"""
+    from api.wardrobe_service import WardrobeService
+    from database.supabase_client import SupabaseClient
+
+    env.db.reset()
+    user_id = env.db.add_user("bench")
+    env.db.seed_wardrobe(user_id, images)
+    service = WardrobeService(SupabaseClient(env.env["SUPABASE_URL"], env.env["SUPABASE_KEY"]))
+
+    results = {}
+    for name, with_images in (("with_images", True), ("metadata_only", False)):
+        durations = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            items = service.get_wardrobe(user_id, with_images=with_images)
+            durations.append(time.perf_counter() - started)
+        resident = sum(item.image.nbytes for item in items if item.image)
+        results[name] = {
+            "items": len(items),
+            "median_s": round(sorted(durations)[len(durations) // 2], 4),
+            "image_chars_resident": resident
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="衣物資料模型記憶體基準測試")
+    parser.add_argument("--items", type=int, default=1000, help="衣物件數")
+    parser.add_argument("--repeats", type=int, default=3, help="get_wardrobe 的計時次數")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑")
+    args = parser.parse_args()
+
+    images = generate_wardrobe_images(args.items)
+    layouts = measure_layouts(_rows(images))
+    with StubEnvironment() as env:
+        fetch = measure_fetch(env, images, args.repeats)
+
+    print(f"\n每 1,000 件衣物的記憶體 (KB，{args.items} 件量測):")
+    for name, kb in layouts.items():
+        print(f"  {name:<16} {kb:>12,.1f}")
+    print("\nget_wardrobe:")
+    for name, stat in fetch.items():
+        print(f"  {name:<16} {stat['median_s']:>8.3f} s  常駐圖片 {stat['image_chars_resident'] / 1024 / 1024:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"items": args.items, "kb_per_1000": layouts, "get_wardrobe": fetch}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+多使用者負載測試
+以 Streamlit AppTest 同時模擬 N 個 Session 操作 app.py (登入 → 衣櫥 → 推薦 → 上傳)，
+所有外部服務使用本機替身 (benchmarks/stubs.py)，觀察速率限制、快取與連線等共用資源在並行下的表現，
+回報吞吐量、各步驟的延遲分佈與程序記憶體峰值
+
+上傳步驟需要支援 AppTest.file_uploader 的 Streamlit 版本，較舊的版本會略過此步驟。
+
+用法 (LOAD_TEST_DEBUG=1 時印出失敗的堆疊):
+    python benchmarks/load_test.py --sessions 8
+    python benchmarks/load_test.py --sessions 16 --iterations 2 --items 50 --rate-limit 1 --ai-latency 0.5
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+from fixtures import generate_wardrobe_images
+from stubs import StubEnvironment
+
+APP_PATH = os.path.join(ROOT, "app.py")
+STEPS = ("login", "wardrobe", "recommend", "upload", "tagging")
+
+class MemorySampler:
+    """背景執行緒定期讀取程序 RSS，記錄負載期間的峰值"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        except (OSError, ValueError):
+            # 非 Linux 只能取得整個程序生命週期的峰值
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+@contextlib.contextmanager
+def concurrent_apptest():
+    """
+    讓多個 AppTest 可以在不同執行緒同時執行
+
+    AppTest 每次執行都會把全域的 Runtime 單例換成自己的模擬物件並在結束時清除，
+    也會暫時將 global.appTest 設定為 True；多個 Session 同時執行時會互相清掉對方的 Runtime。
+    負載測試期間改為全部 Session 共用第一個建立的模擬 Runtime，並固定 global.appTest。
+    每次執行各自編譯 app.py 在 Python 3.11 並行時可能觸發 ast 的 SystemError，
+    因此也和實際的伺服器一樣共用同一份 ScriptCache。
+    """
+    from streamlit import config as streamlit_config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class _SharedSlot(type(Runtime)):
+        def __setattr__(cls, name, value):
+            if name == "_instance":
+                if value is not None and Runtime._instance is None:
+                    Runtime._instance = value
+                return
+            super().__setattr__(name, value)
+
+    class SharedRuntime(Runtime, metaclass=_SharedSlot):
+        pass
+
+    previous_app_test = streamlit_config.get_option("global.appTest")
+    streamlit_config.set_option("global.appTest", True)
+    app_test.Runtime = SharedRuntime
+    shared_script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+    try:
+        yield
+    finally:
+        app_test.Runtime = Runtime
+        app_test.ScriptCache = local_script_runner.ScriptCache = ScriptCache
+        Runtime._instance = None
+        streamlit_config.set_option("global.appTest", previous_app_test)
+
+class SessionScript:
+    """單一使用者的操作腳本，每個步驟的耗時記錄在 timings"""
+
+    def __init__(
+        self,
+        index: int,
+        env: StubEnvironment,
+        config,
+        upload_images: List[List[bytes]],
+        tag_timeout: float,
+        session_registry=None
+    ):
+        """
+        Args:
+            upload_images: 每次執行腳本上傳的照片 (每次不同，避免被判定為重複)
+            session_registry: 每個步驟後登錄本 Session 的 session_state 佔用量 (SessionMemoryRegistry)
+        """
+        self.index = index
+        self.env = env
+        self.config = config
+        self.username = f"user{index:03d}"
+        self.upload_images = upload_images
+        self.tag_timeout = tag_timeout
+        self.iteration = 0
+        self.timings: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.errors: List[str] = []
+        self.session_registry = session_registry
+
+    def _step(self, name: str, action):
+        started = time.perf_counter()
+        action()
+        self.timings[name].append(time.perf_counter() - started)
+        if self.at.exception:
+            raise RuntimeError(f"{name}: {self.at.exception[0].message}")
+        self._record_state()
+
+    def _record_state(self):
+        """
+        以腳本編號登錄 session_state 佔用量
+
+        所有 AppTest 的 session_id 都相同，app 內依 session_id 記錄的統計只會有一筆，
+        因此由負載測試自行以每個 AppTest 為單位登錄。
+        """
+        if self.session_registry is None:
+            return
+        from utils.session_memory import measure_state
+        self.session_registry.update(
+            f"load-test-{self.index:03d}",
+            self.username,
+            measure_state(self.at.session_state.to_dict()),
+            self.config.session_state_budget_kb * 1024
+        )
+
+    def _select_view(self, index: int):
+        radio = self.at.radio(key="active_view")
+        radio.set_value(radio.options[index]).run()
+
+    def login(self):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_PATH, default_timeout=600)
+        for name, value in self.env.env.items():
+            self.at.secrets[name] = value
+        self.at.session_state["config"] = self.config
+        self.at.run()
+
+        self.at.text_input(key="login_user").input(self.username)
+        self.at.text_input(key="login_pass").input("bench")
+        next(button for button in self.at.button if button.label == "登入").click().run()
+        if not self.at.session_state["user_id"]:
+            raise RuntimeError("login: 登入失敗")
+
+    def wardrobe(self):
+        self._select_view(1)
+
+    def recommend(self):
+        self._select_view(2)
+        self.at.button(key="get_recommendation_btn").click().run()
+
+    def upload(self):
+        self._select_view(0)
+        files = [
+            (f"s{self.index:03d}_{self.iteration:02d}_{idx:03d}.jpg", img_bytes, "image/jpeg")
+            for idx, img_bytes in enumerate(self.upload_images[self.iteration])
+        ]
+        self.at.file_uploader(key="file_uploader").set_value(files).run()
+        for button in self.at.button:
+            if button.label.startswith("🚀"):
+                button.click().run()
+                break
+        else:
+            raise RuntimeError("upload: 找不到上傳按鈕")
+
+    def wait_for_tagging(self):
+        """等待背景標籤工作處理完此使用者的圖片"""
+        from api.job_queue import TagJobQueue
+        queue = TagJobQueue(self.config.job_queue_path)
+        user_id = self.at.session_state["user_id"]
+        deadline = time.time() + self.tag_timeout
+        while queue.has_active_jobs(user_id):
+            if time.time() > deadline:
+                raise RuntimeError("tagging: 等待逾時")
+            time.sleep(0.05)
+
+    def run_iteration(self, include_upload: bool):
+        try:
+            self._step("login", self.login)
+            self._step("wardrobe", self.wardrobe)
+            self._step("recommend", self.recommend)
+            if include_upload:
+                self._step("upload", self.upload)
+                self._step("tagging", self.wait_for_tagging)
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+            if os.getenv("LOAD_TEST_DEBUG"):
+                traceback.print_exc()
+                at = getattr(self, "at", None)
+                if at is not None:
+                    print("頁面訊息:", [m.value for m in at.error] + [m.value for m in at.warning])
+        self.iteration += 1
+
+def _percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.5) * 1000, 1),
+        "p95_ms": round(pick(0.95) * 1000, 1),
+        "p99_ms": round(pick(0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1)
+    }
+
+def _shared_resource_stats(session_registry) -> dict:
+    """
+    並行時共用資源的狀態 (速率限制等待、顯示快取、Gemini 用量、Session State 佔用量)
+
+    Session State 使用負載測試依 AppTest 登錄的統計，捨棄次數則取自 app 的程序內統計。
+    """
+    from api.usage_tracker import get_usage_tracker
+    from utils.display_cache import get_display_cache
+    from utils.session_memory import get_session_registry
+    usage = get_usage_tracker()
+    waits = [record["wait_seconds"] for record in usage.recent(limit=10_000)]
+    cache = get_display_cache().get_stats()
+    return {
+        "gemini_calls": usage.total_calls,
+        "gemini_tokens": usage.total_tokens,
+        "rate_limit_wait": _percentiles(waits),
+        "gemini_by_operation": usage.summary(),
+        "display_cache": {
+            "hit_rate": round(cache["hit_rate"], 3),
+            "resident_mb": round(cache["resident_bytes"] / 1024 / 1024, 1),
+            "evictions": cache["evictions"]
+        },
+        "session_state": {
+            **session_registry.get_stats(),
+            "evictions": get_session_registry().total_evictions
+        }
+    }
+
+def _quiet_streamlit_logs():
+    """只保留 Streamlit 的錯誤訊息 (bare mode 與棄用參數的警告會在每次執行時大量輸出)"""
+    from streamlit import config as streamlit_config, logger as streamlit_logger
+    streamlit_config.set_option("logger.level", "error")
+    streamlit_logger.set_log_level("error")
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(description="多使用者負載測試 (AppTest + 本機替身)")
+    parser.add_argument("--sessions", type=int, default=8, help="同時進行的 Session 數")
+    parser.add_argument("--iterations", type=int, default=1, help="每個 Session 重複腳本的次數")
+    parser.add_argument("--items", type=int, default=30, help="每位使用者預先存入的衣物件數")
+    parser.add_argument("--upload-count", type=int, default=5, help="每次上傳的照片數 (0 = 略過上傳)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Gemini 請求間隔秒數 (所有 Session 共用)")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="資料庫替身每個請求的延遲秒數")
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="Gemini 替身每個請求的延遲秒數")
+    parser.add_argument("--tag-timeout", type=float, default=300, help="等待背景標籤完成的秒數上限")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑")
+    args = parser.parse_args()
+
+    _quiet_streamlit_logs()
+    from config import AppConfig
+    from streamlit.testing.v1 import AppTest
+    from utils.perf import get_registry
+    from utils.session_memory import SessionMemoryRegistry
+
+    include_upload = args.upload_count > 0
+    if include_upload and not hasattr(AppTest, "file_uploader"):
+        print("⚠️ 此 Streamlit 版本的 AppTest 不支援 file_uploader，略過上傳步驟")
+        include_upload = False
+
+    all_images = generate_wardrobe_images(args.items + args.sessions * args.iterations * args.upload_count)
+    seeded_images = all_images[:args.items]
+
+    with tempfile.TemporaryDirectory(prefix="wardrobe_load_") as workdir, \
+            StubEnvironment(args.db_latency, args.ai_latency) as env:
+        config = replace(
+            AppConfig.from_env(),
+            api_rate_limit_seconds=args.rate_limit,
+            tag_cache_path=os.path.join(workdir, "tag_cache.sqlite3"),
+            job_queue_path=os.path.join(workdir, "tag_jobs.sqlite3"),
+            image_store_dir=os.path.join(workdir, "images")
+        )
+
+        session_registry = SessionMemoryRegistry()
+        scripts = []
+        for index in range(args.sessions):
+            upload_images = []
+            if include_upload:
+                offset = args.items + index * args.iterations * args.upload_count
+                upload_images = [
+                    all_images[offset + i * args.upload_count:offset + (i + 1) * args.upload_count]
+                    for i in range(args.iterations)
+                ]
+            script = SessionScript(index, env, config, upload_images, args.tag_timeout, session_registry)
+            env.db.seed_wardrobe(env.db.add_user(script.username), seeded_images)
+            scripts.append(script)
+
+        def run_session(script: SessionScript):
+            for _ in range(args.iterations):
+                script.run_iteration(include_upload)
+
+        # 先以一個 Session 載入模組與建立共用資源，避免冷啟動混入並行量測
+        warmup = SessionScript(-1, env, config, [], args.tag_timeout)
+        env.db.add_user(warmup.username)
+        warmup.run_iteration(False)
+        if warmup.errors:
+            sys.exit(f"暖機失敗: {warmup.errors[0]}")
+
+        baseline_mb = MemorySampler.current_mb()
+        with concurrent_apptest(), MemorySampler() as sampler:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as pool:
+                list(pool.map(run_session, scripts))
+            wall = time.perf_counter() - started
+
+        db_requests = env.db.request_count
+        saved_items = len(env.db.tables["my_wardrobe"]) - args.items * args.sessions
+
+    steps = {
+        step: _percentiles([t for script in scripts for t in script.timings[step]])
+        for step in STEPS
+    }
+    errors = [error for script in scripts for error in script.errors]
+    # 呼叫端以位置參數傳入 user_id / retries 時，bytes 統計曾因例外被吞掉而一直是 0
+    tagging = get_registry().snapshot().get("AIService._request_batch_tags")
+    if tagging and tagging["count"] and not tagging["bytes"]:
+        errors.append("AIService._request_batch_tags 的計時統計沒有記錄處理的 bytes")
+    completed = sum(len(script.timings["recommend"]) for script in scripts)
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "wall_s": round(wall, 2),
+        "sessions_completed": completed,
+        "throughput_sessions_per_s": round(completed / wall, 3),
+        "steps": {step: stat for step, stat in steps.items() if stat},
+        "errors": errors,
+        "memory": {"baseline_mb": round(baseline_mb, 1), "peak_mb": round(sampler.peak_mb, 1)},
+        "db_requests": db_requests,
+        "saved_items": saved_items,
+        "shared": _shared_resource_stats(session_registry)
+    }
+
+    print(f"\n{args.sessions} 個 Session × {args.iterations} 次: {wall:.1f} 秒，"
+          f"完成 {completed} 次腳本 ({results['throughput_sessions_per_s']} 次/秒)")
+    print(f"\n{'步驟':<10} {'次數':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, stat in results["steps"].items():
+        print(f"{step:<10} {stat['count']:>6} {stat['p50_ms']:>9} {stat['p95_ms']:>9} {stat['p99_ms']:>9} {stat['max_ms']:>9}")
+    print(f"\n記憶體: 開始 {results['memory']['baseline_mb']} MB，峰值 {results['memory']['peak_mb']} MB")
+    shared = results["shared"]
+    print(f"Gemini: {shared['gemini_calls']} 次，速率限制等待 {shared['rate_limit_wait'] or '-'}")
+    print(f"顯示快取: {shared['display_cache']}")
+    print(f"Session State: {shared['session_state']}")
+    print(f"資料庫請求: {db_requests} 次，上傳後存入 {saved_items} 件")
+    if errors:
+        print(f"\n❌ {len(errors)} 個錯誤，例如: {errors[0]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
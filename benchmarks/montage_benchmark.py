@@ -0,0 +1,115 @@
+"""
+拼圖模式 vs 逐張模式 標籤基準測試
+以固定圖片集比較兩種模式的準確度、延遲與請求大小
+
+用法:
+    GEMINI_KEY=... python benchmarks/montage_benchmark.py --batch-size 9
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from api.ai_service import AIService
+from utils.image_processing import ImageOptions, MontageLayout, prepare_image
+from fixtures import load_fixtures
+
+class PayloadMeter:
+    """包裝 GenerativeModel，記錄請求數與送出的 bytes"""
+
+    def __init__(self, model):
+        self.model = model
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def generate_content(self, content_parts, **kwargs):
+        self.requests += 1
+        for part in content_parts:
+            if isinstance(part, dict):
+                self.bytes_sent += len(part["data"])
+            else:
+                self.bytes_sent += len(str(part).encode("utf-8"))
+        return self.model.generate_content(content_parts, **kwargs)
+
+def run_mode(name: str, ai_service: AIService, fixtures: list, batch_size: int) -> dict:
+    """以指定模式標籤整個圖片集"""
+    meter = PayloadMeter(ai_service.model)
+    ai_service.model = meter
+
+    latencies = []
+    failed_images = 0
+    category_hits = 0
+    color_hits = 0
+
+    for start in range(0, len(fixtures), batch_size):
+        batch = fixtures[start:start + batch_size]
+        started = time.perf_counter()
+        tags_list = ai_service.batch_auto_tag([img_bytes for img_bytes, _ in batch])
+        latencies.append(time.perf_counter() - started)
+
+        if not tags_list:
+            failed_images += len(batch)
+            continue
+
+        for tags, (_, label) in zip(tags_list, batch):
+            if tags.get("category") == label["category"]:
+                category_hits += 1
+            if label["color"][0] in str(tags.get("color", "")):
+                color_hits += 1
+
+    total = len(fixtures)
+    return {
+        "mode": name,
+        "images": total,
+        "requests": meter.requests,
+        "payload_kb": round(meter.bytes_sent / 1024, 1),
+        "latency_mean_s": round(statistics.mean(latencies), 2),
+        "latency_max_s": round(max(latencies), 2),
+        "seconds_per_image": round(sum(latencies) / total, 3),
+        "failed_images": failed_images,
+        "category_accuracy": round(category_hits / total, 3),
+        "color_accuracy": round(color_hits / total, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="拼圖模式標籤基準測試")
+    parser.add_argument("--fixtures", default=".cache/bench_fixtures", help="圖片集目錄（不存在時自動產生）")
+    parser.add_argument("--batch-size", type=int, default=9)
+    parser.add_argument("--tile-size", type=int, default=384)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--rate-limit", type=int, default=15, help="請求間隔秒數")
+    parser.add_argument("--json", help="結果輸出路徑")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_KEY", "")
+    if not api_key:
+        sys.exit("請設定 GEMINI_KEY 環境變數")
+
+    options = ImageOptions()
+    fixtures = [
+        (prepare_image(raw, options).ai_bytes, label)
+        for raw, label in load_fixtures(args.fixtures)
+    ]
+    layout = MontageLayout(args.tile_size, args.columns, args.rows)
+
+    results = [
+        run_mode("per-image", AIService(api_key, args.rate_limit), fixtures, args.batch_size),
+        run_mode("montage", AIService(api_key, args.rate_limit, montage_layout=layout), fixtures, args.batch_size)
+    ]
+
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[col]) for col in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
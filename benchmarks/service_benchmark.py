@@ -0,0 +1,325 @@
+"""
+服務基準測試
+以本機替身 (benchmarks/stubs.py) 取代 Supabase、Gemini 與 OpenWeather，
+在 10 / 100 / 1000 件衣物下量測主要情境的耗時與記憶體，結果可跨 commit 比較
+
+情境:
+    wardrobe_render  以 AppTest 切換到「我的衣櫥」(首次渲染與重新執行)
+    upload_batch     以 wardrobe_cli import 的流程匯入資料夾 (hash → 前處理 → 標籤 → 寫入)
+    recommendation   以 AppTest 按下「獲取今日推薦」到輪播顯示完成
+    batch_delete     WardrobeService.batch_delete_items 刪除全部衣物
+
+用法:
+    python benchmarks/service_benchmark.py
+    python benchmarks/service_benchmark.py --sizes 10 100 --scenarios wardrobe_render --output before.json
+    python benchmarks/service_benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+from dataclasses import replace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+from fixtures import generate_wardrobe_images
+from stubs import StubEnvironment
+
+APP_PATH = os.path.join(ROOT, "app.py")
+SIZES = (10, 100, 1000)
+USERNAME = "bench"
+
+class Scenario:
+    """
+    一個情境：setup 不計時，run 計時並可回傳額外的統計
+
+    run 回傳的 "elapsed_s" 會取代整個 run 的耗時 (run 內含不應計入的步驟時使用)
+    """
+
+    def __init__(self, env: StubEnvironment, size: int, images: list, workdir: str):
+        self.env = env
+        self.size = size
+        self.images = images
+        self.workdir = workdir
+
+    def setup(self):
+        pass
+
+    def run(self) -> dict:
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+    # 共用的輔助方法
+
+    def reset_database(self) -> int:
+        from api.wardrobe_service import WardrobeService
+        self.env.db.reset()
+        user_id = self.env.db.add_user(USERNAME)
+        WardrobeService._invalidate_user_indexes(user_id)
+        WardrobeService._invalidate_user_indexes(str(user_id))
+        return user_id
+
+    def config(self):
+        """AppConfig（不等待速率限制、不使用磁碟上的共用快取）"""
+        from config import AppConfig
+        return replace(
+            AppConfig.from_env(),
+            api_rate_limit_seconds=0,
+            tag_cache_path=os.path.join(self.workdir, "tag_cache.sqlite3"),
+            job_queue_path=os.path.join(self.workdir, "tag_jobs.sqlite3"),
+            image_store_dir=os.path.join(self.workdir, "images")
+        )
+
+    def app_test(self, user_id: int):
+        """已登入、停在上傳頁的 AppTest"""
+        from streamlit.testing.v1 import AppTest
+        from utils.display_cache import get_display_cache
+        get_display_cache().clear()
+
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        for name, value in self.env.env.items():
+            at.secrets[name] = value
+        at.session_state["config"] = self.config()
+        at.session_state["user_id"] = user_id
+        at.session_state["username"] = USERNAME
+        at.run()
+        self._raise_app_exception(at)
+        return at
+
+    @staticmethod
+    def _raise_app_exception(at):
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+class WardrobeRender(Scenario):
+    """切換到衣櫥頁的首次渲染，之後幾次重新執行的中位數另外記錄"""
+
+    reruns = 3
+
+    def setup(self):
+        user_id = self.reset_database()
+        self.env.db.seed_wardrobe(user_id, self.images)
+        self.at = self.app_test(user_id)
+
+    def run(self) -> dict:
+        radio = self.at.radio(key="active_view")
+        started = time.perf_counter()
+        radio.set_value(radio.options[1]).run()
+        first = time.perf_counter() - started
+        self._raise_app_exception(self.at)
+
+        reruns = []
+        for _ in range(self.reruns):
+            started = time.perf_counter()
+            self.at.run()
+            reruns.append(time.perf_counter() - started)
+        return {"elapsed_s": first, "rerun_median_s": statistics.median(reruns)}
+
+class UploadBatch(Scenario):
+    """以 CLI 匯入流程上傳整個資料夾"""
+
+    def setup(self):
+        self.user_id = self.reset_database()
+        self.photo_dir = os.path.join(self.workdir, f"photos_{self.size}")
+        if not os.path.isdir(self.photo_dir):
+            os.makedirs(self.photo_dir)
+            for idx, img_bytes in enumerate(self.images):
+                with open(os.path.join(self.photo_dir, f"{idx:05d}.jpg"), "wb") as f:
+                    f.write(img_bytes)
+        for name in ("tag_cache.sqlite3", "checkpoint.json"):
+            path = os.path.join(self.workdir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def run(self) -> dict:
+        import wardrobe_cli
+        args = Namespace(
+            directory=self.photo_dir,
+            username=None,
+            user_id=self.user_id,
+            checkpoint=os.path.join(self.workdir, "checkpoint.json"),
+            workers=0,
+            hash_workers=4,
+            batch_size=10,
+            rate_limit=0
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            wardrobe_cli.cmd_import(args, self.config())
+        return {"saved": len(self.env.db.tables["my_wardrobe"])}
+
+class Recommendation(Scenario):
+    """在推薦頁按下「獲取今日推薦」直到輪播渲染完成"""
+
+    def setup(self):
+        user_id = self.reset_database()
+        self.env.db.seed_wardrobe(user_id, self.images)
+        self.at = self.app_test(user_id)
+        radio = self.at.radio(key="active_view")
+        radio.set_value(radio.options[2]).run()
+        self._raise_app_exception(self.at)
+
+    def run(self) -> dict:
+        self.at.button(key="get_recommendation_btn").click().run()
+        self._raise_app_exception(self.at)
+        return {}
+
+class BatchDelete(Scenario):
+    """批次刪除全部衣物"""
+
+    def setup(self):
+        from api.wardrobe_service import WardrobeService
+        from database.supabase_client import SupabaseClient
+        self.user_id = self.reset_database()
+        self.env.db.seed_wardrobe(self.user_id, self.images)
+        config = self.config()
+        self.service = WardrobeService(SupabaseClient(config.supabase_url, config.supabase_key))
+        self.item_ids = [row["id"] for row in self.env.db.tables["my_wardrobe"]]
+
+    def run(self) -> dict:
+        success, deleted, failed = self.service.batch_delete_items(self.user_id, self.item_ids)
+        return {"deleted": deleted, "failed": failed}
+
+SCENARIOS = {
+    "wardrobe_render": WardrobeRender,
+    "upload_batch": UploadBatch,
+    "recommendation": Recommendation,
+    "batch_delete": BatchDelete
+}
+
+def measure(scenario: Scenario, repeats: int, memory: bool) -> dict:
+    """
+    執行情境 repeats 次計時，另以 tracemalloc 執行一次量測 Python 配置的記憶體峰值
+
+    Returns:
+        {"median_s", "min_s", "max_s", "peak_mb", ...情境回傳的統計 (取最後一次)}
+    """
+    durations = []
+    extra = {}
+    for _ in range(repeats):
+        scenario.setup()
+        try:
+            started = time.perf_counter()
+            extra = scenario.run()
+            durations.append(extra.pop("elapsed_s", time.perf_counter() - started))
+        finally:
+            scenario.teardown()
+
+    result = {
+        "median_s": round(statistics.median(durations), 4),
+        "min_s": round(min(durations), 4),
+        "max_s": round(max(durations), 4)
+    }
+    if memory:
+        scenario.setup()
+        try:
+            tracemalloc.start()
+            scenario.run()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        finally:
+            tracemalloc.stop()
+            scenario.teardown()
+
+    for key, value in extra.items():
+        result[key] = round(value, 4) if isinstance(value, float) else value
+    return result
+
+def _quiet_streamlit_logs():
+    """只保留 Streamlit 的錯誤訊息 (bare mode 與棄用參數的警告會在每次執行時大量輸出)"""
+    from streamlit import config as streamlit_config, logger as streamlit_logger
+    streamlit_config.set_option("logger.level", "error")
+    streamlit_logger.set_log_level("error")
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB、macOS 以 bytes 回報
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"\n{'情境':<16} {'件數':>6} {'中位數 s':>10} {'峰值 MB':>9}  {'比較':>8}  其他")
+    for name, by_size in results["scenarios"].items():
+        for size, stat in by_size.items():
+            extra = {k: v for k, v in stat.items() if k not in ("median_s", "min_s", "max_s", "peak_mb")}
+            change = ""
+            previous = (baseline or {}).get("scenarios", {}).get(name, {}).get(size)
+            if previous and previous.get("median_s"):
+                change = f"{(stat['median_s'] / previous['median_s'] - 1) * 100:+.0f}%"
+            print(
+                f"{name:<16} {size:>6} {stat['median_s']:>10.3f} {stat.get('peak_mb', '-'):>9}  "
+                f"{change:>8}  {json.dumps(extra, ensure_ascii=False) if extra else ''}"
+            )
+    print(f"\n程序記憶體峰值 (RSS): {results['max_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="服務基準測試（本機替身）")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="衣物件數")
+    parser.add_argument("--repeats", type=int, default=3, help="每個情境的計時次數")
+    parser.add_argument("--no-memory", action="store_true", help="不量測 tracemalloc 記憶體峰值")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="資料庫替身每個請求的延遲秒數")
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="Gemini 替身每個請求的延遲秒數")
+    parser.add_argument("--ai-per-image-latency", type=float, default=0.0, help="Gemini 替身每張圖片的延遲秒數")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    _quiet_streamlit_logs()
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "repeats": args.repeats,
+            "db_latency": args.db_latency,
+            "ai_latency": args.ai_latency,
+            "ai_per_image_latency": args.ai_per_image_latency
+        },
+        "scenarios": {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix="wardrobe_bench_") as workdir, \
+            StubEnvironment(args.db_latency, args.ai_latency, args.ai_per_image_latency) as env:
+        for name in args.scenarios:
+            for size in args.sizes:
+                images = generate_wardrobe_images(size)
+                print(f"▶ {name} × {size}", flush=True)
+                scenario = SCENARIOS[name](env, size, images, workdir)
+                results["scenarios"].setdefault(name, {})[str(size)] = measure(
+                    scenario, args.repeats, not args.no_memory
+                )
+
+    results["max_rss_mb"] = _max_rss_mb()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
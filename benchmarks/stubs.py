@@ -0,0 +1,471 @@
+"""
+基準測試用的本機替身
+- PostgrestStub: 相容 PostgREST 的 HTTP 伺服器，真正的 supabase 客戶端可直接連線 (users / my_wardrobe)
+- FakeGenerativeModel: 可設定延遲、結果固定的 Gemini 模型，以假的 google.generativeai 模組注入
+- WeatherStub: 相容 OpenWeather /weather 的 HTTP 伺服器
+- StubEnvironment: 一次啟動以上替身並設定對應的環境變數
+"""
+import base64
+import hashlib
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload, headers: Optional[dict] = None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+class _StubServer:
+    """在背景執行緒中執行的 HTTP 伺服器"""
+
+    handler_class = _QuietHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency  # 每個請求額外的延遲秒數（模擬網路往返）
+        self.request_count = 0
+        stub = self
+
+        class Handler(self.handler_class):
+            pass
+        Handler.stub = stub
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# === PostgREST ===
+
+def _coerce(value: str):
+    """將查詢字串的值轉為可比較的型別"""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[len("not."):]
+    operator, _, operand = expression.partition(".")
+    value = row.get(column)
+
+    if operator == "is":
+        result = value is None if operand == "null" else str(value).lower() == operand
+    elif operator == "in":
+        options = [option.strip().strip('"') for option in operand.strip("()").split(",")]
+        result = str(value) in options
+    elif value is None:
+        result = False
+    elif operator == "eq":
+        result = str(value) == operand
+    elif operator == "neq":
+        result = str(value) != operand
+    elif operator in ("gt", "gte", "lt", "lte"):
+        left, right = _coerce(str(value)), _coerce(operand)
+        if type(left) is not type(right):
+            left, right = str(left), str(right)
+        result = {
+            "gt": left > right, "gte": left >= right,
+            "lt": left < right, "lte": left <= right
+        }[operator]
+    else:
+        raise ValueError(f"不支援的運算子: {operator}")
+    return result != negate
+
+class _PostgrestHandler(_QuietHandler):
+    def _parse(self):
+        parts = urlsplit(self.path)
+        match = re.fullmatch(r"/rest/v1/(\w+)", parts.path)
+        if not match or match.group(1) not in self.stub.tables:
+            self._send_json(404, {"message": f"relation {parts.path} does not exist"})
+            return None
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        return match.group(1), params
+
+    def _read_body(self):
+        # 一律讀完請求內容（DELETE 也可能帶有內容），否則 keep-alive 連線的下一個請求會錯位
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _filters(self, params) -> List[tuple]:
+        reserved = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+        return [(column, expression) for column, expression in params if column not in reserved]
+
+    def _respond_rows(self, status: int, rows: List[dict], params):
+        if "return=representation" in (self.headers.get("Prefer") or ""):
+            self._send_json(status, self.stub.project(rows, dict(params).get("select", "*")))
+        else:
+            self._send_json(status, [])
+
+    def _handle(self, method: str):
+        self.stub.request_count += 1
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        body = self._read_body()
+        parsed = self._parse()
+        if parsed is None:
+            return
+        table, params = parsed
+        try:
+            if method == "GET":
+                rows = self.stub.query(table, self._filters(params), dict(params))
+                self._send_json(200, rows, {"Content-Range": f"0-{max(len(rows) - 1, 0)}/*"})
+            elif method == "POST":
+                rows = self.stub.insert(table, body)
+                self._respond_rows(201, rows, params)
+            elif method == "PATCH":
+                rows = self.stub.update(table, self._filters(params), body)
+                self._respond_rows(200, rows, params)
+            elif method == "DELETE":
+                rows = self.stub.delete(table, self._filters(params))
+                self._respond_rows(200, rows, params)
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"message": str(e)})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+class PostgrestStub(_StubServer):
+    """
+    記憶體內的 PostgREST 替身
+
+    支援 select、eq / neq / gt / gte / lt / lte / in / is 與 not. 篩選、order、limit / offset，
+    以及 insert / update / delete（Prefer: return=representation）。
+    設定 max_rows 時與 PostgREST 的 max-rows 相同，每次 select 最多回傳該筆數。
+    """
+
+    handler_class = _PostgrestHandler
+    TABLES = ("users", "my_wardrobe")
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        super().__init__(host, port, latency)
+        self.tables: Dict[str, List[dict]] = {name: [] for name in self.TABLES}
+        self._next_ids: Dict[str, int] = {name: 1 for name in self.TABLES}
+        self.max_rows: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            for name in self.TABLES:
+                self.tables[name] = []
+                self._next_ids[name] = 1
+
+    @staticmethod
+    def project(rows: List[dict], select: str) -> List[dict]:
+        columns = [column.strip() for column in select.split(",") if column.strip()]
+        if not columns or "*" in columns:
+            return [dict(row) for row in rows]
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def query(self, table: str, filters: List[tuple], params: dict) -> List[dict]:
+        with self._lock:
+            rows = [row for row in self.tables[table] if all(_matches(row, c, e) for c, e in filters)]
+
+        for clause in reversed([c for c in params.get("order", "").split(",") if c]):
+            column, _, direction = clause.partition(".")
+            descending = direction.startswith("desc")
+            present = [row for row in rows if row.get(column) is not None]
+            missing = [row for row in rows if row.get(column) is None]
+            present.sort(key=lambda row: row[column], reverse=descending)
+            # PostgreSQL 預設 NULL 在遞增時排最後、遞減時排最前
+            rows = missing + present if descending else present + missing
+
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+        if self.max_rows is not None:
+            rows = rows[:self.max_rows]
+        return self.project(rows, params.get("select", "*"))
+
+    def insert(self, table: str, payload) -> List[dict]:
+        records = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        with self._lock:
+            for record in records:
+                row = dict(record)
+                if row.get("id") is None:
+                    row["id"] = self._next_ids[table]
+                self._next_ids[table] = max(self._next_ids[table], int(row["id"])) + 1
+                if table == "my_wardrobe":
+                    row.setdefault("created_at", datetime.now().isoformat())
+                self.tables[table].append(row)
+                inserted.append(row)
+        return inserted
+
+    def update(self, table: str, filters: List[tuple], values: dict) -> List[dict]:
+        with self._lock:
+            rows = [row for row in self.tables[table] if all(_matches(row, c, e) for c, e in filters)]
+            for row in rows:
+                row.update(values)
+        return rows
+
+    def delete(self, table: str, filters: List[tuple]) -> List[dict]:
+        with self._lock:
+            kept, deleted = [], []
+            for row in self.tables[table]:
+                (deleted if all(_matches(row, c, e) for c, e in filters) else kept).append(row)
+            self.tables[table] = kept
+        return deleted
+
+    def add_user(self, username: str, password: str = "bench") -> int:
+        """建立使用者並回傳 id"""
+        return self.insert("users", {"username": username, "password": password})[0]["id"]
+
+    def seed_wardrobe(self, user_id: int, images: List[bytes]):
+        """直接寫入使用者的衣物 (不經過 API)，欄位與 WardrobeService 存入的一致"""
+        from utils.image_hash import compute_dhash
+        rows = []
+        for idx, img_bytes in enumerate(images):
+            digest = hashlib.sha256(img_bytes).hexdigest()
+            rows.append({
+                "user_id": user_id,
+                "name": f"衣物{idx}",
+                "category": FAKE_CATEGORIES[idx % len(FAKE_CATEGORIES)],
+                "color": FAKE_COLORS[idx % len(FAKE_COLORS)],
+                "style": "休閒",
+                "warmth": idx % 10 + 1,
+                "image_data": base64.b64encode(img_bytes).decode("utf-8"),
+                "image_hash": digest,
+                "raw_hash": digest,
+                "phash": compute_dhash(img_bytes)
+            })
+        self.insert("my_wardrobe", rows)
+
+# === Gemini ===
+
+FAKE_CATEGORIES = ("上衣", "下身", "外套", "鞋子", "配件")
+FAKE_COLORS = ("白色", "黑色", "藍色", "紅色", "灰色", "綠色")
+TOKENS_PER_IMAGE = 258  # Gemini 每張圖片計價的 token 數
+
+class FakeGenerativeModel:
+    """
+    固定輸出的 GenerativeModel 替身
+
+    標籤請求依圖片內容回傳可重現的標籤 (拼圖模式附格子編號)，推薦請求回傳提到前幾件衣物的文字，
+    並提供與實際回應相同欄位的 usage_metadata。
+    """
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", latency: float = 0.0, per_image_latency: float = 0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.per_image_latency = per_image_latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tags_for(index: int, seed: bytes) -> dict:
+        digest = hashlib.sha256(seed).digest()
+        return {
+            "name": f"{FAKE_COLORS[digest[1] % len(FAKE_COLORS)]}{FAKE_CATEGORIES[digest[0] % len(FAKE_CATEGORIES)]}{index}",
+            "category": FAKE_CATEGORIES[digest[0] % len(FAKE_CATEGORIES)],
+            "color": FAKE_COLORS[digest[1] % len(FAKE_COLORS)],
+            "style": "休閒",
+            "warmth": digest[2] % 10 + 1
+        }
+
+    def _tag_response(self, prompt: str, images: List[bytes]) -> str:
+        montage = re.search(r"共 (\d+) 件衣服", prompt)
+        if montage:
+            count = int(montage.group(1))
+            seed = b"".join(hashlib.sha256(image).digest() for image in images)
+            tags = []
+            for tile in range(1, count + 1):
+                tag = self._tags_for(tile, seed + bytes([tile % 256]))
+                tags.append({"tile": tile, **tag})
+            return json.dumps(tags, ensure_ascii=False)
+        return json.dumps([self._tags_for(i, image) for i, image in enumerate(images)], ensure_ascii=False)
+
+    @staticmethod
+    def _recommend_response(prompt: str) -> str:
+        names = re.findall(r'"name": "([^"]+)"', prompt)[:3]
+        lines = ["今日推薦穿搭:"] + [f"- {name}: 適合今天的天氣與場合" for name in names]
+        return "\n".join(lines)
+
+    def generate_content(self, contents, **kwargs):
+        with self._lock:
+            self.request_count += 1
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = "".join(part for part in parts if isinstance(part, str))
+        images = [part["data"] for part in parts if isinstance(part, dict)]
+
+        time.sleep(self.latency + self.per_image_latency * len(images))
+        text = self._tag_response(prompt, images) if images else self._recommend_response(prompt)
+
+        prompt_tokens = len(prompt) // 2 + TOKENS_PER_IMAGE * len(images)
+        output_tokens = len(text) // 2
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens
+            )
+        )
+
+class FakeGenerativeServiceClient:
+    """GenerativeServiceClient 替身（只記錄建立時的金鑰，請求由 FakeGenerativeModel 處理）"""
+
+    def __init__(self, client_options=None, **kwargs):
+        self.api_key = (client_options or {}).get("api_key")
+
+def _ensure_package(name: str) -> types.ModuleType:
+    """取得套件模組，無法匯入時建立空的套件"""
+    module = sys.modules.get(name)
+    if module is None:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            module = types.ModuleType(name)
+            module.__path__ = []
+            sys.modules[name] = module
+    return module
+
+def install_fake_genai(latency: float = 0.0, per_image_latency: float = 0.0) -> types.ModuleType:
+    """
+    以假的 google.generativeai 與 google.ai.generativelanguage 模組取代 SDK
+
+    AIService 第一次使用模型時才匯入 SDK，注入後建立的模型即為 FakeGenerativeModel，
+    模型的 client 為 FakeGenerativeServiceClient。
+    """
+    module = types.ModuleType("google.generativeai")
+    module.GenerativeModel = lambda model_name, **kwargs: FakeGenerativeModel(model_name, latency, per_image_latency)
+
+    glm = types.ModuleType("google.ai.generativelanguage")
+    glm.GenerativeServiceClient = FakeGenerativeServiceClient
+
+    google = _ensure_package("google")
+    google_ai = _ensure_package("google.ai")
+    google.generativeai = module
+    google_ai.generativelanguage = glm
+    sys.modules["google.generativeai"] = module
+    sys.modules["google.ai.generativelanguage"] = glm
+    return module
+
+# === OpenWeather ===
+
+class _WeatherHandler(_QuietHandler):
+    def do_GET(self):
+        self.stub.request_count += 1
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        parts = urlsplit(self.path)
+        if parts.path.rstrip("/").split("/")[-1] != "weather":
+            self._send_json(404, {"cod": "404", "message": "not found"})
+            return
+        city = dict(parse_qsl(parts.query)).get("q", "Taipei")
+        temp = 15 + int(hashlib.sha256(city.encode("utf-8")).hexdigest(), 16) % 15
+        self._send_json(200, {
+            "name": city,
+            "main": {"temp": float(temp), "feels_like": float(temp - 1)},
+            "weather": [{"description": "晴時多雲"}]
+        })
+
+class WeatherStub(_StubServer):
+    """OpenWeather 替身 (WeatherService 的 base_url 指向 url 即可)"""
+
+    handler_class = _WeatherHandler
+
+# === 整合 ===
+
+class StubEnvironment:
+    """
+    啟動所有替身並設定 AppConfig.from_env 讀取的環境變數
+
+    用法:
+        with StubEnvironment(db_latency=0.005) as env:
+            user_id = env.db.add_user("bench")
+            ...
+    """
+
+    def __init__(self, db_latency: float = 0.0, ai_latency: float = 0.0, ai_per_image_latency: float = 0.0,
+                 weather_latency: float = 0.0):
+        self.db = PostgrestStub(latency=db_latency)
+        self.weather = WeatherStub(latency=weather_latency)
+        self.ai_latency = ai_latency
+        self.ai_per_image_latency = ai_per_image_latency
+        self._previous_env = {}
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {
+            "GEMINI_KEY": "fake-gemini-key",
+            "WEATHER_KEY": "fake-weather-key",
+            "SUPABASE_URL": self.db.url,
+            "SUPABASE_KEY": "fake-supabase-key",
+            "WEATHER_BASE_URL": f"{self.weather.url}/data/2.5"
+        }
+
+    def start(self):
+        self.db.start()
+        self.weather.start()
+        install_fake_genai(self.ai_latency, self.ai_per_image_latency)
+        for name, value in self.env.items():
+            self._previous_env[name] = os.environ.get(name)
+            os.environ[name] = value
+        return self
+
+    def stop(self):
+        for name, value in self._previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.db.stop()
+        self.weather.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -3,72 +3,191 @@ AI 服務層
 處理所有與 Gemini API 相關的業務邏輯
 """
 import json
+import logging
+import threading
 import time
-import google.generativeai as genai
-from typing import List, Dict, Optional, Tuple
-from database.models import ClothingItem, WeatherData
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+from database.models import PROMPT_FIELDS, ClothingItem, WeatherData
+from api.batch_tuner import AdaptiveBatchSizer
+from api.tag_cache import TagCache
+from api.usage_tracker import UsageRecord, UsageTracker, extract_token_usage, get_usage_tracker
+from utils.image_hash import compute_dhash
+from utils.perf import instrument, timed
 
+if TYPE_CHECKING:
+    from utils.image_processing import MontageLayout
+
+logger = logging.getLogger(__name__)
+
+@instrument
 class AIService:
-    def __init__(self, api_key: str, rate_limit_seconds: int = 15):
+    def __init__(
+        self,
+        api_key: str,
+        rate_limit_seconds: int = 15,
+        tag_cache: Optional[TagCache] = None,
+        montage_layout: Optional['MontageLayout'] = None,
+        batch_sizer: Optional[AdaptiveBatchSizer] = None,
+        usage_tracker: Optional[UsageTracker] = None
+    ):
         self.api_key = api_key
         self.rate_limit_seconds = rate_limit_seconds
         self.last_request_time = 0
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self._lock = threading.Lock()  # 實例跨 Session 共用，保護速率限制與統計
+        self.tag_cache = tag_cache
+        self.montage_layout = montage_layout  # 設定後改用拼圖模式標籤
+        self.batch_sizer = batch_sizer  # 設定後依實際狀況調整批次大小
+        self.usage = usage_tracker or get_usage_tracker()  # 每次呼叫的 token、大小與延遲紀錄
+        self._model = None
+    
+    @property
+    def model(self):
+        """Gemini 模型（第一次使用時才載入 SDK 並建立，避免拖慢冷啟動）"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    model = genai.GenerativeModel('gemini-2.5-flash')
+                    # 不使用 genai.configure（程序全域設定）：實例依金鑰快取，各自持有 client 才不會互相覆蓋金鑰。
+                    # GenerativeModel 沒有公開的 client 參數，這裡依賴 google-generativeai 0.8.x 的私有屬性
+                    # _client（為 None 時才改用全域 client）；升級 SDK 時需確認此行為未改變
+                    model._client = self._make_client()
+                    self._model = model
+        return self._model
     
-    def _rate_limit_wait(self):
-        """API 速率限制保護"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+    @model.setter
+    def model(self, model):
+        self._model = model
+    
+    def _make_client(self):
+        """以本實例的 API 金鑰建立 Gemini client"""
+        from google.ai import generativelanguage as glm
+        return glm.GenerativeServiceClient(client_options={"api_key": self.api_key})
+    
+    def _rate_limit_wait(self) -> float:
+        """API 速率限制保護（多個執行緒同時呼叫時依序預約請求時間），回傳等待秒數"""
+        with self._lock:
+            current_time = time.time()
+            wait_time = max(0.0, self.last_request_time + self.rate_limit_seconds - current_time)
+            self.last_request_time = current_time + wait_time
         
-        if time_since_last < self.rate_limit_seconds:
-            wait_time = self.rate_limit_seconds - time_since_last
+        if wait_time > 0:
             time.sleep(wait_time)
+        return wait_time
+    
+    def batch_auto_tag(
+        self,
+        img_bytes_list: List[bytes],
+        image_hashes: Optional[List[str]] = None,
+        phashes: Optional[List[Optional[str]]] = None,
+        user_id: Optional[str] = None,
+        retries: int = 0
+    ) -> Optional[List[Dict]]:
+        """
+        批次 AI 自動標籤（先查標籤快取，只有未命中的圖片送進 AI）
         
-        self.last_request_time = time.time()
+        參數同 batch_auto_tag_with_hits，只回傳標籤列表或 None（如果失敗）。
+        """
+        return self.batch_auto_tag_with_hits(img_bytes_list, image_hashes, phashes, user_id, retries)[0]
     
-    def batch_auto_tag(self, img_bytes_list: List[bytes]) -> Optional[List[Dict]]:
+    @timed(bytes_fn=lambda result, self, img_bytes_list, *args, **kwargs: sum(map(len, img_bytes_list)))
+    def batch_auto_tag_with_hits(
+        self,
+        img_bytes_list: List[bytes],
+        image_hashes: Optional[List[str]] = None,
+        phashes: Optional[List[Optional[str]]] = None,
+        user_id: Optional[str] = None,
+        retries: int = 0
+    ) -> Tuple[Optional[List[Dict]], List[bool]]:
         """
-        批次 AI 自動標籤
+        批次 AI 自動標籤，並回報本次呼叫中哪些圖片命中標籤快取
+        
+        快取的命中統計由所有 Session 共用，需要單次上傳的命中數時以回傳值計算。
         
         Args:
             img_bytes_list: 圖片 bytes 列表
+            image_hashes: 對應的圖片 SHA256 hash 列表（提供時才使用快取）
+            phashes: 對應的感知雜湊列表（未提供時視需要自行計算）
+            user_id: 用量紀錄中的使用者
+            retries: 這批圖片先前已重試的次數（用量紀錄用）
+            
+        Returns:
+            (標籤列表或 None（如果失敗）, 每張圖片是否命中快取)
+        """
+        cache_hits = [False] * len(img_bytes_list)
+        if self.tag_cache is None or image_hashes is None:
+            return self._request_batch_tags(img_bytes_list, user_id, retries), cache_hits
+        
+        tags_list: List[Optional[Dict]] = [None] * len(img_bytes_list)
+        phashes = list(phashes) if phashes else [None] * len(img_bytes_list)
+        miss_indices = []
+        
+        for idx, (img_bytes, img_hash) in enumerate(zip(img_bytes_list, image_hashes)):
+            if self.tag_cache.use_phash and phashes[idx] is None:
+                try:
+                    phashes[idx] = compute_dhash(img_bytes)
+                except Exception:
+                    phashes[idx] = None
+            
+            cached = self.tag_cache.get(img_hash, phashes[idx])
+            if cached is not None:
+                tags_list[idx] = cached
+                cache_hits[idx] = True
+            else:
+                miss_indices.append(idx)
+        
+        if miss_indices:
+            new_tags = self._request_batch_tags([img_bytes_list[i] for i in miss_indices], user_id, retries)
+            if new_tags is None:
+                return None, cache_hits
+            
+            for idx, tags in zip(miss_indices, new_tags):
+                self.tag_cache.put(image_hashes[idx], tags, phashes[idx])
+                tags_list[idx] = tags
+        
+        return tags_list, cache_hits
+    
+    def suggest_batch_size(self) -> Optional[int]:
+        """建議的批次大小（未啟用自動調整時為 None）"""
+        return self.batch_sizer.suggest() if self.batch_sizer else None
+    
+    @timed(bytes_fn=lambda result, self, img_bytes_list, *args, **kwargs: sum(map(len, img_bytes_list)))
+    def _request_batch_tags(
+        self,
+        img_bytes_list: List[bytes],
+        user_id: Optional[str] = None,
+        retries: int = 0
+    ) -> Optional[List[Dict]]:
+        """
+        呼叫 Gemini 進行批次標籤
+        
+        Args:
+            img_bytes_list: 圖片 bytes 列表
+            user_id: 用量紀錄中的使用者
+            retries: 先前已重試的次數
             
         Returns:
             標籤列表或 None（如果失敗）
         """
+        outcome = "error"
+        started = None
+        wait_seconds = 0.0
+        request_bytes = 0
+        tokens = (0, 0, 0)
+        error = None
         try:
-            self._rate_limit_wait()
-            
-            prompt = f"""請仔細分析這 {len(img_bytes_list)} 件衣服,為每件衣服分別回傳 JSON 格式的標籤。
-
-回傳格式必須是一個 JSON 陣列,包含 {len(img_bytes_list)} 個物件:
-[
-  {{
-    "name": "衣服名稱(如:白色T恤、牛仔褲)",
-    "category": "上衣|下身|外套|鞋子|配件",
-    "color": "主要顏色",
-    "style": "風格(如:休閒、正式、運動)",
-    "warmth": 保暖度1-10的數字
-  }},
-  ... (依序對應每張圖片)
-]
-
-重要規則:
-1. 只回傳 JSON 陣列,不要任何其他文字
-2. 不要包含 ```json 或任何 Markdown 標籤
-3. 陣列中的順序必須與圖片順序一致
-4. 每個物件都必須包含所有 5 個欄位
-"""
+            wait_seconds = self._rate_limit_wait()
+            started = time.time()
             
-            content_parts = [prompt]
-            for img_bytes in img_bytes_list:
-                content_parts.append({
-                    "mime_type": "image/jpeg",
-                    "data": img_bytes
-                })
+            if self.montage_layout:
+                content_parts = self._build_montage_parts(img_bytes_list)
+            else:
+                content_parts = self._build_image_parts(img_bytes_list)
             
+            request_bytes = len(content_parts[0].encode('utf-8')) + sum(len(part["data"]) for part in content_parts[1:])
             response = self.model.generate_content(content_parts)
+            tokens = extract_token_usage(response)
+            outcome = "mismatch"  # 以下的解析或驗證失敗皆視為回傳內容不符
             
             # 清理並解析回應
             clean_text = response.text.strip()
@@ -83,6 +202,9 @@ class AIService:
             if len(tags_list) != len(img_bytes_list):
                 raise ValueError(f"AI 回傳數量不符: 預期 {len(img_bytes_list)} 件,實際 {len(tags_list)} 件")
             
+            if self.montage_layout:
+                tags_list = self._order_by_tile(tags_list)
+            
             # 驗證必要欄位
             required_fields = ['name', 'category', 'color', 'warmth']
             for idx, tags in enumerate(tags_list):
@@ -92,21 +214,146 @@ class AIService:
                 
                 tags['warmth'] = int(tags['warmth'])
             
+            outcome = "ok"
             return tags_list
             
         except json.JSONDecodeError as e:
-            print(f"JSON 解析錯誤: {str(e)}")
+            error = f"JSON 解析錯誤: {str(e)}"
+            logger.warning(error)
             return None
         except Exception as e:
-            print(f"批次 AI 標籤失敗: {str(e)}")
+            error = f"批次 AI 標籤失敗: {str(e)}"
+            logger.warning(error)
             return None
+        finally:
+            if started is not None:
+                self._record_usage(
+                    "tag", user_id, len(img_bytes_list), request_bytes, tokens,
+                    time.time() - started, wait_seconds, retries, outcome, error
+                )
+            if self.batch_sizer and started is not None:
+                self.batch_sizer.record(
+                    len(img_bytes_list),
+                    time.time() - started,
+                    sum(len(b) for b in img_bytes_list),
+                    outcome
+                )
+    
+    def _record_usage(
+        self,
+        operation: str,
+        user_id: Optional[str],
+        images: int,
+        request_bytes: int,
+        tokens: Tuple[int, int, int],
+        latency: float,
+        wait_seconds: float,
+        retries: int,
+        outcome: str,
+        error: Optional[str]
+    ):
+        prompt_tokens, output_tokens, total_tokens = tokens
+        self.usage.record(UsageRecord(
+            operation=operation,
+            user_id=user_id,
+            images=images,
+            request_bytes=request_bytes,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            total_tokens=total_tokens,
+            latency=latency,
+            wait_seconds=wait_seconds,
+            retries=retries,
+            outcome=outcome,
+            error=error
+        ))
+    
+    def _build_image_parts(self, img_bytes_list: List[bytes]) -> list:
+        """逐張附圖的請求內容"""
+        prompt = f"""請仔細分析這 {len(img_bytes_list)} 件衣服,為每件衣服分別回傳 JSON 格式的標籤。
+
+回傳格式必須是一個 JSON 陣列,包含 {len(img_bytes_list)} 個物件:
+[
+  {{
+    "name": "衣服名稱(如:白色T恤、牛仔褲)",
+    "category": "上衣|下身|外套|鞋子|配件",
+    "color": "主要顏色",
+    "style": "風格(如:休閒、正式、運動)",
+    "warmth": 保暖度1-10的數字
+  }},
+  ... (依序對應每張圖片)
+]
+
+重要規則:
+1. 只回傳 JSON 陣列,不要任何其他文字
+2. 不要包含 ```json 或任何 Markdown 標籤
+3. 陣列中的順序必須與圖片順序一致
+4. 每個物件都必須包含所有 5 個欄位
+"""
+        
+        content_parts = [prompt]
+        for img_bytes in img_bytes_list:
+            content_parts.append({
+                "mime_type": "image/jpeg",
+                "data": img_bytes
+            })
+        return content_parts
+    
+    def _build_montage_parts(self, img_bytes_list: List[bytes]) -> list:
+        """拼圖模式的請求內容：多件衣服拼成附編號的網格圖"""
+        from utils.image_processing import build_montages
+        montages = build_montages(img_bytes_list, self.montage_layout)
+        count = len(img_bytes_list)
+        
+        prompt = f"""以下 {len(montages)} 張圖片是衣服拼圖,每個格子左上角有編號,共 {count} 件衣服 (編號 1 到 {count})。
+請依格子編號為每件衣服分別回傳 JSON 格式的標籤。
+
+回傳格式必須是一個 JSON 陣列,包含 {count} 個物件:
+[
+  {{
+    "tile": 格子編號,
+    "name": "衣服名稱(如:白色T恤、牛仔褲)",
+    "category": "上衣|下身|外套|鞋子|配件",
+    "color": "主要顏色",
+    "style": "風格(如:休閒、正式、運動)",
+    "warmth": 保暖度1-10的數字
+  }},
+  ...
+]
+
+重要規則:
+1. 只回傳 JSON 陣列,不要任何其他文字
+2. 不要包含 ```json 或任何 Markdown 標籤
+3. 每個格子編號都必須出現一次,只描述該格子內的衣服
+4. 每個物件都必須包含所有 6 個欄位
+"""
+        
+        content_parts = [prompt]
+        for montage_bytes in montages:
+            content_parts.append({
+                "mime_type": "image/jpeg",
+                "data": montage_bytes
+            })
+        return content_parts
+    
+    @staticmethod
+    def _order_by_tile(tags_list: List[Dict]) -> List[Dict]:
+        """依格子編號排序拼圖模式的回應"""
+        by_tile = {}
+        for tags in tags_list:
+            tile = int(tags.pop('tile', 0))
+            if not 1 <= tile <= len(tags_list) or tile in by_tile:
+                raise ValueError(f"AI 回傳格子編號錯誤: {tile}")
+            by_tile[tile] = tags
+        return [by_tile[tile] for tile in range(1, len(tags_list) + 1)]
     
     def generate_outfit_recommendation(
         self, 
         wardrobe: List[ClothingItem],
         weather: WeatherData,
         style: str,
-        occasion: str
+        occasion: str,
+        user_id: Optional[str] = None
     ) -> Optional[str]:
         """
         生成穿搭推薦
@@ -116,18 +363,22 @@ class AIService:
             weather: 天氣資料
             style: 風格偏好
             occasion: 場合
+            user_id: 用量紀錄中的使用者
             
         Returns:
             AI 推薦文字或 None
         """
+        started = None
+        wait_seconds = 0.0
+        request_bytes = 0
+        tokens = (0, 0, 0)
+        outcome = "error"
+        error = None
         try:
-            self._rate_limit_wait()
+            wait_seconds = self._rate_limit_wait()
             
-            # 準備衣櫥摘要（不含圖片資料）
-            wardrobe_summary = [
-                {k: v for k, v in item.to_dict().items() if k != 'image_data'}
-                for item in wardrobe
-            ]
+            # 準備衣櫥摘要：直接讀取衣物屬性的檢視，不複製也不讀取圖片
+            wardrobe_summary = [item.metadata(PROMPT_FIELDS) for item in wardrobe]
             
             prompt = f"""
 你是一位專業的 AI 時尚顧問。請根據以下資訊推薦今日穿搭:
@@ -140,7 +391,7 @@ class AIService:
 - **指定風格: {style}**
 
 **使用者衣櫥:**
-{json.dumps(wardrobe_summary, ensure_ascii=False, indent=2)}
+{json.dumps(wardrobe_summary, ensure_ascii=False, indent=2, default=dict)}
 
 **請提供:**
 1. 推薦的完整穿搭組合,必須符合「{style}」風格並適合「{occasion}」場合。
@@ -150,12 +401,24 @@ class AIService:
 請用親切、專業的口吻回答,使用繁體中文。
 """
             
+            request_bytes = len(prompt.encode('utf-8'))
+            started = time.time()
             response = self.model.generate_content(prompt)
-            return response.text
+            tokens = extract_token_usage(response)
+            text = response.text
+            outcome = "ok"
+            return text
             
         except Exception as e:
-            print(f"AI 推薦失敗: {str(e)}")
+            error = f"AI 推薦失敗: {str(e)}"
+            logger.warning(error)
             return None
+        finally:
+            if started is not None:
+                self._record_usage(
+                    "recommend", user_id, 0, request_bytes, tokens,
+                    time.time() - started, wait_seconds, 0, outcome, error
+                )
     
     def parse_recommended_items(
         self, 
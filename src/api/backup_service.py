@@ -0,0 +1,164 @@
+"""
+衣櫥備份服務
+以串流方式匯出 / 還原衣櫥，記憶體用量只與分頁大小有關，與衣櫥大小無關
+
+備份檔為 tar：
+    items.jsonl          每行一件衣物的資料（不含圖片），"image" 欄位指向圖片檔
+    images/<id>.jpg      衣物圖片原始 bytes
+"""
+import base64
+import io
+import json
+import tarfile
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from database.models import ClothingItem
+from api.wardrobe_service import HASH_PAGE_SIZE, WardrobeService
+
+METADATA_MEMBER = "items.jsonl"
+METADATA_COLUMNS = "id, name, category, color, style, warmth, image_hash, phash, raw_hash, created_at"
+
+def _tar_mode(path: str, write: bool) -> str:
+    """依副檔名決定是否 gzip；使用串流模式 (|) 以循序讀寫"""
+    compression = "gz" if path.endswith((".gz", ".tgz")) else ""
+    return f"{'w' if write else 'r'}|{compression}"
+
+def _add_member(tar: tarfile.TarFile, name: str, fileobj, size: int):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    tar.addfile(info, fileobj)
+
+class BackupService:
+    """衣櫥匯出與還原"""
+
+    def __init__(self, wardrobe_service: WardrobeService):
+        self.wardrobe_service = wardrobe_service
+
+    def export_wardrobe(self, user_id: str, path: str, page_size: int = 50) -> Dict[str, int]:
+        """
+        匯出使用者的衣櫥到 tar 檔
+
+        分兩次讀取：先讀取不含圖片的資料寫成 items.jsonl（放在 tar 開頭，還原時可先讀到），
+        再逐頁讀取圖片寫入 tar。
+
+        Args:
+            user_id: 使用者 ID
+            path: 輸出路徑（.tar 或 .tar.gz）
+            page_size: 每次查詢的筆數
+
+        Returns:
+            {"items": 衣物數, "images": 圖片數, "image_bytes": 圖片總大小}
+        """
+        stats = {"items": 0, "images": 0, "image_bytes": 0}
+
+        # 資料不含圖片，超過 1MB 才寫入暫存檔
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as metadata:
+            for page in self.wardrobe_service.iter_wardrobe_pages(user_id, METADATA_COLUMNS, page_size):
+                for row in page:
+                    row["image"] = f"images/{row['id']}.jpg"
+                    metadata.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                    stats["items"] += 1
+            metadata_size = metadata.tell()
+            metadata.seek(0)
+
+            with tarfile.open(path, _tar_mode(path, write=True)) as tar:
+                _add_member(tar, METADATA_MEMBER, metadata, metadata_size)
+
+                for page in self.wardrobe_service.iter_wardrobe_pages(user_id, "id, image_data", page_size):
+                    for row in page:
+                        if not row.get("image_data"):
+                            continue
+                        img_bytes = base64.b64decode(row["image_data"])
+                        _add_member(tar, f"images/{row['id']}.jpg", io.BytesIO(img_bytes), len(img_bytes))
+                        stats["images"] += 1
+                        stats["image_bytes"] += len(img_bytes)
+
+        return stats
+
+    def restore_wardrobe(
+        self,
+        user_id: str,
+        path: str,
+        batch_size: int = 20,
+        progress_callback=None
+    ) -> Dict[str, int]:
+        """
+        從 tar 檔還原衣櫥到指定使用者
+
+        依序讀取 tar，每累積 batch_size 件即批次寫入；
+        圖片 hash 已存在於衣櫥中的衣物會略過，因此重複執行不會產生重複資料。
+
+        Args:
+            user_id: 還原到的使用者 ID（可與匯出時不同）
+            path: 備份檔路徑
+            batch_size: 每次寫入的筆數
+            progress_callback: 每批寫入後呼叫 progress_callback(stats)
+
+        Returns:
+            {"restored": 已還原, "duplicate": 略過的重複, "failed": 失敗, "missing": 缺少圖片}
+        """
+        stats = {"restored": 0, "duplicate": 0, "failed": 0, "missing": 0}
+        # 分頁讀取既有的圖片 hash（單次查詢會被 PostgREST 的 max-rows 截斷）
+        existing_hashes = {
+            row['image_hash']
+            for page in self.wardrobe_service.iter_wardrobe_pages(user_id, "id, image_hash", HASH_PAGE_SIZE)
+            for row in page
+            if row.get('image_hash')
+        }
+        metadata: Optional[Dict[str, dict]] = None
+        pending: List[Tuple[ClothingItem, bytes]] = []
+
+        def flush():
+            if not pending:
+                return
+            success, result = self.wardrobe_service.save_items(pending)
+            if success:
+                stats["restored"] += len(pending)
+            else:
+                stats["failed"] += len(pending)
+                print(f"還原寫入失敗: {result}")
+            pending.clear()
+            if progress_callback:
+                progress_callback(stats)
+
+        with tarfile.open(path, _tar_mode(path, write=False)) as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+
+                if member.name == METADATA_MEMBER:
+                    metadata = {}
+                    for line in tar.extractfile(member):
+                        if line.strip():
+                            row = json.loads(line)
+                            metadata[row["image"]] = row
+                    continue
+
+                if metadata is None:
+                    raise ValueError(f"備份檔格式錯誤：{METADATA_MEMBER} 必須位於開頭")
+
+                row = metadata.pop(member.name, None)
+                if row is None:
+                    continue
+
+                img_bytes = tar.extractfile(member).read()
+                # 沿用原本的 image_hash（上傳時以原始圖片計算，不一定等於儲存圖片的 hash）
+                image_hash = row.get("image_hash") or WardrobeService.get_image_hash(img_bytes)
+                if image_hash in existing_hashes:
+                    stats["duplicate"] += 1
+                    continue
+                existing_hashes.add(image_hash)
+
+                row.pop("id", None)
+                row.pop("image", None)
+                row["user_id"] = user_id
+                row["image_hash"] = image_hash
+                pending.append((ClothingItem.from_dict(row), img_bytes))
+                if len(pending) >= batch_size:
+                    flush()
+
+        flush()
+        stats["missing"] = len(metadata or {})
+        return stats
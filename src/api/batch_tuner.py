@@ -0,0 +1,140 @@
+"""
+批次大小調整服務
+依實際延遲、請求大小、錯誤率與數量不符率，在設定範圍內自動調整 batch_auto_tag 的批次大小
+"""
+import threading
+import time
+from typing import Optional
+
+class AdaptiveBatchSizer:
+    """
+    加法增加 / 乘法減少 (AIMD) 的批次大小調整器
+
+    - 請求失敗或 AI 回傳數量不符 → 批次縮小為 70%
+    - 延遲超過目標 → 批次減 1
+    - 預估延遲、請求大小都有餘裕且錯誤率低 → 批次加 1
+    - 依平均每張圖片大小，限制批次不超過請求大小上限
+    """
+
+    OUTCOMES = ("ok", "error", "mismatch")
+
+    def __init__(
+        self,
+        min_size: int = 2,
+        max_size: int = 10,
+        initial_size: Optional[int] = None,
+        target_seconds: float = 40.0,
+        max_payload_bytes: int = 4 * 1024 * 1024,
+        smoothing: float = 0.3
+    ):
+        """
+        初始化調整器
+
+        Args:
+            min_size: 最小批次
+            max_size: 最大批次
+            initial_size: 初始批次（預設為範圍中間值）
+            target_seconds: 單次請求的目標延遲
+            max_payload_bytes: 單次請求的圖片大小上限
+            smoothing: 指數移動平均的權重
+        """
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.target_seconds = target_seconds
+        self.max_payload_bytes = max_payload_bytes
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+        self.current_size = self._clamp(initial_size or (min_size + max_size) // 2)
+        self.samples = 0
+        self.avg_latency = None            # 每次請求秒數
+        self.avg_seconds_per_image = None
+        self.avg_bytes_per_image = None
+        self.error_rate = 0.0
+        self.mismatch_rate = 0.0
+        self.last_reason = "初始值"
+        self.last_updated = None
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    def _ewma(self, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return previous + self.smoothing * (value - previous)
+
+    def record(self, batch_size: int, latency: float, payload_bytes: int, outcome: str):
+        """
+        記錄一次批次請求的結果並調整下一批大小
+
+        Args:
+            batch_size: 本次送出的圖片數
+            latency: 請求秒數
+            payload_bytes: 送出的圖片 bytes
+            outcome: ok | error | mismatch
+        """
+        if batch_size <= 0:
+            return
+
+        with self._lock:
+            self.samples += 1
+            self.last_updated = time.time()
+            self.avg_latency = self._ewma(self.avg_latency, latency)
+            self.avg_seconds_per_image = self._ewma(self.avg_seconds_per_image, latency / batch_size)
+            self.avg_bytes_per_image = self._ewma(self.avg_bytes_per_image, payload_bytes / batch_size)
+            self.error_rate = self._ewma(self.error_rate, 1.0 if outcome == "error" else 0.0)
+            self.mismatch_rate = self._ewma(self.mismatch_rate, 1.0 if outcome == "mismatch" else 0.0)
+
+            size = self.current_size
+            if outcome == "error":
+                size = int(size * 0.7)
+                reason = f"請求失敗 (錯誤率 {self.error_rate:.0%})，縮小批次"
+            elif outcome == "mismatch":
+                size = int(size * 0.7)
+                reason = f"AI 回傳數量不符 (不符率 {self.mismatch_rate:.0%})，縮小批次"
+            elif latency > self.target_seconds:
+                size -= 1
+                reason = f"延遲 {latency:.1f}s 超過目標 {self.target_seconds:.0f}s，減少 1 張"
+            elif (
+                self.error_rate < 0.1
+                and self.mismatch_rate < 0.1
+                and batch_size >= size
+                and self.avg_seconds_per_image * (size + 1) <= self.target_seconds
+            ):
+                size += 1
+                reason = f"延遲 {latency:.1f}s 且錯誤率低，增加 1 張"
+            else:
+                reason = "維持目前批次"
+
+            # 依平均圖片大小限制請求大小
+            if self.avg_bytes_per_image:
+                payload_cap = int(self.max_payload_bytes // self.avg_bytes_per_image)
+                if size > payload_cap:
+                    size = payload_cap
+                    reason += f"；受請求大小上限限制 ({payload_cap} 張)"
+
+            self.current_size = self._clamp(size)
+            self.last_reason = reason
+
+    def suggest(self) -> int:
+        """建議的下一批大小"""
+        with self._lock:
+            return self.current_size
+
+    def get_state(self) -> dict:
+        """目前的調整狀態（供畫面顯示為何選擇此批次大小）"""
+        with self._lock:
+            return {
+                "batch_size": self.current_size,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "reason": self.last_reason,
+                "samples": self.samples,
+                "avg_latency_s": round(self.avg_latency, 2) if self.avg_latency is not None else None,
+                "avg_seconds_per_image": round(self.avg_seconds_per_image, 2) if self.avg_seconds_per_image is not None else None,
+                "avg_kb_per_image": round(self.avg_bytes_per_image / 1024, 1) if self.avg_bytes_per_image is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "mismatch_rate": round(self.mismatch_rate, 3),
+                "target_seconds": self.target_seconds,
+                "max_payload_kb": self.max_payload_bytes // 1024
+            }
@@ -0,0 +1,463 @@
+"""
+背景標籤工作佇列
+以 SQLite 持久化待標籤的圖片，由背景執行緒負責 AI 標籤與存檔，不再佔用 Streamlit 執行緒
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+from database.models import ClothingItem
+
+if TYPE_CHECKING:
+    # 只用於型別標註，避免在匯入佇列時就載入 numpy / PIL
+    from utils.image_processing import PreparedImage
+
+# 工作狀態
+JOB_QUEUED = "queued"
+JOB_TAGGING = "tagging"
+JOB_SAVING = "saving"
+JOB_DONE = "done"
+JOB_DUPLICATE = "duplicate"
+JOB_FAILED = "failed"
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_TAGGING, JOB_SAVING)
+
+def credentials_fingerprint(ai_service, wardrobe_service) -> str:
+    """
+    服務所用連線設定 (Gemini 金鑰、Supabase URL 與金鑰) 的指紋
+
+    工作只記錄指紋而不保存金鑰本身，背景執行緒依指紋找回建立工作時的服務。
+    """
+    db = wardrobe_service.db
+    material = "\n".join((ai_service.api_key or "", db.url or "", db.key or ""))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+@dataclass
+class TagJob:
+    """一筆標籤工作"""
+    id: int
+    user_id: str
+    file_name: str
+    raw_hash: str
+    image_hash: str
+    phash: str
+    ai_bytes: bytes
+    storage_bytes: bytes
+    attempts: int
+    credentials: Optional[str] = None  # 建立工作時的連線設定指紋（舊資料為 None，使用預設服務）
+
+class TagJobQueue:
+    """SQLite 持久化的標籤工作佇列"""
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        """
+        初始化佇列，並將上次中斷時處理到一半的工作放回佇列
+
+        Args:
+            db_path: SQLite 檔案路徑
+            max_attempts: 每筆工作最多嘗試次數
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tag_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                raw_hash TEXT,
+                image_hash TEXT NOT NULL,
+                phash TEXT,
+                ai_bytes BLOB,
+                storage_bytes BLOB,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                item_name TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                UNIQUE (user_id, image_hash)
+            )
+        """)
+        # 舊版建立的資料表補上新欄位
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tag_jobs)")}
+        for column, column_type in (("credentials", "TEXT"), ("duplicate_of", "TEXT"), ("cache_hit", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE tag_jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_jobs_status ON tag_jobs(status, id)")
+
+        # 恢復中斷的工作 (程序重啟時仍在處理中的工作)
+        self._conn.execute(
+            "UPDATE tag_jobs SET status = ?, updated_at = ? WHERE status IN (?, ?)",
+            (JOB_QUEUED, datetime.now().isoformat(), JOB_TAGGING, JOB_SAVING)
+        )
+        self._conn.commit()
+
+    def enqueue(
+        self,
+        user_id: str,
+        file_name: str,
+        raw_hash: str,
+        prepared: 'PreparedImage',
+        credentials: Optional[str] = None,
+        duplicate_of: Optional[str] = None
+    ) -> Tuple[int, bool]:
+        """
+        加入一筆工作（同一使用者的相同 image_hash 只會有一筆）
+
+        失敗的舊工作會以新資料重新排入佇列。
+
+        Args:
+            credentials: 連線設定指紋 (credentials_fingerprint)，背景執行緒以對應的服務處理
+            duplicate_of: 外觀非常相似的既有衣物名稱（疑似重複，仍照常處理，只在工作明細標示）
+
+        Returns:
+            (工作 ID, 是否為新加入)
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status FROM tag_jobs WHERE user_id = ? AND image_hash = ?",
+                (user_id, prepared.image_hash)
+            ).fetchone()
+
+            if row is not None and row["status"] != JOB_FAILED:
+                return row["id"], False
+
+            if row is not None:
+                self._conn.execute(
+                    """
+                    UPDATE tag_jobs SET file_name = ?, raw_hash = ?, phash = ?, ai_bytes = ?,
+                        storage_bytes = ?, credentials = ?, duplicate_of = ?, status = ?, attempts = 0,
+                        error = NULL, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (file_name, raw_hash, prepared.phash, prepared.ai_bytes,
+                     prepared.storage_bytes, credentials, duplicate_of, JOB_QUEUED, now, row["id"])
+                )
+                self._conn.commit()
+                return row["id"], True
+
+            cursor = self._conn.execute(
+                """
+                INSERT INTO tag_jobs (user_id, file_name, raw_hash, image_hash, phash,
+                    ai_bytes, storage_bytes, credentials, duplicate_of, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, file_name, raw_hash, prepared.image_hash, prepared.phash,
+                 prepared.ai_bytes, prepared.storage_bytes, credentials, duplicate_of, JOB_QUEUED, now, now)
+            )
+            self._conn.commit()
+            return cursor.lastrowid, True
+
+    def next_batch_key(self, credentials: List[str], include_legacy: bool = False) -> Optional[Tuple[Optional[str], str]]:
+        """
+        最早一筆可處理工作的 (連線設定指紋, 使用者 ID)
+
+        Args:
+            credentials: 目前有對應服務的指紋
+            include_legacy: 是否包含沒有指紋的舊工作
+        """
+        conditions = []
+        params: list = [JOB_QUEUED]
+        if credentials:
+            conditions.append(f"credentials IN ({', '.join('?' for _ in credentials)})")
+            params.extend(credentials)
+        if include_legacy:
+            conditions.append("credentials IS NULL")
+        if not conditions:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT credentials, user_id FROM tag_jobs WHERE status = ? AND ({' OR '.join(conditions)}) ORDER BY id LIMIT 1",
+                params
+            ).fetchone()
+        return (row["credentials"], row["user_id"]) if row else None
+
+    def claim_batch(self, max_size: int, credentials: Optional[str], user_id: str) -> List[TagJob]:
+        """
+        取出同一連線設定、同一使用者最早的一批工作並標記為標籤中
+
+        一批工作會以同一組金鑰送出同一個請求，因此不混合不同設定或不同使用者的圖片。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, user_id, file_name, raw_hash, image_hash, phash, ai_bytes, storage_bytes, attempts, credentials
+                FROM tag_jobs WHERE status = ? AND credentials IS ? AND user_id = ? ORDER BY id LIMIT ?
+                """,
+                (JOB_QUEUED, credentials, user_id, max_size)
+            ).fetchall()
+            if not rows:
+                return []
+
+            self._conn.executemany(
+                "UPDATE tag_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(JOB_TAGGING, datetime.now().isoformat(), row["id"]) for row in rows]
+            )
+            self._conn.commit()
+
+        return [
+            TagJob(
+                id=row["id"],
+                user_id=row["user_id"],
+                file_name=row["file_name"],
+                raw_hash=row["raw_hash"],
+                image_hash=row["image_hash"],
+                phash=row["phash"],
+                ai_bytes=row["ai_bytes"],
+                storage_bytes=row["storage_bytes"],
+                attempts=row["attempts"] + 1,
+                credentials=row["credentials"]
+            )
+            for row in rows
+        ]
+
+    def _update(self, job_id: int, status: str, **fields):
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        sql = f"UPDATE tag_jobs SET status = ?, updated_at = ?{', ' + assignments if fields else ''} WHERE id = ?"
+        with self._lock:
+            self._conn.execute(sql, (status, datetime.now().isoformat(), *fields.values(), job_id))
+            self._conn.commit()
+
+    def mark_saving(self, job_id: int, item_name: str):
+        self._update(job_id, JOB_SAVING, item_name=item_name)
+
+    def mark_done(self, job_id: int, item_name: str, cache_hit: bool = False):
+        """完成後清除圖片資料，只保留狀態紀錄（cache_hit: 標籤是否取自標籤快取）"""
+        self._update(
+            job_id, JOB_DONE,
+            item_name=item_name, ai_bytes=None, storage_bytes=None, error=None, cache_hit=int(cache_hit)
+        )
+
+    def mark_duplicate(self, job_id: int, existing_name: str):
+        self._update(job_id, JOB_DUPLICATE, item_name=existing_name, ai_bytes=None, storage_bytes=None)
+
+    def mark_failed(self, job: TagJob, error: str):
+        """失敗時未達嘗試上限則重新排入佇列"""
+        if job.attempts < self.max_attempts:
+            self._update(job.id, JOB_QUEUED, error=error)
+        else:
+            self._update(job.id, JOB_FAILED, error=error)
+
+    def get_user_jobs(self, user_id: str, limit: int = 50) -> List[Dict]:
+        """使用者最近的工作（不含圖片資料）"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, file_name, status, attempts, error, item_name, duplicate_of, cache_hit, updated_at
+                FROM tag_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                """,
+                (user_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_user_summary(self, user_id: str) -> Dict[str, int]:
+        """使用者各狀態的工作數量"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM tag_jobs WHERE user_id = ? GROUP BY status",
+                (user_id,)
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def count_cache_hits(self, user_id: str) -> int:
+        """使用者已完成的工作中，標籤取自標籤快取（未呼叫 AI）的數量"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM tag_jobs WHERE user_id = ? AND status = ? AND cache_hit = 1",
+                (user_id, JOB_DONE)
+            ).fetchone()
+        return row[0]
+
+    def has_active_jobs(self, user_id: Optional[str] = None) -> bool:
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        sql = f"SELECT 1 FROM tag_jobs WHERE status IN ({placeholders})"
+        params = list(ACTIVE_STATUSES)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        with self._lock:
+            return self._conn.execute(sql + " LIMIT 1", params).fetchone() is not None
+
+    def clear_finished(self, user_id: str):
+        """清除使用者已結束 (完成 / 重複 / 失敗) 的工作紀錄"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM tag_jobs WHERE user_id = ? AND status IN (?, ?, ?)",
+                (user_id, JOB_DONE, JOB_DUPLICATE, JOB_FAILED)
+            )
+            self._conn.commit()
+
+class TagJobWorker:
+    """
+    從佇列取出工作、標籤並存入資料庫的背景執行緒
+
+    Session 以 register_services 登錄所用的 AI 與衣櫥服務並取得指紋，工作依指紋找回對應的服務，
+    不同 Session 的金鑰與資料庫不會混用。只有已登錄服務的工作會被取出，其餘留在佇列等待。
+    """
+
+    def __init__(
+        self,
+        queue: TagJobQueue,
+        num_threads: int = 1,
+        default_batch_size: int = 10,
+        max_services: int = 16,
+        default_services: Optional[Callable[[], Tuple[object, object]]] = None
+    ):
+        """
+        Args:
+            default_services: 建立預設服務的函式，於背景執行緒中第一次取工作前才呼叫，
+                避免在 Streamlit 執行緒載入 AI 相關模組
+        """
+        self.queue = queue
+        self.num_threads = num_threads
+        self.default_batch_size = default_batch_size
+        self.max_services = max_services
+        self.default_credentials: Optional[str] = None  # 沒有指紋的舊工作使用的服務
+        self._services: 'OrderedDict[str, Tuple[object, object]]' = OrderedDict()
+        self._default_services_factory = default_services
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def register_services(self, ai_service, wardrobe_service, default: bool = False) -> str:
+        """
+        登錄一組服務並回傳其指紋（加入工作時一併記錄）
+
+        Args:
+            default: 是否作為沒有指紋的舊工作所用的服務
+        """
+        credentials = credentials_fingerprint(ai_service, wardrobe_service)
+        with self._lock:
+            self._services[credentials] = (ai_service, wardrobe_service)
+            self._services.move_to_end(credentials)
+            if default:
+                self.default_credentials = credentials
+            # 只保留最近使用的幾組（預設服務不移除）
+            for key in list(self._services):
+                if len(self._services) <= self.max_services:
+                    break
+                if key != self.default_credentials:
+                    del self._services[key]
+        self._wake.set()
+        return credentials
+
+    def _load_default_services(self):
+        """在背景執行緒建立並登錄預設服務（只執行一次）"""
+        with self._lock:
+            factory, self._default_services_factory = self._default_services_factory, None
+        if factory is None:
+            return
+        try:
+            ai_service, wardrobe_service = factory()
+        except Exception as e:
+            print(f"建立預設標籤服務失敗: {str(e)}")
+            return
+        self.register_services(ai_service, wardrobe_service, default=True)
+
+    def _get_services(self, credentials: Optional[str]) -> Optional[Tuple[object, object]]:
+        with self._lock:
+            return self._services.get(credentials or self.default_credentials)
+
+    def ensure_running(self):
+        """確保背景執行緒在執行中"""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.num_threads:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"tag-job-worker-{len(self._threads)}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        self._wake.set()
+
+    def notify(self):
+        """有新工作時喚醒背景執行緒"""
+        self._wake.set()
+
+    def _claim(self) -> Tuple[List[TagJob], Optional[Tuple[object, object]]]:
+        """取出下一批可處理的工作與其服務"""
+        with self._lock:
+            credentials = list(self._services)
+            include_legacy = self.default_credentials is not None
+        key = self.queue.next_batch_key(credentials, include_legacy)
+        if key is None:
+            return [], None
+
+        services = self._get_services(key[0])
+        if services is None:
+            return [], None
+        ai_service = services[0]
+        batch_size = ai_service.suggest_batch_size() or self.default_batch_size
+        return self.queue.claim_batch(batch_size, key[0], key[1]), services
+
+    def _run(self):
+        self._load_default_services()
+        while True:
+            jobs, services = self._claim()
+            if not jobs:
+                self._wake.wait(timeout=5)
+                self._wake.clear()
+                continue
+
+            try:
+                self._process(jobs, *services)
+            except Exception as e:
+                for job in jobs:
+                    self.queue.mark_failed(job, str(e))
+                time.sleep(1)
+
+    def _process(self, jobs: List[TagJob], ai_service, wardrobe_service):
+        """以建立工作時的服務標籤並存檔（同一批工作的連線設定與使用者相同）"""
+        tags_list, cache_hits = ai_service.batch_auto_tag_with_hits(
+            [job.ai_bytes for job in jobs],
+            [job.image_hash for job in jobs],
+            [job.phash for job in jobs],
+            user_id=jobs[0].user_id,
+            retries=max(job.attempts for job in jobs) - 1
+        )
+        if not tags_list:
+            for job in jobs:
+                self.queue.mark_failed(job, "AI 辨識失敗")
+            return
+
+        for job, tags, cache_hit in zip(jobs, tags_list, cache_hits):
+            # 冪等：重新執行的工作若已存檔則不重複寫入
+            is_duplicate, existing_name = wardrobe_service.check_duplicate_image(job.user_id, job.image_hash)
+            if is_duplicate:
+                self.queue.mark_duplicate(job.id, existing_name)
+                continue
+
+            self.queue.mark_saving(job.id, tags['name'])
+            item = ClothingItem(
+                name=tags['name'],
+                category=tags['category'],
+                color=tags['color'],
+                style=tags.get('style', ''),
+                warmth=tags['warmth'],
+                image_hash=job.image_hash,
+                phash=job.phash,
+                raw_hash=job.raw_hash,
+                user_id=job.user_id
+            )
+            success, result = wardrobe_service.save_item(item, job.storage_bytes)
+            if success:
+                self.queue.mark_done(job.id, tags['name'], cache_hit)
+            else:
+                self.queue.mark_failed(job, result)
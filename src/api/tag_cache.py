@@ -0,0 +1,144 @@
+"""
+AI 標籤快取層
+以圖片 SHA256 hash 為鍵，跨使用者共用 AI 標籤結果，相同圖片不再重複呼叫 Gemini
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from utils.image_hash import BKTree
+
+class TagCache:
+    """SQLite 持久化的標籤快取"""
+
+    def __init__(self, db_path: str, use_phash: bool = False, phash_max_distance: int = 4):
+        """
+        初始化標籤快取
+
+        Args:
+            db_path: SQLite 檔案路徑
+            use_phash: 精確 hash 未命中時，是否改用感知雜湊比對
+            phash_max_distance: 感知雜湊視為同一張圖的最大漢明距離
+        """
+        self.db_path = db_path
+        self.use_phash = use_phash
+        self.phash_max_distance = phash_max_distance
+        self._lock = threading.Lock()
+
+        # 本次程序的命中統計
+        self.hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tag_cache (
+                image_hash TEXT PRIMARY KEY,
+                phash TEXT,
+                tags TEXT NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                last_hit_at TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_cache_phash ON tag_cache(phash)")
+        self._conn.commit()
+
+        # 感知雜湊索引 (phash → image_hash)
+        self._phash_index = BKTree()
+        if use_phash:
+            rows = self._conn.execute(
+                "SELECT phash, image_hash FROM tag_cache WHERE phash IS NOT NULL"
+            ).fetchall()
+            for phash, image_hash in rows:
+                self._phash_index.add(phash, image_hash)
+
+    def get(self, image_hash: str, phash: Optional[str] = None) -> Optional[Dict]:
+        """
+        查詢快取標籤
+
+        Args:
+            image_hash: 圖片 SHA256 hash
+            phash: 圖片感知雜湊（可選）
+
+        Returns:
+            標籤字典（新副本）或 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tags FROM tag_cache WHERE image_hash = ?", (image_hash,)
+            ).fetchone()
+            matched_hash = image_hash
+
+            if row is None and self.use_phash and phash:
+                matched_hash = self._find_similar(phash)
+                if matched_hash:
+                    row = self._conn.execute(
+                        "SELECT tags FROM tag_cache WHERE image_hash = ?", (matched_hash,)
+                    ).fetchone()
+                    if row is not None:
+                        self.phash_hits += 1
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE tag_cache SET hit_count = hit_count + 1, last_hit_at = ? WHERE image_hash = ?",
+                (datetime.now().isoformat(), matched_hash)
+            )
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def put(self, image_hash: str, tags: Dict, phash: Optional[str] = None):
+        """寫入標籤快取（已存在則覆蓋標籤）"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO tag_cache (image_hash, phash, tags, created_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(image_hash) DO UPDATE SET tags = excluded.tags,
+                    phash = COALESCE(excluded.phash, tag_cache.phash)
+                """,
+                (image_hash, phash, json.dumps(tags, ensure_ascii=False), datetime.now().isoformat())
+            )
+            self._conn.commit()
+            if self.use_phash and phash:
+                self._phash_index.add(phash, image_hash)
+
+    def _find_similar(self, phash: str) -> Optional[str]:
+        """在感知雜湊索引中找出距離最近且在門檻內的圖片"""
+        matches = self._phash_index.search(phash, self.phash_max_distance)
+        return matches[0][1] if matches else None
+
+    def get_stats(self) -> dict:
+        """獲取快取命中統計"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()[0]
+            total_hits = self._conn.execute(
+                "SELECT COALESCE(SUM(hit_count), 0) FROM tag_cache"
+            ).fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "phash_hits": self.phash_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "lifetime_hits": total_hits
+        }
+
+    def clear(self):
+        """清除快取"""
+        with self._lock:
+            self._conn.execute("DELETE FROM tag_cache")
+            self._conn.commit()
+            self._phash_index = BKTree()
@@ -0,0 +1,90 @@
+"""
+上傳排程服務
+將大量照片自動切成批次，在 AI 標籤目前批次的同時準備下一批
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from api.ai_service import AIService
+from utils.image_processing import PreparedImage
+
+@dataclass
+class UploadCandidate:
+    """通過重複檢查、等待標籤的圖片"""
+    file_name: str
+    raw_hash: str
+    prepared: PreparedImage
+    similar_to: Optional[str] = None  # 外觀非常相似的既有衣物（疑似重複）
+
+def plan_batch_sizes(total: int, max_batch_size: int) -> List[int]:
+    """
+    計算平均的批次大小，避免最後一批只剩少數幾張
+
+    例如 23 張、上限 10 → [8, 8, 7]，而不是 [10, 10, 3]
+    """
+    if total <= 0:
+        return []
+    batch_count = math.ceil(total / max_batch_size)
+    base, extra = divmod(total, batch_count)
+    return [base + 1 if i < extra else base for i in range(batch_count)]
+
+def iter_batches(
+    candidates: Iterable[UploadCandidate],
+    next_batch_size: Callable[[], int]
+) -> Iterator[List[UploadCandidate]]:
+    """
+    依序從 candidates 取出指定大小的批次
+
+    每次取批次前才呼叫 next_batch_size，批次大小可隨執行狀況調整。
+    """
+    iterator = iter(candidates)
+    while True:
+        size = max(1, next_batch_size())
+        batch = []
+        for candidate in iterator:
+            batch.append(candidate)
+            if len(batch) >= size:
+                break
+        if not batch:
+            return
+        yield batch
+
+class UploadScheduler:
+    """批次標籤排程器"""
+
+    def __init__(self, ai_service: AIService, user_id: Optional[str] = None):
+        self.ai_service = ai_service
+        self.user_id = user_id  # 用量紀錄中的使用者
+
+    def _tag_batch(self, batch: List[UploadCandidate]) -> Optional[List[Dict]]:
+        return self.ai_service.batch_auto_tag(
+            [c.prepared.ai_bytes for c in batch],
+            [c.prepared.image_hash for c in batch],
+            [c.prepared.phash for c in batch],
+            user_id=self.user_id
+        )
+
+    def run(
+        self,
+        batches: Iterable[List[UploadCandidate]]
+    ) -> Iterator[Tuple[List[UploadCandidate], Optional[List[Dict]]]]:
+        """
+        管線化執行：第 k 批在背景標籤時，於呼叫端執行緒準備第 k+1 批
+
+        標籤只在單一背景執行緒中依序進行，AIService 的速率限制因此維持有效；
+        批次的準備 (讀取 batches) 與結果的儲存則留在呼叫端執行緒，可安全更新 UI。
+
+        Yields:
+            (批次, 標籤列表或 None)
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-tagger") as tagger:
+            pending = None
+            for batch in batches:
+                future = tagger.submit(self._tag_batch, batch)
+                if pending is not None:
+                    yield pending[0], pending[1].result()
+                pending = (batch, future)
+
+            if pending is not None:
+                yield pending[0], pending[1].result()
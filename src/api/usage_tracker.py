@@ -0,0 +1,130 @@
+"""
+Gemini 用量紀錄
+記錄每次呼叫的操作、圖片數、請求大小、token 數、延遲、重試次數與結果，
+以環狀緩衝保存最近的紀錄，並依使用者或操作彙總，作為調整批次大小與預算的依據
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+@dataclass
+class UsageRecord:
+    """單次 Gemini 呼叫的紀錄"""
+    operation: str              # tag | recommend
+    user_id: Optional[str]
+    images: int
+    request_bytes: int
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    latency: float              # 請求秒數（不含速率限制等待）
+    wait_seconds: float         # 速率限制等待秒數
+    retries: int
+    outcome: str                # ok | error | mismatch
+    error: Optional[str] = None
+    timestamp: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def extract_token_usage(response) -> Tuple[int, int, int]:
+    """從回應的 usage_metadata 取出 (prompt, output, total) token 數，缺少時為 0"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0, 0
+    prompt = int(getattr(usage, "prompt_token_count", 0) or 0)
+    output = int(getattr(usage, "candidates_token_count", 0) or 0)
+    total = int(getattr(usage, "total_token_count", 0) or 0) or prompt + output
+    return prompt, output, total
+
+class UsageTracker:
+    """保存最近 max_records 筆紀錄，並維持不受緩衝大小影響的累計值"""
+
+    def __init__(self, max_records: int = 2000):
+        self._records: "deque[UsageRecord]" = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self.total_calls = 0
+        self.total_request_bytes = 0
+        self.total_tokens = 0
+
+    def record(self, record: UsageRecord):
+        if not record.timestamp:
+            record.timestamp = time.time()
+        with self._lock:
+            self._records.append(record)
+            self.total_calls += 1
+            self.total_request_bytes += record.request_bytes
+            self.total_tokens += record.total_tokens
+
+    def recent(self, limit: int = 50, user_id: Optional[str] = None) -> List[dict]:
+        """最近的紀錄（新到舊），指定 user_id 時只包含該使用者的紀錄"""
+        with self._lock:
+            records = list(self._records)
+        if user_id is not None:
+            records = [record for record in records if str(record.user_id) == str(user_id)]
+        return [record.to_dict() for record in reversed(records[-limit:])]
+
+    def summary(
+        self,
+        by: str = "operation",
+        window_seconds: Optional[float] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, dict]:
+        """
+        依使用者或操作彙總緩衝中的紀錄
+
+        Args:
+            by: operation | user
+            window_seconds: 只彙總最近幾秒內的紀錄（None 表示整個緩衝）
+            user_id: 只彙總該使用者的紀錄（None 表示所有使用者）
+
+        Returns:
+            {鍵: {"calls", "errors", "images", "request_bytes", "prompt_tokens", "output_tokens",
+                 "avg_latency", "p95_latency", "tokens_per_image", "bytes_per_image"}}
+        """
+        since = time.time() - window_seconds if window_seconds else 0
+        with self._lock:
+            records = [record for record in self._records if record.timestamp >= since]
+        if user_id is not None:
+            records = [record for record in records if str(record.user_id) == str(user_id)]
+
+        groups: Dict[str, List[UsageRecord]] = {}
+        for record in records:
+            key = record.operation if by == "operation" else (record.user_id or "-")
+            groups.setdefault(key, []).append(record)
+
+        summary = {}
+        for key, group in groups.items():
+            latencies = sorted(record.latency for record in group)
+            images = sum(record.images for record in group)
+            request_bytes = sum(record.request_bytes for record in group)
+            prompt_tokens = sum(record.prompt_tokens for record in group)
+            output_tokens = sum(record.output_tokens for record in group)
+            summary[key] = {
+                "calls": len(group),
+                "errors": sum(1 for record in group if record.outcome != "ok"),
+                "images": images,
+                "request_bytes": request_bytes,
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "avg_latency": round(sum(latencies) / len(latencies), 3),
+                "p95_latency": round(latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))], 3),
+                "tokens_per_image": round((prompt_tokens + output_tokens) / images, 1) if images else 0.0,
+                "bytes_per_image": round(request_bytes / images) if images else 0
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self.total_calls = 0
+            self.total_request_bytes = 0
+            self.total_tokens = 0
+
+# 程序內共用的紀錄（AIService 未指定時使用）
+_usage_tracker = UsageTracker()
+
+def get_usage_tracker() -> UsageTracker:
+    return _usage_tracker
@@ -4,11 +4,87 @@
 """
 import base64
 import hashlib
-from typing import List, Tuple, Optional
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, TYPE_CHECKING
 from datetime import datetime
-from database.models import ClothingItem
+from database.models import METADATA_FIELDS, ClothingItem
 from database.supabase_client import SupabaseClient
+from utils.image_hash import BKTree, compute_dhash
+from utils.perf import instrument, timed
 
+if TYPE_CHECKING:
+    from utils.wardrobe_index import WardrobeIndex
+
+# 各使用者的雜湊索引，跨 rerun 共用
+_phash_indexes: Dict[str, BKTree] = {}            # {user_id: 感知雜湊 BK-tree}
+_raw_hash_indexes: Dict[str, Dict[str, str]] = {}  # {user_id: {raw_hash: 衣物名稱}}
+_wardrobe_indexes: Dict[str, 'WardrobeIndex'] = {}  # {str(user_id): 欄式中繼資料索引}
+_user_indexes_lock = threading.Lock()
+
+# 依 id 查詢過的衣物（LRU，只保存中繼資料，圖片需要時才讀取），讓 Session State 只需保存 id
+_item_cache: "OrderedDict[int, ClothingItem]" = OrderedDict()
+_ITEM_CACHE_MAX_ENTRIES = 4096
+_item_cache_lock = threading.Lock()
+
+# 讀取衣櫥時的欄位（圖片另外延遲讀取）
+ITEM_METADATA_COLUMNS = ", ".join(METADATA_FIELDS)
+# 建立欄式索引需要的欄位
+INDEX_COLUMNS = "id, category, color, style, warmth, created_at"
+# 延遲讀取圖片時每次查詢的件數
+IMAGE_BATCH_SIZE = 24
+# 只讀取雜湊等小欄位時每頁的筆數（需小於 PostgREST 的 max-rows 上限，否則會被截斷而提早結束）
+HASH_PAGE_SIZE = 500
+
+class _ImageBatchLoader:
+    """
+    同一次讀取的衣物共用的圖片讀取器
+    
+    第一次需要某件衣物的圖片時，連同其後尚未讀取的衣物一起查詢，
+    依序渲染衣櫥網格時每 batch_size 件只需一次請求。
+    """
+    
+    def __init__(self, db: SupabaseClient, user_id: str, item_ids: List[int], batch_size: int = IMAGE_BATCH_SIZE):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self._ids = item_ids
+        self._positions = {item_id: idx for idx, item_id in enumerate(item_ids)}
+        self._pending = set(item_ids)
+        self._loaded: Dict[int, Optional[str]] = {}
+        self._lock = threading.Lock()
+    
+    def load(self, item_id: int) -> Optional[str]:
+        with self._lock:
+            if item_id in self._loaded:
+                return self._loaded.pop(item_id)
+            if item_id not in self._pending:
+                return None
+            
+            batch = []
+            for candidate in self._ids[self._positions[item_id]:]:
+                if candidate in self._pending:
+                    batch.append(candidate)
+                    if len(batch) >= self.batch_size:
+                        break
+            
+            try:
+                response = self.db.client.table("my_wardrobe")\
+                    .select("id, image_data")\
+                    .eq("user_id", self.user_id)\
+                    .in_("id", batch)\
+                    .execute()
+            except Exception as e:
+                print(f"讀取圖片失敗: {str(e)}")
+                return None
+            
+            self._pending.difference_update(batch)
+            for row in response.data:
+                self._loaded[row['id']] = row.get('image_data')
+            return self._loaded.pop(item_id, None)
+
+@instrument
 class WardrobeService:
     def __init__(self, supabase_client: SupabaseClient):
         self.db = supabase_client
@@ -39,6 +115,130 @@ class WardrobeService:
             print(f"檢查重複失敗: {str(e)}")
             return False, None
     
+    def check_duplicate_raw(self, user_id: str, raw_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        以上傳原始檔案的 hash 檢查是否重複（不需解碼圖片）
+        
+        Returns:
+            (是否重複, 已存在的衣物名稱)
+        """
+        index = self.get_raw_hash_index(user_id) or {}
+        if raw_hash in index:
+            return True, index[raw_hash]
+        return False, None
+    
+    def get_raw_hash_index(self, user_id: str) -> Optional[Dict[str, str]]:
+        """
+        取得（必要時建立）使用者的原始檔案 hash 索引 {raw_hash: 衣物名稱}
+        
+        讀取失敗時回傳 None（不快取）；逐檔檢查大量檔案時應只呼叫一次，
+        避免資料庫異常時每個檔案都重試一次查詢。
+        """
+        with _user_indexes_lock:
+            index = _raw_hash_indexes.get(user_id)
+        if index is not None:
+            return index
+        
+        index = {}
+        try:
+            for page in self.iter_wardrobe_pages(user_id, "id, name, raw_hash", HASH_PAGE_SIZE):
+                index.update((row['raw_hash'], row['name']) for row in page if row.get('raw_hash'))
+        except Exception as e:
+            print(f"讀取原始檔案 hash 失敗: {str(e)}")
+            return None
+        
+        with _user_indexes_lock:
+            _raw_hash_indexes[user_id] = index
+        return index
+    
+    def find_near_duplicates(
+        self,
+        user_id: str,
+        phash: str,
+        max_distance: int
+    ) -> List[Tuple[int, str]]:
+        """
+        以感知雜湊查詢外觀相近的衣物（重拍、裁切、縮放後的同一件衣服）
+        
+        Args:
+            user_id: 使用者 ID
+            phash: 新圖片的感知雜湊
+            max_distance: 最大漢明距離
+            
+        Returns:
+            [(距離, 已存在的衣物名稱), ...]
+        """
+        index = self._get_phash_index(user_id)
+        if index is None:
+            return []
+        # 其他 Session 存檔時會在鎖內加入節點，查詢也需持有同一把鎖
+        with _user_indexes_lock:
+            return index.search(phash, max_distance)
+    
+    def _get_phash_index(self, user_id: str) -> Optional[BKTree]:
+        """取得（必要時建立）使用者的感知雜湊索引"""
+        with _user_indexes_lock:
+            index = _phash_indexes.get(user_id)
+        if index is not None:
+            return index
+        
+        index = BKTree()
+        try:
+            for page in self.iter_wardrobe_pages(user_id, "id, name, phash", HASH_PAGE_SIZE):
+                for row in page:
+                    if row.get('phash'):
+                        index.add(row['phash'], row['name'])
+        except Exception as e:
+            print(f"讀取感知雜湊失敗: {str(e)}")
+            return None
+        
+        with _user_indexes_lock:
+            _phash_indexes[user_id] = index
+        return index
+    
+    def get_wardrobe_index(
+        self,
+        user_id: str,
+        items: Optional[List[ClothingItem]] = None
+    ) -> Optional['WardrobeIndex']:
+        """
+        取得（必要時建立）使用者的欄式索引，用於分類統計與篩選
+        
+        新增或刪除衣物時會丟棄索引，下次查詢時重建。已讀取衣櫥時可傳入 items 以它重建，
+        不需再查詢資料庫；否則分頁讀取索引欄位，以免被 max-rows 截斷。
+        """
+        key = str(user_id)
+        with _user_indexes_lock:
+            index = _wardrobe_indexes.get(key)
+        if index is not None:
+            return index
+        
+        from utils.wardrobe_index import WardrobeIndex
+        if items is None:
+            try:
+                items = [
+                    row
+                    for page in self.iter_wardrobe_pages(user_id, INDEX_COLUMNS, HASH_PAGE_SIZE)
+                    for row in page
+                ]
+            except Exception as e:
+                print(f"讀取衣櫥索引失敗: {str(e)}")
+                return None
+        
+        index = WardrobeIndex.build(items)
+        with _user_indexes_lock:
+            _wardrobe_indexes[key] = index
+        return index
+    
+    @staticmethod
+    def _invalidate_user_indexes(user_id: str):
+        """丟棄使用者的所有索引，下次查詢時重建"""
+        with _user_indexes_lock:
+            _phash_indexes.pop(user_id, None)
+            _raw_hash_indexes.pop(user_id, None)
+            _wardrobe_indexes.pop(str(user_id), None)
+    
+    @timed(bytes_fn=lambda result, self, item, img_bytes: len(img_bytes))
     def save_item(self, item: ClothingItem, img_bytes: bytes) -> Tuple[bool, str]:
         """
         儲存衣物到資料庫
@@ -51,42 +251,252 @@ class WardrobeService:
             (是否成功, 結果訊息)
         """
         try:
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            img_hash = self.get_image_hash(img_bytes)
-            
-            item.image_data = img_base64
-            item.image_hash = img_hash
-            item.created_at = datetime.now()
-            
-            data = item.to_dict()
+            data = self._prepare_item(item, img_bytes)
             result = self.db.client.table("my_wardrobe").insert(data).execute()
+            self._assign_ids([item], result.data)
+            self._add_to_user_indexes([item])
             
             return True, "儲存成功"
         except Exception as e:
             return False, str(e)
     
-    def get_wardrobe(self, user_id: str) -> List[ClothingItem]:
-        """獲取使用者的衣櫥"""
+    @timed(bytes_fn=lambda result, self, items: sum(len(img_bytes) for _, img_bytes in items))
+    def save_items(self, items: List[Tuple[ClothingItem, bytes]]) -> Tuple[bool, str]:
+        """
+        批次儲存多件衣物（單次 insert 請求）
+        
+        Args:
+            items: [(衣物資料模型, 圖片 bytes), ...]
+            
+        Returns:
+            (是否成功, 結果訊息)
+        """
+        if not items:
+            return True, "沒有需要儲存的衣物"
+        
+        try:
+            rows = [self._prepare_item(item, img_bytes) for item, img_bytes in items]
+            result = self.db.client.table("my_wardrobe").insert(rows).execute()
+            saved = [item for item, _ in items]
+            self._assign_ids(saved, result.data)
+            self._add_to_user_indexes(saved)
+            
+            return True, f"已儲存 {len(rows)} 件"
+        except Exception as e:
+            return False, str(e)
+    
+    def _prepare_item(self, item: ClothingItem, img_bytes: bytes) -> dict:
+        """填入圖片資料與雜湊，回傳要寫入資料庫的欄位（已有 image_hash 時沿用，例如上傳前處理算出的 hash）"""
+        item.image_data = base64.b64encode(img_bytes).decode('utf-8')
+        item.image_hash = item.image_hash or self.get_image_hash(img_bytes)
+        item.created_at = item.created_at or datetime.now()
+        if item.phash is None:
+            try:
+                item.phash = compute_dhash(img_bytes)
+            except Exception:
+                item.phash = None
+        return item.to_dict()
+    
+    @staticmethod
+    def _assign_ids(items: List[ClothingItem], rows: Optional[List[dict]]):
+        """以 insert 回傳的資料列（順序與送出時相同）填入新衣物的 id"""
+        if not rows or len(rows) != len(items):
+            return
+        for item, row in zip(items, rows):
+            item.id = row.get('id')
+    
+    @staticmethod
+    def _add_to_user_indexes(items: List[ClothingItem]):
+        """新增衣物後同步更新已載入的雜湊索引，欄式索引則丟棄，下次查詢時重建"""
+        with _user_indexes_lock:
+            for item in items:
+                phash_index = _phash_indexes.get(item.user_id)
+                if phash_index is not None and item.phash:
+                    phash_index.add(item.phash, item.name)
+                raw_index = _raw_hash_indexes.get(item.user_id)
+                if raw_index is not None and item.raw_hash:
+                    raw_index[item.raw_hash] = item.name
+                _wardrobe_indexes.pop(str(item.user_id), None)
+    
+    def get_image_hashes(self, user_id: str) -> set:
+        """獲取使用者所有衣物的圖片 hash（大量匯入時一次比對重複，分頁讀取以免被 max-rows 截斷）"""
+        try:
+            return {
+                row['image_hash']
+                for page in self.iter_wardrobe_pages(user_id, "id, image_hash", HASH_PAGE_SIZE)
+                for row in page
+                if row.get('image_hash')
+            }
+        except Exception as e:
+            print(f"讀取圖片 hash 失敗: {str(e)}")
+            return set()
+    
+    def get_user_id(self, username: str) -> Optional[str]:
+        """依使用者名稱查詢 ID"""
+        try:
+            response = self.db.client.table("users")\
+                .select("id")\
+                .eq("username", username)\
+                .execute()
+            return response.data[0]['id'] if response.data else None
+        except Exception as e:
+            print(f"查詢使用者失敗: {str(e)}")
+            return None
+    
+    @timed(bytes_fn=lambda result, *args, **kwargs: sum(item.image.nbytes for item in result if item.image))
+    def get_wardrobe(self, user_id: str, with_images: bool = False) -> List[ClothingItem]:
+        """
+        獲取使用者的衣櫥
+        
+        預設只讀取中繼資料，圖片在第一次存取 image_data 時才分批讀取
+        （顯示用圖片已在快取中時完全不需讀取）。with_images=True 時一次讀取全部圖片。
+        """
         try:
             response = self.db.client.table("my_wardrobe")\
-                .select("*")\
+                .select("*" if with_images else ITEM_METADATA_COLUMNS)\
                 .eq("user_id", user_id)\
                 .order("created_at", desc=True)\
                 .execute()
             
-            return [ClothingItem.from_dict(item) for item in response.data]
+            if with_images:
+                return [ClothingItem.from_dict(row) for row in response.data]
+            
+            loader = _ImageBatchLoader(self.db, user_id, [row['id'] for row in response.data])
+            return [ClothingItem.from_dict(row, loader.load) for row in response.data]
         except Exception as e:
             print(f"讀取衣櫥失敗: {str(e)}")
             return []
     
+    def get_items_by_ids(self, user_id: str, item_ids: List[int]) -> List[ClothingItem]:
+        """
+        依 id 取得衣物（依 item_ids 的順序，找不到的略過）
+        
+        先查程序內共用的快取，未命中的 id 以單次查詢讀取後放入快取。
+        """
+        if not item_ids:
+            return []
+        
+        found: Dict[int, ClothingItem] = {}
+        with _item_cache_lock:
+            for item_id in item_ids:
+                item = _item_cache.get(item_id)
+                if item is not None and str(item.user_id) == str(user_id):
+                    _item_cache.move_to_end(item_id)
+                    found[item_id] = item
+        
+        missing = [item_id for item_id in item_ids if item_id not in found]
+        if missing:
+            try:
+                response = self.db.client.table("my_wardrobe")\
+                    .select(ITEM_METADATA_COLUMNS)\
+                    .eq("user_id", user_id)\
+                    .in_("id", missing)\
+                    .execute()
+                # 快取中的衣物不保留圖片，顯示快取未命中時才讀取單張
+                load_image = functools.partial(self._load_image_data, user_id)
+                items = [ClothingItem.from_dict(row, load_image, keep_image=False) for row in response.data]
+            except Exception as e:
+                print(f"讀取衣物失敗: {str(e)}")
+                items = []
+            for item in items:
+                found[item.id] = item
+            self._cache_items(items)
+        
+        return [found[item_id] for item_id in item_ids if item_id in found]
+    
+    def _load_image_data(self, user_id: str, item_id: int) -> Optional[str]:
+        """讀取單件衣物的圖片"""
+        try:
+            response = self.db.client.table("my_wardrobe")\
+                .select("image_data")\
+                .eq("id", item_id)\
+                .eq("user_id", user_id)\
+                .execute()
+            return response.data[0]['image_data'] if response.data else None
+        except Exception as e:
+            print(f"讀取圖片失敗: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _cache_items(items: List[ClothingItem]):
+        with _item_cache_lock:
+            for item in items:
+                _item_cache.pop(item.id, None)
+                _item_cache[item.id] = item
+            while len(_item_cache) > _ITEM_CACHE_MAX_ENTRIES:
+                _item_cache.popitem(last=False)
+    
+    @staticmethod
+    def _forget_cached_items(item_ids: Iterable[int]):
+        """刪除衣物後移出共用快取"""
+        with _item_cache_lock:
+            for item_id in item_ids:
+                _item_cache.pop(item_id, None)
+    
+    def iter_wardrobe_pages(
+        self,
+        user_id: str,
+        columns: str = "*",
+        page_size: int = 50
+    ) -> Iterator[List[dict]]:
+        """
+        依 id 分頁讀取使用者的衣櫥，每次只保留一頁在記憶體中
+        
+        以 id 作為游標 (keyset)，讀取期間新增或刪除衣物也不會跳過或重複。
+        columns 必須包含 id。
+        
+        Yields:
+            每頁的資料列
+        """
+        last_id = 0
+        while True:
+            response = self.db.client.table("my_wardrobe")\
+                .select(columns)\
+                .eq("user_id", user_id)\
+                .gt("id", last_id)\
+                .order("id")\
+                .limit(page_size)\
+                .execute()
+            if not response.data:
+                return
+            yield response.data
+            if len(response.data) < page_size:
+                return
+            last_id = response.data[-1]['id']
+    
+    def _lookup_image_hashes(self, user_id: str, item_ids: List[int]) -> Dict[int, Optional[str]]:
+        """刪除前查詢衣物的圖片 hash（刪除後用來移除顯示用的圖片），失敗時回傳空 dict"""
+        hashes = {}
+        try:
+            for start in range(0, len(item_ids), HASH_PAGE_SIZE):
+                response = self.db.client.table("my_wardrobe")\
+                    .select("id, image_hash")\
+                    .eq("user_id", user_id)\
+                    .in_("id", item_ids[start:start + HASH_PAGE_SIZE])\
+                    .execute()
+                hashes.update((row['id'], row.get('image_hash')) for row in response.data)
+        except Exception as e:
+            print(f"讀取圖片 hash 失敗: {str(e)}")
+        return hashes
+    
+    def _forget_deleted(self, user_id: str, item_ids: List[int], image_hashes: Dict[int, Optional[str]]):
+        """刪除衣物後更新索引、快取，並移除顯示用圖片（已刪除的衣物不能再透過圖片網址取得）"""
+        from utils.display_cache import forget_images
+        # 雜湊索引無法依 id 移除，與欄式索引一併丟棄，下次查詢時重建
+        self._invalidate_user_indexes(user_id)
+        self._forget_cached_items(item_ids)
+        forget_images(image_hashes.get(item_id) for item_id in item_ids)
+    
     def delete_item(self, user_id: str, item_id: int) -> bool:
         """刪除單件衣物"""
+        image_hashes = self._lookup_image_hashes(user_id, [item_id])
         try:
             self.db.client.table("my_wardrobe")\
                 .delete()\
                 .eq("id", item_id)\
                 .eq("user_id", user_id)\
                 .execute()
+            self._forget_deleted(user_id, [item_id], image_hashes)
             return True
         except Exception as e:
             print(f"刪除失敗: {str(e)}")
@@ -101,9 +511,10 @@ class WardrobeService:
         """
         if not item_ids:
             return False, 0, 0
-            
+        
+        image_hashes = self._lookup_image_hashes(user_id, item_ids)
         try:
-            success_count = 0
+            deleted_ids = []
             fail_count = 0
             
             # 使用進度條顯示刪除進度
@@ -119,7 +530,7 @@ class WardrobeService:
                         .eq("id", item_id)\
                         .eq("user_id", user_id)\
                         .execute()
-                    success_count += 1
+                    deleted_ids.append(item_id)
                 except:
                     fail_count += 1
                 
@@ -131,18 +542,15 @@ class WardrobeService:
             progress_bar.empty()
             status_text.empty()
             
-            return True, success_count, fail_count
+            if deleted_ids:
+                self._forget_deleted(user_id, deleted_ids, image_hashes)
+            
+            return True, len(deleted_ids), fail_count
         except Exception as e:
             print(f"批次刪除失敗: {str(e)}")
             return False, 0, 0
     
-    def get_category_statistics(self, user_id: str) -> dict:
-        """獲取衣櫥分類統計"""
-        items = self.get_wardrobe(user_id)
-        
-        categories = {}
-        for item in items:
-            cat = item.category or "其他"
-            categories[cat] = categories.get(cat, 0) + 1
-        
-        return categories
+    def get_category_statistics(self, user_id: str, items: Optional[List[ClothingItem]] = None) -> dict:
+        """獲取衣櫥分類統計（由欄式索引計算，依件數多到少；已讀取衣櫥時可傳入 items，見 get_wardrobe_index）"""
+        index = self.get_wardrobe_index(user_id, items)
+        return index.category_counts() if index is not None else {}
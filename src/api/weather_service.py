@@ -3,15 +3,25 @@
 處理天氣資料獲取與快取
 """
 import requests
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
 from database.models import WeatherData
+from utils.perf import instrument
 
+@instrument
 class WeatherService:
-    def __init__(self, api_key: str, cache_hours: int = 1):
+    def __init__(
+        self,
+        api_key: str,
+        cache_hours: int = 1,
+        base_url: str = "http://api.openweathermap.org/data/2.5"
+    ):
         self.api_key = api_key
         self.cache_hours = cache_hours
+        self.base_url = base_url.rstrip("/")  # 可指向相容的本機替身 (基準測試用)
         self._cache = {}  # {city: (weather_data, timestamp)}
+        self._lock = threading.Lock()  # 實例跨 Session 共用
     
     def get_weather(self, city: str) -> Optional[WeatherData]:
         """
@@ -24,14 +34,16 @@ class WeatherService:
             WeatherData 或 None
         """
         # 檢查快取
-        if city in self._cache:
-            cached_data, cached_time = self._cache[city]
+        with self._lock:
+            cached = self._cache.get(city)
+        if cached is not None:
+            cached_data, cached_time = cached
             if datetime.now() - cached_time < timedelta(hours=self.cache_hours):
                 return cached_data
         
         # 獲取新資料
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather"
+            url = f"{self.base_url}/weather"
             params = {
                 "q": city,
                 "appid": self.api_key,
@@ -56,7 +68,8 @@ class WeatherService:
             )
             
             # 更新快取
-            self._cache[city] = (weather_data, datetime.now())
+            with self._lock:
+                self._cache[city] = (weather_data, datetime.now())
             
             return weather_data
             
@@ -72,4 +85,5 @@ class WeatherService:
     
     def clear_cache(self):
         """清除快取"""
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
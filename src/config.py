@@ -16,8 +16,46 @@ class AppConfig:
     supabase_key: str
     default_city: str = "Taipei"
     api_rate_limit_seconds: int = 15
-    max_batch_upload: int = 10
+    max_batch_upload: int = 10  # 每批送 AI 的最大張數
+    max_upload_files: int = 500  # 一次可選取的照片上限
     weather_cache_hours: int = 1
+    weather_base_url: str = "http://api.openweathermap.org/data/2.5"
+    tag_cache_enabled: bool = True
+    tag_cache_path: str = ".cache/tag_cache.sqlite3"
+    tag_cache_use_phash: bool = False
+    tag_cache_phash_distance: int = 4
+    near_duplicate_check: bool = True
+    near_duplicate_distance: int = 5
+    ai_image_max_edge: int = 1024
+    ai_image_quality: int = 80
+    ai_image_max_bytes: int = 300_000
+    storage_image_max_edge: int = 1600
+    storage_image_quality: int = 88
+    auto_crop_enabled: bool = False
+    auto_crop_min_confidence: float = 0.6
+    montage_mode: bool = False
+    montage_tile_size: int = 384
+    montage_grid_columns: int = 3
+    montage_grid_rows: int = 3
+    adaptive_batch_size: bool = True
+    batch_size_min: int = 2  # 自動調整的下限 (上限為 max_batch_upload)
+    batch_target_seconds: float = 40.0
+    batch_max_payload_kb: int = 4096
+    job_queue_path: str = ".cache/tag_jobs.sqlite3"
+    tag_worker_threads: int = 1
+    job_max_attempts: int = 3
+    prepare_workers: int = 0  # 0 表示使用 CPU 核心數
+    prepare_max_in_flight: int = 0  # 0 表示 prepare_workers 的兩倍
+    display_cache_max_mb: int = 64
+    session_state_budget_kb: int = 1024  # 每個 Session 的 session_state 預算，超過時捨棄可重建的鍵 (0 表示不限制)
+    image_server_enabled: bool = False
+    image_server_port: int = 8765
+    image_server_public_url: str = ""  # 經反向代理時瀏覽器使用的網址，預設 http://localhost:<port>
+    image_store_dir: str = ".cache/images"
+    image_store_max_mb: int = 512  # 圖片檔總大小上限，超過時刪除最久未使用的檔案 (0 表示不限制)
+    image_store_max_age_days: int = 30  # 超過天數未使用的圖片檔會被刪除 (0 表示不限制)
+    perf_panel_enabled: bool = False  # 對所有使用者顯示側邊欄效能監控面板
+    admin_usernames: str = ""  # 管理者的使用者名稱（逗號分隔），一律顯示效能監控面板並可重設統計
     
     @classmethod
     def from_secrets(cls) -> Optional['AppConfig']:
@@ -28,7 +66,9 @@ class AppConfig:
                 weather_api_key=st.secrets.get("WEATHER_KEY", ""),
                 supabase_url=st.secrets.get("SUPABASE_URL", ""),
                 supabase_key=st.secrets.get("SUPABASE_KEY", ""),
-                default_city=st.secrets.get("DEFAULT_CITY", "Taipei")
+                default_city=st.secrets.get("DEFAULT_CITY", "Taipei"),
+                weather_base_url=st.secrets.get("WEATHER_BASE_URL", cls.weather_base_url),
+                admin_usernames=st.secrets.get("ADMIN_USERNAMES", "")
             )
         except Exception:
             return None
@@ -41,9 +81,16 @@ class AppConfig:
             weather_api_key=os.getenv("WEATHER_KEY", ""),
             supabase_url=os.getenv("SUPABASE_URL", ""),
             supabase_key=os.getenv("SUPABASE_KEY", ""),
-            default_city=os.getenv("DEFAULT_CITY", "Taipei")
+            default_city=os.getenv("DEFAULT_CITY", "Taipei"),
+            weather_base_url=os.getenv("WEATHER_BASE_URL", cls.weather_base_url),
+            admin_usernames=os.getenv("ADMIN_USERNAMES", "")
         )
     
+    def is_admin(self, username: Optional[str]) -> bool:
+        """是否為管理者"""
+        admins = {name.strip() for name in self.admin_usernames.split(",") if name.strip()}
+        return bool(username) and username in admins
+    
     def is_valid(self) -> bool:
         """檢查配置是否完整"""
         return all([
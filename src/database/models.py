@@ -2,41 +2,156 @@
 資料模型定義
 定義所有資料結構，確保類型安全
 """
-from dataclasses import dataclass
-from typing import Optional
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Tuple
 from datetime import datetime
 
-@dataclass
+# 衣物的中繼資料欄位（不含圖片）
+METADATA_FIELDS = (
+    "id", "name", "category", "color", "style", "warmth",
+    "image_hash", "phash", "raw_hash", "user_id", "created_at"
+)
+# 穿搭推薦 prompt 需要的欄位
+PROMPT_FIELDS = ("id", "name", "category", "color", "style", "warmth")
+
+class ImagePayload:
+    """
+    衣物圖片 (base64) 的 handle
+
+    可直接帶入資料，或帶入 loader 延遲到第一次 get() 才以 loader(key) 讀取；
+    同一批衣物共用同一個 loader，每件只多一個 handle。
+    keep=False 時每次 get() 都重新呼叫 loader、不保留資料，
+    適合長期放在共用快取中的衣物（顯示用圖片另有 DisplayImageCache）。
+    """
+    __slots__ = ("_data", "_loader", "_key", "_keep")
+
+    def __init__(
+        self,
+        data: Optional[str] = None,
+        loader: Optional[Callable[[Any], Optional[str]]] = None,
+        key: Any = None,
+        keep: bool = True
+    ):
+        self._data = data
+        self._loader = loader
+        self._key = key
+        self._keep = keep
+
+    @property
+    def loaded(self) -> bool:
+        """資料已在記憶體中（不需再讀取）"""
+        return self._loader is None
+
+    @property
+    def available(self) -> bool:
+        """可能有圖片：尚未讀取時視為有，讀取後依實際資料判斷"""
+        return self._loader is not None or bool(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        """目前佔用的 base64 字元數（未讀取時為 0）"""
+        return len(self._data or "")
+
+    def get(self) -> Optional[str]:
+        if self._loader is None:
+            return self._data
+        data = self._loader(self._key)
+        if self._keep:
+            self._data, self._loader = data, None
+        return data
+
+class ItemMetadataView(Mapping):
+    """
+    衣物中繼資料的唯讀檢視
+
+    存取時直接讀取衣物的屬性，不複製資料也不會讀取圖片；created_at 以 ISO 字串呈現
+    """
+    __slots__ = ("_item", "_fields")
+
+    def __init__(self, item: 'ClothingItem', fields: Tuple[str, ...] = METADATA_FIELDS):
+        self._item = item
+        self._fields = fields
+
+    def __getitem__(self, key: str):
+        if key not in self._fields:
+            raise KeyError(key)
+        value = getattr(self._item, key)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+@dataclass(slots=True)
 class ClothingItem:
-    """衣物項目資料模型"""
+    """
+    衣物項目資料模型
+
+    以 __slots__ 儲存；圖片放在 ImagePayload，只讀取中繼資料的衣物不會佔用 base64 內容
+    """
     id: Optional[int] = None
     name: str = ""
     category: str = ""  # 上衣|下身|外套|鞋子|配件
     color: str = ""
     style: str = ""
     warmth: int = 5
-    image_data: Optional[str] = None
     image_hash: Optional[str] = None
+    phash: Optional[str] = None  # 感知雜湊 (dHash)，用於近似重複偵測
+    raw_hash: Optional[str] = None  # 上傳原始檔案的 SHA256，用於解碼前快速排除重複
     user_id: Optional[str] = None
     created_at: Optional[datetime] = None
+    image: Optional[ImagePayload] = field(default=None, repr=False, compare=False)
+    
+    @property
+    def image_data(self) -> Optional[str]:
+        """base64 圖片（延遲載入的圖片會在此時讀取）"""
+        return self.image.get() if self.image is not None else None
+    
+    @image_data.setter
+    def image_data(self, value: Optional[str]):
+        self.image = ImagePayload(value) if value is not None else None
+    
+    @property
+    def has_image(self) -> bool:
+        return self.image is not None and self.image.available
+    
+    def metadata(self, fields: Tuple[str, ...] = METADATA_FIELDS) -> ItemMetadataView:
+        """中繼資料的唯讀檢視（不複製、不讀取圖片）"""
+        return ItemMetadataView(self, fields)
     
     def to_dict(self) -> dict:
         """轉換為字典格式（用於資料庫儲存）"""
-        return {
-            "name": self.name,
-            "category": self.category,
-            "color": self.color,
-            "style": self.style,
-            "warmth": self.warmth,
-            "image_data": self.image_data,
-            "image_hash": self.image_hash,
-            "user_id": self.user_id,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+        data = dict(self.metadata())
+        del data["id"]
+        data["image_data"] = self.image_data
+        return data
     
     @classmethod
-    def from_dict(cls, data: dict) -> 'ClothingItem':
-        """從字典創建實例"""
+    def from_dict(
+        cls,
+        data: dict,
+        image_loader: Optional[Callable[[Any], Optional[str]]] = None,
+        keep_image: bool = True
+    ) -> 'ClothingItem':
+        """
+        從字典創建實例
+        
+        Args:
+            data: 資料列
+            image_loader: 資料列不含 image_data 時，以 image_loader(id) 延遲讀取圖片
+            keep_image: 延遲讀取的圖片是否在讀取後保留
+        """
+        if "image_data" in data:
+            image = ImagePayload(data["image_data"]) if data["image_data"] is not None else None
+        elif image_loader is not None:
+            image = ImagePayload(loader=image_loader, key=data.get("id"), keep=keep_image)
+        else:
+            image = None
         return cls(
             id=data.get("id"),
             name=data.get("name", ""),
@@ -44,10 +159,12 @@ class ClothingItem:
             color=data.get("color", ""),
             style=data.get("style", ""),
             warmth=data.get("warmth", 5),
-            image_data=data.get("image_data"),
             image_hash=data.get("image_hash"),
+            phash=data.get("phash"),
+            raw_hash=data.get("raw_hash"),
             user_id=data.get("user_id"),
-            created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None
+            created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None,
+            image=image
         )
 
 @dataclass
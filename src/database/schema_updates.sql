@@ -0,0 +1,9 @@
+-- my_wardrobe 資料表欄位擴充
+-- 請在 Supabase SQL Editor 依序執行
+
+-- 感知雜湊 (dHash)，用於近似重複圖片偵測
+ALTER TABLE my_wardrobe ADD COLUMN IF NOT EXISTS phash TEXT;
+
+-- 上傳原始檔案的 SHA256，重複上傳同一檔案時不必解碼即可排除
+ALTER TABLE my_wardrobe ADD COLUMN IF NOT EXISTS raw_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_my_wardrobe_user_raw_hash ON my_wardrobe (user_id, raw_hash);
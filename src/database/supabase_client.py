@@ -2,8 +2,11 @@
 Supabase 客戶端 - Database Client
 統一管理資料庫連接,適用於 Streamlit Cloud
 """
-from supabase import create_client, Client
-from typing import Optional
+import threading
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 class SupabaseClient:
     """Supabase 資料庫客戶端"""
@@ -18,16 +21,20 @@ class SupabaseClient:
         """
         self.url = url
         self.key = key
-        self._client: Optional[Client] = None
+        self._client: Optional['Client'] = None
+        self._lock = threading.Lock()
     
     @property
-    def client(self) -> Client:
+    def client(self) -> 'Client':
         """
         獲取 Supabase 客戶端實例
-        使用延遲初始化模式
+        使用延遲初始化模式（第一次使用時才載入 supabase SDK）
         """
         if self._client is None:
-            self._client = create_client(self.url, self.key)
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self.url, self.key)
         return self._client
     
     def test_connection(self) -> bool:
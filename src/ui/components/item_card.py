@@ -3,10 +3,8 @@
 顯示單件衣物的資訊卡片
 """
 import streamlit as st
-import base64
-import io
-from PIL import Image
 from database.models import ClothingItem
+from utils.display_cache import GRID_MAX_EDGE, get_display_source
 
 def render_item_card(
     item: ClothingItem, 
@@ -39,12 +37,11 @@ def render_item_card(
                 on_select(item.id, selected)
         
         # 顯示圖片
-        if item.image_data:
-            try:
-                img_bytes = base64.b64decode(item.image_data)
-                img = Image.open(io.BytesIO(img_bytes))
-                st.image(img, use_container_width=True)
-            except Exception as e:
+        if item.has_image:
+            img_source = get_display_source(item, GRID_MAX_EDGE)
+            if img_source:
+                st.image(img_source, use_container_width=True)
+            else:
                 st.error("📷 圖片載入失敗")
         
         # 衣物資訊
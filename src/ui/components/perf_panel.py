@@ -0,0 +1,139 @@
+"""
+效能監控面板
+於側邊欄顯示各服務方法與頁面渲染的耗時統計、Gemini 用量、各 Session 的狀態佔用量，
+並可匯出 JSON / Prometheus 格式
+"""
+import json
+from typing import Optional
+import streamlit as st
+from api.usage_tracker import get_usage_tracker
+from utils.perf import get_registry
+from utils.session_memory import get_session_registry
+
+def render_perf_panel(is_admin: bool = False, user_id: Optional[str] = None, username: Optional[str] = None):
+    """
+    渲染效能監控面板（放在 st.sidebar 內）
+
+    Args:
+        is_admin: 是否為管理者（統計為整個程序共用，只有管理者可以重設與檢視所有使用者的資料）
+        user_id: 目前使用者 ID（非管理者只能看到自己的用量紀錄）
+        username: 目前使用者名稱（非管理者只能看到自己的 Session）
+    """
+    registry = get_registry()
+
+    with st.expander("🛠️ 效能監控", expanded=False):
+        snapshot = registry.snapshot()
+        if not snapshot:
+            st.caption("尚無紀錄")
+            return
+
+        rows = [
+            {
+                "名稱": name,
+                "次數": stat["count"],
+                "p50 ms": stat["p50_ms"],
+                "p95 ms": stat["p95_ms"],
+                "總計 s": stat["total_s"],
+                "KB": round(stat["bytes"] / 1024, 1),
+                "錯誤": stat["errors"]
+            }
+            for name, stat in sorted(snapshot.items(), key=lambda item: item[1]["total_s"], reverse=True)
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "JSON",
+                registry.to_json(),
+                file_name="perf.json",
+                mime="application/json",
+                use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                "Prometheus",
+                registry.to_prometheus(),
+                file_name="perf.prom",
+                mime="text/plain",
+                use_container_width=True
+            )
+
+        # 非管理者只顯示自己的用量與 Session，避免看到其他使用者的 ID、呼叫紀錄與錯誤訊息
+        _render_usage(None if is_admin else user_id)
+        _render_session_memory(None if is_admin else username)
+
+        if is_admin and st.button("🔄 重設統計", use_container_width=True):
+            registry.reset()
+            get_usage_tracker().reset()
+            get_session_registry().reset()
+            st.rerun()
+
+def _render_usage(user_id: Optional[str] = None):
+    """
+    Gemini 用量（依操作與使用者彙總）
+
+    Args:
+        user_id: 只顯示該使用者的彙總與紀錄（None 表示所有使用者）
+    """
+    usage = get_usage_tracker()
+    if not usage.total_calls:
+        return
+
+    st.caption(
+        f"Gemini: {usage.total_calls} 次 · {usage.total_tokens} tokens · "
+        f"{usage.total_request_bytes / 1024 / 1024:.1f} MB"
+    )
+    for by, label in (("operation", "操作"), ("user", "使用者")):
+        rows = [
+            {
+                label: key,
+                "次數": stat["calls"],
+                "失敗": stat["errors"],
+                "圖片": stat["images"],
+                "tokens/張": stat["tokens_per_image"],
+                "KB/張": round(stat["bytes_per_image"] / 1024, 1),
+                "平均 s": stat["avg_latency"],
+                "p95 s": stat["p95_latency"]
+            }
+            for key, stat in sorted(usage.summary(by=by, user_id=None if by == "operation" else user_id).items())
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    st.download_button(
+        "Gemini 用量紀錄",
+        json.dumps(usage.recent(limit=1000, user_id=user_id), ensure_ascii=False, indent=2),
+        file_name="gemini_usage.json",
+        mime="application/json",
+        use_container_width=True
+    )
+
+def _render_session_memory(username: Optional[str] = None):
+    """
+    佔用最多的 Session（session_state 估算大小）
+
+    Args:
+        username: 只列出該使用者的 Session（None 表示所有 Session）
+    """
+    sessions = get_session_registry()
+    stats = sessions.get_stats()
+    if not stats["sessions"]:
+        return
+
+    st.caption(
+        f"Session 狀態: {stats['sessions']} 個 · 合計 {stats['total_bytes'] / 1024 / 1024:.1f} MB · "
+        f"超過預算 {stats['over_budget']} 個 · 已捨棄 {stats['evictions']} 次"
+    )
+    rows = [
+        {
+            "Session": entry["session_id"][:8],
+            "使用者": entry["user"] or "-",
+            "KB": round(entry["total_bytes"] / 1024, 1),
+            "峰值 KB": round(entry["peak_bytes"] / 1024, 1),
+            "最大的鍵": ", ".join(
+                f"{key} {size / 1024:.0f}KB" for key, size in entry["top_keys"].items()
+            )
+        }
+        for entry in sessions.largest(limit=10, user=username)
+    ]
+    st.dataframe(rows, hide_index=True, use_container_width=True)
@@ -6,7 +6,9 @@ import streamlit as st
 from datetime import datetime, timedelta
 from api.weather_service import WeatherService
 from config import TAIWAN_CITIES
+from utils.perf import timed
 
+@timed()
 def render_weather_widget(weather_service: WeatherService, current_city: str):
     """
     渲染天氣小工具
@@ -3,14 +3,14 @@
 提供基於 AI 的智能穿搭建議,優化載入速度
 """
 import streamlit as st
-import base64
-import io
-from PIL import Image
 from api.ai_service import AIService
 from api.wardrobe_service import WardrobeService
 from api.weather_service import WeatherService
 from config import TAIWAN_CITIES
+from utils.display_cache import DETAIL_MAX_EDGE, get_display_source
+from utils.perf import timed
 
+@timed()
 def render_recommendation_page(
     ai_service: AIService,
     wardrobe_service: WardrobeService,
@@ -33,8 +33,8 @@ def render_recommendation_page(
     # 初始化 session state
     if 'ai_recommendation' not in st.session_state:
         st.session_state.ai_recommendation = None
-    if 'recommended_items_cache' not in st.session_state:
-        st.session_state.recommended_items_cache = None
+    if 'recommended_item_ids' not in st.session_state:
+        st.session_state.recommended_item_ids = None
     if 'carousel_index' not in st.session_state:
         st.session_state.carousel_index = 0
     
@@ -95,7 +95,7 @@ def render_recommendation_page(
     if st.button("✨ 獲取今日推薦", type="primary", use_container_width=True, key="get_recommendation_btn"):
         # 清除舊推薦
         st.session_state.ai_recommendation = None
-        st.session_state.recommended_items_cache = None
+        st.session_state.recommended_item_ids = None
         st.session_state.carousel_index = 0
         
         # 獲取天氣資料
@@ -124,7 +124,8 @@ def render_recommendation_page(
                 wardrobe=wardrobe,
                 weather=weather,
                 style=selected_style,
-                occasion=selected_occasion
+                occasion=selected_occasion,
+                user_id=user_id
             )
         
         if recommendation:
@@ -149,84 +150,20 @@ def render_recommendation_page(
         # 推薦單品展示
         st.markdown("### 👔 推薦單品展示")
         
-        # 解析推薦的衣物 (只執行一次)
-        if st.session_state.recommended_items_cache is None:
+        # 解析推薦的衣物 (只執行一次)；Session State 只保存 id，衣物由共用快取取得
+        if st.session_state.recommended_item_ids is None:
             wardrobe = wardrobe_service.get_wardrobe(user_id)
-            st.session_state.recommended_items_cache = ai_service.parse_recommended_items(
-                st.session_state.ai_recommendation,
-                wardrobe
-            )
-        
-        recommended_items = st.session_state.recommended_items_cache
-        
-        if recommended_items:
-            # ✅ 優化輪播控制 - 使用 callback
-            def prev_item():
-                st.session_state.carousel_index = (st.session_state.carousel_index - 1) % len(recommended_items)
-            
-            def next_item():
-                st.session_state.carousel_index = (st.session_state.carousel_index + 1) % len(recommended_items)
-            
-            def jump_to_item(idx):
-                st.session_state.carousel_index = idx
-            
-            col1, col2, col3 = st.columns([1, 2, 1])
-            
-            with col1:
-                st.button("⬅️ 上一件", key="prev_item_btn", use_container_width=True, on_click=prev_item)
-            
-            with col2:
-                st.markdown(
-                    f"<div style='text-align: center; color: #667eea; font-weight: bold; font-size: 18px; padding: 10px;'>"
-                    f"第 {st.session_state.carousel_index + 1} / {len(recommended_items)} 件"
-                    f"</div>",
-                    unsafe_allow_html=True
+            st.session_state.recommended_item_ids = [
+                item.id for item in ai_service.parse_recommended_items(
+                    st.session_state.ai_recommendation,
+                    wardrobe
                 )
-            
-            with col3:
-                st.button("下一件 ➡️", key="next_item_btn", use_container_width=True, on_click=next_item)
-            
-            # 顯示當前衣物
-            current_item = recommended_items[st.session_state.carousel_index]
-            
-            with st.container(border=True):
-                col_img, col_info = st.columns([3, 2])
-                
-                with col_img:
-                    if current_item.image_data:
-                        try:
-                            img_bytes = base64.b64decode(current_item.image_data)
-                            img = Image.open(io.BytesIO(img_bytes))
-                            st.image(img, use_container_width=True)
-                        except:
-                            st.error("📷 圖片載入失敗")
-                    else:
-                        st.info("📷 無圖片資料")
-                
-                with col_info:
-                    st.markdown("### 📋 單品資訊")
-                    st.markdown(f"**名稱**: {current_item.name or '未命名'}")
-                    st.markdown(f"**類別**: {current_item.category or 'N/A'}")
-                    st.markdown(f"**顏色**: {current_item.color or 'N/A'}")
-                    st.markdown(f"**風格**: {current_item.style or 'N/A'}")
-                    st.markdown(f"**保暖度**: {'🔥' * (current_item.warmth or 0)}")
-            
-            # ✅ 快速導航 - 使用數字按鈕
-            st.markdown("---")
-            st.caption("⚡ 快速跳轉:")
-            
-            nav_cols = st.columns(min(len(recommended_items), 10))
-            for idx in range(len(recommended_items)):
-                with nav_cols[idx % 10]:
-                    button_style = "primary" if idx == st.session_state.carousel_index else "secondary"
-                    st.button(
-                        f"{idx + 1}",
-                        key=f"nav_btn_{idx}",
-                        use_container_width=True,
-                        type=button_style,
-                        on_click=jump_to_item,
-                        args=(idx,)
-                    )
+            ]
+        
+        recommended_ids = st.session_state.recommended_item_ids
+        
+        if recommended_ids:
+            _render_carousel(wardrobe_service, user_id, recommended_ids)
         else:
             st.info("💡 AI 推薦的衣物未在您的衣櫥中找到對應圖片")
         
@@ -247,3 +184,85 @@ def render_recommendation_page(
     - 輪播切換即時響應
     - 智能快取天氣與衣櫥資料
     """)
+
+@st.fragment
+@timed()
+def _render_carousel(wardrobe_service: WardrobeService, user_id: str, recommended_ids: list):
+    """
+    推薦單品輪播
+    
+    以 fragment 執行：切換單品只重新執行輪播區塊，不會重新執行其他分頁與側邊欄。
+    fragment 會在 Session 內保存呼叫參數，因此只傳入 id，衣物每次由共用快取取得。
+    """
+    recommended_items = wardrobe_service.get_items_by_ids(user_id, recommended_ids)
+    if not recommended_items:
+        st.info("💡 推薦的衣物已不在您的衣櫥中")
+        return
+    st.session_state.carousel_index %= len(recommended_items)
+    
+    # ✅ 優化輪播控制 - 使用 callback
+    def prev_item():
+        st.session_state.carousel_index = (st.session_state.carousel_index - 1) % len(recommended_items)
+    
+    def next_item():
+        st.session_state.carousel_index = (st.session_state.carousel_index + 1) % len(recommended_items)
+    
+    def jump_to_item(idx):
+        st.session_state.carousel_index = idx
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    with col1:
+        st.button("⬅️ 上一件", key="prev_item_btn", use_container_width=True, on_click=prev_item)
+    
+    with col2:
+        st.markdown(
+            f"<div style='text-align: center; color: #667eea; font-weight: bold; font-size: 18px; padding: 10px;'>"
+            f"第 {st.session_state.carousel_index + 1} / {len(recommended_items)} 件"
+            f"</div>",
+            unsafe_allow_html=True
+        )
+    
+    with col3:
+        st.button("下一件 ➡️", key="next_item_btn", use_container_width=True, on_click=next_item)
+    
+    # 顯示當前衣物
+    current_item = recommended_items[st.session_state.carousel_index]
+    
+    with st.container(border=True):
+        col_img, col_info = st.columns([3, 2])
+        
+        with col_img:
+            if current_item.has_image:
+                img_source = get_display_source(current_item, DETAIL_MAX_EDGE)
+                if img_source:
+                    st.image(img_source, use_container_width=True)
+                else:
+                    st.error("📷 圖片載入失敗")
+            else:
+                st.info("📷 無圖片資料")
+        
+        with col_info:
+            st.markdown("### 📋 單品資訊")
+            st.markdown(f"**名稱**: {current_item.name or '未命名'}")
+            st.markdown(f"**類別**: {current_item.category or 'N/A'}")
+            st.markdown(f"**顏色**: {current_item.color or 'N/A'}")
+            st.markdown(f"**風格**: {current_item.style or 'N/A'}")
+            st.markdown(f"**保暖度**: {'🔥' * (current_item.warmth or 0)}")
+    
+    # ✅ 快速導航 - 使用數字按鈕
+    st.markdown("---")
+    st.caption("⚡ 快速跳轉:")
+    
+    nav_cols = st.columns(min(len(recommended_items), 10))
+    for idx in range(len(recommended_items)):
+        with nav_cols[idx % 10]:
+            button_style = "primary" if idx == st.session_state.carousel_index else "secondary"
+            st.button(
+                f"{idx + 1}",
+                key=f"nav_btn_{idx}",
+                use_container_width=True,
+                type=button_style,
+                on_click=jump_to_item,
+                args=(idx,)
+            )
@@ -3,30 +3,52 @@
 處理衣物上傳的 UI 邏輯，優化批量上傳體驗
 """
 import streamlit as st
-import io
 from PIL import Image
 from typing import List
 from api.ai_service import AIService
 from api.wardrobe_service import WardrobeService
-from database.models import ClothingItem
+from api.job_queue import ACTIVE_STATUSES, JOB_DONE, JOB_DUPLICATE, JOB_FAILED, TagJobWorker
+from api.upload_scheduler import UploadCandidate, plan_batch_sizes
+from utils.image_hash import BKTree, compute_raw_hash
+from utils.image_processing import ImageOptions
+from utils.image_pipeline import prepare_images
+from utils.perf import timed
 
+@timed()
 def render_upload_page(
     ai_service: AIService,
     wardrobe_service: WardrobeService,
+    job_worker: TagJobWorker,
     config
 ):
     """渲染上傳頁面"""
     st.header("上傳新衣到雲端")
     
+    # 登錄本 Session 的服務設定，加入的工作會以同一組金鑰與資料庫處理
+    credentials = job_worker.register_services(ai_service, wardrobe_service)
+    
+    # 進度顯示在頁首，但在處理完上傳按鈕後才渲染，剛加入的工作會立即開始自動更新
+    status_area = st.container()
+    _render_upload_form(ai_service, wardrobe_service, job_worker, credentials, config)
+    with status_area:
+        _render_job_status(job_worker, st.session_state.user_id)
+
+
+def _render_upload_form(
+    ai_service: AIService,
+    wardrobe_service: WardrobeService,
+    job_worker: TagJobWorker,
+    credentials: str,
+    config
+):
+    """渲染檔案選取、預覽與批量上傳按鈕"""
     # 初始化上傳狀態
-    if 'uploaded_files_cache' not in st.session_state:
-        st.session_state.uploaded_files_cache = []
     if 'processed_files' not in st.session_state:
         st.session_state.processed_files = set()
     
     # 文件上傳器
     uploaded_files = st.file_uploader(
-        "選取多張衣服照片(建議 5-10 張最佳)...", 
+        "選取衣服照片(可一次選取大量照片，系統會自動分批辨識)...", 
         type=["jpg", "png", "jpeg"],
         accept_multiple_files=True,
         key="file_uploader"
@@ -34,9 +56,9 @@ def render_upload_page(
     
     if uploaded_files:
         # 檢查數量限制
-        if len(uploaded_files) > config.max_batch_upload:
-            st.error(f"⚠️ 一次最多只能上傳 {config.max_batch_upload} 張照片，您選擇了 {len(uploaded_files)} 張")
-            st.info(f"📌 請重新選擇不超過 {config.max_batch_upload} 張照片")
+        if len(uploaded_files) > config.max_upload_files:
+            st.error(f"⚠️ 一次最多只能上傳 {config.max_upload_files} 張照片，您選擇了 {len(uploaded_files)} 張")
+            st.info(f"📌 請重新選擇不超過 {config.max_upload_files} 張照片")
             return
         
         # 過濾掉已處理的文件
@@ -62,45 +84,58 @@ def render_upload_page(
         
         with col1:
             st.metric("📸 待上傳", len(active_files))
+            batch_size = ai_service.suggest_batch_size() or config.max_batch_upload
+            batch_count = len(plan_batch_sizes(len(active_files), batch_size))
+            st.caption(f"預計分為 {batch_count} 批辨識")
         
         with col2:
             # 🔥 關鍵：批量上傳按鈕移到這裡
             if st.button(
-                f"🚀 批量辨識並上傳全部 ({len(active_files)} 張)", 
+                f"🚀 加入背景辨識並上傳全部 ({len(active_files)} 張)", 
                 type="primary", 
                 use_container_width=True
             ):
                 _handle_batch_upload(
                     active_files,
-                    ai_service,
                     wardrobe_service,
+                    job_worker,
+                    credentials,
                     st.session_state.user_id,
                     config
                 )
+            if ai_service.batch_sizer:
+                with st.expander("🎛️ 批次大小調整狀態"):
+                    tuning = ai_service.batch_sizer.get_state()
+                    st.caption(f"目前批次: **{tuning['batch_size']}** 張 — {tuning['reason']}")
+                    st.json(tuning)
         # 預覽照片（使用可摺疊區域）
             with st.expander("👀 預覽所有照片", expanded=True):
                 _render_image_preview(active_files)
     st.divider()
-    st.info("""
+    st.info(f"""
     **📌 使用提示:**
     1. 拍攝清晰的單件衣服照片
     2. 背景簡潔有助於 AI 辨識
-    3. **🚀 批量上傳模式: 5-10 張最佳** (只需 1 次 API 呼叫)
+    3. **🚀 大量上傳自動分批**: 每批最多 {config.max_batch_upload} 張 (每批 1 次 API 呼叫)
     4. 系統會自動過濾重複的衣服
     5. 已上傳的圖片會自動從列表移除
-    6. 批量模式速度提升 10 倍，避免 RPM 限制
+    6. 辨識在背景進行並自動遵守 RPM 限制，可離開此頁面
     """)
 
 
-def _render_image_preview(files):
+def _render_image_preview(files, max_preview: int = 24):
     """
     渲染圖片預覽網格
     
     Args:
         files: 文件列表
+        max_preview: 最多預覽張數（大量上傳時避免頁面過重）
     """
+    if len(files) > max_preview:
+        st.caption(f"僅預覽前 {max_preview} 張 (共 {len(files)} 張)")
+    
     cols = st.columns(4)
-    for idx, file in enumerate(files):
+    for idx, file in enumerate(files[:max_preview]):
         with cols[idx % 4]:
             try:
                 img = Image.open(file)
@@ -117,141 +152,238 @@ def _render_image_preview(files):
 
 def _handle_batch_upload(
     uploaded_files,
-    ai_service: AIService,
     wardrobe_service: WardrobeService,
+    job_worker: TagJobWorker,
+    credentials: str,
     user_id: str,
     config
 ):
     """
-    處理批量上傳邏輯
+    處理批量上傳邏輯：前處理並檢查重複後加入背景標籤佇列
+    
+    AI 標籤與存檔由背景工作執行，關閉分頁或重新整理都不會中斷。
     
     Args:
         uploaded_files: 上傳的文件列表
-        ai_service: AI 服務
         wardrobe_service: 衣櫥服務
+        job_worker: 背景標籤工作
+        credentials: 本 Session 服務設定的指紋 (register_services 的回傳值)
         user_id: 使用者 ID
         config: 配置對象
     """
     progress_bar = st.progress(0)
     status_text = st.empty()
+    log_area = st.container(height=300)
+    
+    stats = {
+        "duplicate": 0,
+        "skipped": 0,
+        "queued": 0,
+        "suspected": 0,
+        "cropped": 0,
+        "pixels_total": 0,
+        "pixels_saved": 0,
+        "bytes_saved": 0
+    }
+    total_files = len(uploaded_files)
     
-    # === 階段 1: 準備圖片資料 ===
-    status_text.text("📦 正在準備圖片資料...")
-    img_data_list = []
-    img_hash_list = []
-    file_names = []
-    duplicate_count = 0
-    skipped_files = []
+    def update_progress():
+        done = stats["duplicate"] + stats["skipped"] + stats["queued"]
+        progress_bar.progress(min(1.0, done / total_files))
     
+    # === 階段 1: 以原始檔案 hash 排除重複上傳，不必解碼圖片 ===
+    status_text.text("📦 正在檢查重複檔案...")
+    raw_index = wardrobe_service.get_raw_hash_index(user_id)
+    if raw_index is None:
+        # 讀取失敗時不逐檔重試，改由階段 2 的圖片 hash 檢查重複
+        log_area.warning("⚠️ 無法讀取既有檔案的 hash，略過快速重複檢查")
+        raw_index = {}
+    new_files = []
+    new_raw_hashes = []
     for file in uploaded_files:
-        try:
-            img = Image.open(file)
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG')
-            img_bytes = img_byte_arr.getvalue()
-            img_hash = wardrobe_service.get_image_hash(img_bytes)
-            
-            # 檢查重複
-            is_duplicate, existing_name = wardrobe_service.check_duplicate_image(user_id, img_hash)
-            if is_duplicate:
-                duplicate_count += 1
-                skipped_files.append(file.name)
-                st.warning(f"⚠️ {file.name} 重複 (已存在: {existing_name})")
-                continue
-            
-            img_data_list.append(img_bytes)
-            img_hash_list.append(img_hash)
-            file_names.append(file.name)
-        except Exception as e:
-            st.error(f"❌ {file.name} 讀取失敗: {str(e)}")
-            skipped_files.append(file.name)
+        raw_hash = compute_raw_hash(file)
+        existing_name = raw_index.get(raw_hash)
+        if existing_name is not None or raw_hash in new_raw_hashes:
+            stats["duplicate"] += 1
+            log_area.warning(f"⚠️ {file.name} 重複 (已存在: {existing_name or '同批次檔案'})")
+            continue
+        new_files.append(file)
+        new_raw_hashes.append(raw_hash)
+    update_progress()
     
-    if not img_data_list:
-        st.warning("所有圖片都已存在或無法讀取，沒有新圖片需要上傳")
-        progress_bar.empty()
-        status_text.empty()
-        return
+    # === 階段 2: 前處理、重複檢查並加入佇列 ===
+    status_text.text("📦 正在準備圖片並加入辨識佇列...")
+    candidates = _iter_upload_candidates(
+        new_files, new_raw_hashes, wardrobe_service, user_id, config, stats, log_area, update_progress
+    )
+    for candidate in candidates:
+        job_worker.queue.enqueue(
+            user_id,
+            candidate.file_name,
+            candidate.raw_hash,
+            candidate.prepared,
+            credentials,
+            duplicate_of=candidate.similar_to
+        )
+        stats["queued"] += 1
+        update_progress()
+    # 全部加入後才喚醒背景執行緒，工作依建議批次大小一起辨識，不會逐張送出
+    if stats["queued"]:
+        job_worker.notify()
     
-    # === 階段 2: AI 批量辨識 ===
-    progress_bar.progress(0.3)
-    status_text.text(f"🤖 AI 正在批量分析 {len(img_data_list)} 件衣服...")
-    st.info(f"⚡ 批量模式: {len(img_data_list)} 張圖片只需 1 次 API 呼叫 (約 20-40 秒)")
+    progress_bar.progress(1.0)
+    status_text.empty()
     
-    tags_list = ai_service.batch_auto_tag(img_data_list)
+    # 已處理的檔案從選取列表移除
+    for file in uploaded_files:
+        st.session_state.processed_files.add(file.name)
     
-    if not tags_list:
-        st.error("❌ 批量辨識失敗，請重試")
-        progress_bar.empty()
-        status_text.empty()
-        return
+    # === 階段 3: 顯示統計 ===
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("📊 處理數", total_files)
+    with col2:
+        st.metric("🕒 已加入佇列", stats["queued"])
+    with col3:
+        st.metric("⚠️ 重複/跳過", stats["duplicate"] + stats["skipped"])
     
-    st.success(f"✅ AI 辨識完成! 共 {len(tags_list)} 件衣服")
+    if config.auto_crop_enabled and stats["cropped"]:
+        st.caption(
+            f"✂️ 自動裁切 {stats['cropped']} 張，"
+            f"省下 {stats['pixels_saved'] / stats['pixels_total']:.0%} 像素、"
+            f"約 {stats['bytes_saved'] / 1024:.0f} KB"
+        )
     
-    # === 階段 3: 儲存到資料庫 ===
-    progress_bar.progress(0.6)
-    status_text.text("💾 正在存入資料庫...")
+    if stats["suspected"]:
+        st.warning(
+            f"🔍 {stats['suspected']} 張與衣櫥中的衣物非常相似，仍已加入佇列並標示為疑似重複，"
+            "請在工作明細確認，若確實重複可到衣櫥刪除"
+        )
     
-    success_count = 0
-    fail_count = 0
-    successfully_uploaded = []
+    if stats["queued"]:
+        st.success(f"🚀 已加入 {stats['queued']} 張到背景辨識佇列，可離開此頁面，完成後會自動存入衣櫥")
+
+
+def _render_job_status(job_worker: TagJobWorker, user_id: str):
+    """
+    渲染背景標籤工作狀態（有進行中的工作時每 3 秒自動更新）
     
-    for idx, (tags, img_bytes, img_hash, file_name) in enumerate(zip(
-        tags_list, img_data_list, img_hash_list, file_names
-    )):
-        progress = 0.6 + 0.4 * (idx + 1) / len(img_data_list)
-        progress_bar.progress(progress)
-        status_text.text(f"正在存入: {file_name} ({idx + 1}/{len(img_data_list)})")
+    Args:
+        job_worker: 背景標籤工作
+        user_id: 使用者 ID
+    """
+    job_queue = job_worker.queue
+    if not job_queue.get_user_summary(user_id):
+        return
+    
+    active = job_queue.has_active_jobs(user_id)
+    
+    @st.fragment(run_every=3 if active else None)
+    def job_status_panel():
+        summary = job_queue.get_user_summary(user_id)
+        pending = sum(summary.get(status, 0) for status in ACTIVE_STATUSES)
+        finished = sum(summary.values()) - pending
+        
+        st.subheader("🕒 背景辨識進度")
+        if summary:
+            st.progress(finished / sum(summary.values()))
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("⏳ 等待/處理中", pending)
+        with col2:
+            st.metric("✅ 完成", summary.get(JOB_DONE, 0))
+        with col3:
+            st.metric("⚠️ 重複", summary.get(JOB_DUPLICATE, 0))
+        with col4:
+            st.metric("❌ 失敗", summary.get(JOB_FAILED, 0))
+        
+        # 命中數依本使用者的工作計算，不讀取所有 Session 共用的快取統計
+        cache_hits = job_queue.count_cache_hits(user_id)
+        if cache_hits:
+            st.caption(f"♻️ {cache_hits} 件命中標籤快取，未呼叫 AI")
         
-        try:
-            item = ClothingItem(
-                name=tags['name'],
-                category=tags['category'],
-                color=tags['color'],
-                style=tags.get('style', ''),
-                warmth=tags['warmth'],
-                user_id=user_id
-            )
-            
-            success, result = wardrobe_service.save_item(item, img_bytes)
-            
-            if success:
-                success_count += 1
-                successfully_uploaded.append(file_name)
-                st.success(f"✅ {file_name} → {tags['name']}")
-            else:
-                fail_count += 1
-                st.error(f"❌ {file_name} 存入失敗: {result}")
+        with st.expander("📋 工作明細"):
+            for job in job_queue.get_user_jobs(user_id):
+                label = f"{job['file_name']} · {job['status']}"
+                if job['item_name']:
+                    label += f" → {job['item_name']}"
+                if job['cache_hit']:
+                    label += " · ♻️ 快取"
+                if job['duplicate_of']:
+                    label += f" · 🔍 疑似與「{job['duplicate_of']}」重複"
+                if job['error']:
+                    label += f" ({job['error']})"
+                st.caption(label)
         
-        except Exception as e:
-            fail_count += 1
-            st.error(f"❌ {file_name} 處理失敗: {str(e)}")
+        if pending == 0:
+            if active:
+                # 工作剛全部結束：整頁重新執行以停止輪詢並更新衣櫥
+                st.rerun()
+            if st.button("🧹 清除已完成紀錄", use_container_width=True):
+                job_queue.clear_finished(user_id)
+                st.rerun()
     
-    progress_bar.progress(1.0)
-    status_text.empty()
+    job_status_panel()
+
+
+def _iter_upload_candidates(
+    files,
+    raw_hashes: List[str],
+    wardrobe_service: WardrobeService,
+    user_id: str,
+    config,
+    stats: dict,
+    log_area,
+    update_progress
+):
+    """
+    平行前處理圖片，並逐一排除重複；近似重複仍會加入，只標示相似的衣物讓使用者確認
     
-    # === 階段 4: 顯示統計 ===
-    st.divider()
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("📊 處理數", len(img_data_list))
-    with col2:
-        st.metric("✅ 成功", success_count)
-    with col3:
-        st.metric("⚠️ 重複/跳過", duplicate_count + len(skipped_files) - duplicate_count)
-    with col4:
-        st.metric("❌ 失敗", fail_count)
+    Yields:
+        UploadCandidate
+    """
+    options = ImageOptions.from_config(config)
+    batch_phash_index = BKTree()  # 同一次上傳內的近似重複
+    
+    prepared_results = prepare_images(
+        (file.getvalue() for file in files),
+        options,
+        max_workers=config.prepare_workers,
+        max_in_flight=config.prepare_max_in_flight
+    )
     
-    # 🔥 位置 2：自動清除已上傳的文件
-    if successfully_uploaded:
-        for file_name in successfully_uploaded:
-            st.session_state.processed_files.add(file_name)
+    for file, raw_hash, (prepared, error) in zip(files, raw_hashes, prepared_results):
+        if error:
+            stats["skipped"] += 1
+            log_area.error(f"❌ {file.name} 讀取失敗: {error}")
+            update_progress()
+            continue
+        
+        stats["pixels_total"] += prepared.original_size[0] * prepared.original_size[1]
+        if prepared.cropped:
+            stats["cropped"] += 1
+            stats["pixels_saved"] += prepared.pixels_saved
+            stats["bytes_saved"] += prepared.bytes_saved
+        
+        # 檢查重複
+        is_duplicate, existing_name = wardrobe_service.check_duplicate_image(user_id, prepared.image_hash)
+        if is_duplicate:
+            stats["duplicate"] += 1
+            log_area.warning(f"⚠️ {file.name} 重複 (已存在: {existing_name})")
+            update_progress()
+            continue
         
-        st.balloons()
-        st.success(f"🎉 批量上傳完成！成功 {success_count} 件")
-        st.info("✨ 已上傳的圖片已自動從列表移除")
+        # 檢查近似重複（重拍、裁切的同一件衣服）：不略過，標示後由使用者確認
+        similar_to = None
+        if config.near_duplicate_check:
+            matches = wardrobe_service.find_near_duplicates(
+                user_id, prepared.phash, config.near_duplicate_distance
+            ) or batch_phash_index.search(prepared.phash, config.near_duplicate_distance)
+            if matches:
+                distance, similar_to = matches[0]
+                stats["suspected"] += 1
+                log_area.warning(f"🔍 {file.name} 與「{similar_to}」非常相似 (差異度 {distance})，標示為疑似重複")
+            batch_phash_index.add(prepared.phash, file.name)
         
-        # 延遲 2 秒後刷新頁面
-        import time
-        time.sleep(2)
-        progress_bar.empty()
-        st.rerun()
+        yield UploadCandidate(file.name, raw_hash, prepared, similar_to)
@@ -3,11 +3,11 @@
 處理衣櫥管理的 UI 邏輯,包含批量刪除即時刷新
 """
 import streamlit as st
-import base64
-import io
-from PIL import Image
 from api.wardrobe_service import WardrobeService
+from utils.display_cache import GRID_MAX_EDGE, get_display_cache, get_display_source
+from utils.perf import timed
 
+@timed()
 def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
     """
     渲染衣櫥頁面
@@ -22,7 +22,12 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
     if 'batch_delete_mode' not in st.session_state:
         st.session_state.batch_delete_mode = False
     if 'selected_items' not in st.session_state:
-        st.session_state.selected_items = []
+        # 首次進入或超過狀態預算被捨棄時，由目前勾選框的狀態重建
+        st.session_state.selected_items = {
+            int(key[len("check_"):])
+            for key, checked in st.session_state.items()
+            if str(key).startswith("check_") and checked
+        }
     
     # 頂部操作列
     col1, col2 = st.columns([3, 1])
@@ -37,7 +42,7 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
         ):
             st.session_state.batch_delete_mode = not st.session_state.batch_delete_mode
             if not st.session_state.batch_delete_mode:
-                st.session_state.selected_items = []
+                st.session_state.selected_items = set()
             st.rerun()
     
     # 讀取衣櫥資料
@@ -50,8 +55,8 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
     # 顯示統計
     st.write(f"共有 **{len(items)}** 件衣服")
     
-    # 分類統計
-    categories = wardrobe_service.get_category_statistics(user_id)
+    # 分類統計（由欄式索引計算，沿用已讀取的衣物，不再重新查詢）
+    categories = wardrobe_service.get_category_statistics(user_id, items)
     if categories:
         col1, col2, col3, col4 = st.columns(4)
         cols = [col1, col2, col3, col4]
@@ -59,21 +64,103 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
             with cols[i % 4]:
                 st.metric(cat, count)
     
+    # 篩選（以欄式索引查詢符合的衣物 id）
+    index = wardrobe_service.get_wardrobe_index(user_id, items)
+    if index is not None:
+        filters = _render_filters(index)
+        if filters:
+            items_by_id = {item.id: item for item in items}
+            items = [items_by_id[item_id] for item_id in index.query(**filters) if item_id in items_by_id]
+            st.caption(f"🔍 符合篩選條件: **{len(items)}** 件")
+            if not items:
+                st.info("沒有符合篩選條件的衣服")
+                return
+    
     st.divider()
     
-    # 批量刪除模式提示和操作
+    # 顯示衣物卡片（勾選、全選只重新執行此區塊）
+    _render_wardrobe_panel(items, wardrobe_service, user_id)
+    
+    # 圖片快取狀態
+    cache_stats = get_display_cache().get_stats()
+    st.caption(
+        f"🖼️ 圖片快取: 命中率 {cache_stats['hit_rate']:.0%} · "
+        f"{cache_stats['entries']} 張 · "
+        f"{cache_stats['resident_bytes'] / 1024 / 1024:.1f} / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB"
+    )
+
+
+# 保暖度的範圍（AI 標籤為 1-10）
+WARMTH_RANGE = (1, 10)
+FILTER_COLUMNS = (("category", "類別"), ("color", "顏色"), ("style", "風格"))
+
+
+def _render_filters(index) -> dict:
+    """
+    渲染篩選條件
+    
+    Returns:
+        WardrobeIndex.query 的參數，沒有任何條件時為空 dict
+    """
+    filters = {}
+    with st.expander("🔍 篩選", expanded=False):
+        cols = st.columns(len(FILTER_COLUMNS))
+        for col, (column, label) in zip(cols, FILTER_COLUMNS):
+            options = index.values(column)
+            key = f"wardrobe_filter_{column}"
+            # 刪除衣物後已不存在的選項需先移除，否則多選框會出錯
+            if key in st.session_state:
+                st.session_state[key] = [value for value in st.session_state[key] if value in options]
+            with col:
+                selected = st.multiselect(label, options, key=key)
+            if selected:
+                filters[column] = selected
+        
+        low, high = index.warmth_bounds()
+        bounds = (min(WARMTH_RANGE[0], low), max(WARMTH_RANGE[1], high))
+        warmth = st.slider("保暖度", bounds[0], bounds[1], bounds, key="wardrobe_filter_warmth")
+        if tuple(warmth) != bounds:
+            filters["warmth_range"] = tuple(warmth)
+    return filters
+
+
+def _checkbox_key(item_id: int) -> str:
+    return f"check_{item_id}"
+
+
+def _toggle_selection(item_id: int):
+    """勾選框回調：同步更新選取集合"""
+    if st.session_state[_checkbox_key(item_id)]:
+        st.session_state.selected_items.add(item_id)
+    else:
+        st.session_state.selected_items.discard(item_id)
+
+
+def _set_selection(item_ids: list, selected: bool):
+    """全選 / 取消回調：同時更新選取集合與勾選框狀態"""
+    st.session_state.selected_items = set(item_ids) if selected else set()
+    for item_id in item_ids:
+        st.session_state[_checkbox_key(item_id)] = selected
+
+
+@st.fragment
+@timed()
+def _render_wardrobe_panel(items, wardrobe_service: WardrobeService, user_id: str):
+    """
+    批量刪除操作列與衣櫥網格
+    
+    以 fragment 執行：勾選、全選、取消只重新執行此區塊並沿用已讀取的 items，
+    不會重新查詢資料庫或重繪側邊欄、天氣與其他分頁；刪除後才重新執行整個頁面。
+    """
     if st.session_state.batch_delete_mode:
         st.warning("🗑️ 批量刪除模式:勾選要刪除的衣服")
+        item_ids = [item.id for item in items]
         
         col1, col2, col3 = st.columns([1, 1, 4])
         with col1:
-            if st.button("☑️ 全選", use_container_width=True):
-                st.session_state.selected_items = [item.id for item in items]
-                st.rerun()
+            st.button("☑️ 全選", use_container_width=True, on_click=_set_selection, args=(item_ids, True))
         with col2:
-            if st.button("⬜ 取消", use_container_width=True):
-                st.session_state.selected_items = []
-                st.rerun()
+            st.button("⬜ 取消", use_container_width=True, on_click=_set_selection, args=(item_ids, False))
         with col3:
             if st.session_state.selected_items:
                 if st.button(
@@ -85,7 +172,7 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
                     with st.spinner("刪除中..."):
                         success, success_count, fail_count = wardrobe_service.batch_delete_items(
                             user_id, 
-                            st.session_state.selected_items
+                            list(st.session_state.selected_items)
                         )
                     
                     # 顯示結果
@@ -97,15 +184,14 @@ def render_wardrobe_page(wardrobe_service: WardrobeService, user_id: str):
                         st.error("❌ 批量刪除失敗")
                     
                     # 清空選擇並退出批量模式
-                    st.session_state.selected_items = []
+                    st.session_state.selected_items = set()
                     st.session_state.batch_delete_mode = False
                     
-                    # 🔥 關鍵:立即刷新頁面
-                    st.rerun()
+                    # 🔥 關鍵:資料已變更,重新執行整個頁面
+                    st.rerun(scope="app")
         
         st.divider()
     
-    # 顯示衣物卡片
     _render_wardrobe_grid(items, wardrobe_service, user_id)
 
 
@@ -119,31 +205,24 @@ def _render_wardrobe_grid(items, wardrobe_service: WardrobeService, user_id: str
         user_id: 使用者 ID
     """
     cols = st.columns(3)
+    selected_items = st.session_state.selected_items
     
     for idx, item in enumerate(items):
         with cols[idx % 3]:
             with st.container(border=True):
                 # 批量刪除模式:顯示選擇框
                 if st.session_state.batch_delete_mode:
-                    is_selected = item.id in st.session_state.selected_items
-                    if st.checkbox(
-                        "選擇", 
-                        value=is_selected, 
-                        key=f"check_{item.id}"
-                    ):
-                        if item.id not in st.session_state.selected_items:
-                            st.session_state.selected_items.append(item.id)
-                    else:
-                        if item.id in st.session_state.selected_items:
-                            st.session_state.selected_items.remove(item.id)
+                    key = _checkbox_key(item.id)
+                    if key not in st.session_state:
+                        st.session_state[key] = item.id in selected_items
+                    st.checkbox("選擇", key=key, on_change=_toggle_selection, args=(item.id,))
                 
                 # 顯示圖片
-                if item.image_data:
-                    try:
-                        img_bytes = base64.b64decode(item.image_data)
-                        img = Image.open(io.BytesIO(img_bytes))
-                        st.image(img, use_container_width=True)
-                    except:
+                if item.has_image:
+                    img_source = get_display_source(item, GRID_MAX_EDGE)
+                    if img_source:
+                        st.image(img_source, use_container_width=True)
+                    else:
                         st.write("🖼️ 圖片載入失敗")
                 
                 # 顯示資訊
@@ -158,6 +237,6 @@ def _render_wardrobe_grid(items, wardrobe_service: WardrobeService, user_id: str
                     if st.button("🗑️ 刪除", key=f"del_{item.id}", use_container_width=True):
                         if wardrobe_service.delete_item(user_id, item.id):
                             st.success("✅ 已刪除")
-                            st.rerun()
+                            st.rerun(scope="app")
                         else:
                             st.error("❌ 刪除失敗")
@@ -0,0 +1,176 @@
+"""
+顯示用圖片快取
+程序內共用、依位元組預算淘汰的 LRU 快取，保存已縮放、可直接交給 st.image 的 JPEG bytes，
+重複渲染衣櫥網格與推薦輪播時不需再解碼 base64 與圖片
+"""
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+# 常用的顯示尺寸 (最長邊像素)
+GRID_MAX_EDGE = 480
+DETAIL_MAX_EDGE = 900
+DISPLAY_QUALITY = 85
+
+class DisplayImageCache:
+    """以 (image_hash, 尺寸) 為鍵的 LRU 快取，總大小不超過 max_bytes"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        image_hash: Optional[str],
+        image_data: Union[str, Callable[[], Optional[str]], None],
+        max_edge: int
+    ) -> Optional[bytes]:
+        """
+        取得顯示用的 JPEG bytes，未命中時解碼、縮放後放入快取
+
+        Args:
+            image_hash: 圖片 hash（缺少時以 image_data 計算）
+            image_data: base64 編碼的原始圖片，或回傳它的函式（只在未命中時呼叫）
+            max_edge: 顯示尺寸的最長邊
+
+        Returns:
+            JPEG bytes，解碼失敗時回傳 None
+        """
+        if not image_data:
+            return None
+        if not image_hash:
+            image_data = image_data() if callable(image_data) else image_data
+            if not image_data:
+                return None
+        key = (image_hash or hashlib.sha256(image_data.encode('utf-8')).hexdigest(), max_edge)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        if callable(image_data):
+            image_data = image_data()
+            if not image_data:
+                return None
+
+        try:
+            # 只有未命中時才需要 PIL，延遲匯入以免拖慢頁面冷啟動
+            from PIL import Image
+            from utils.image_processing import encode_jpeg, normalize_image
+            img = normalize_image(Image.open(io.BytesIO(base64.b64decode(image_data))))
+            data = encode_jpeg(img, max_edge, DISPLAY_QUALITY)
+        except Exception as e:
+            print(f"圖片解碼失敗: {str(e)}")
+            return None
+
+        self._put(key, data)
+        return data
+
+    def _put(self, key: Tuple[str, int], data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.resident_bytes -= len(previous)
+            self._entries[key] = data
+            self.resident_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的項目直到符合預算（呼叫端需持有鎖）"""
+        while self.resident_bytes > self.max_bytes and self._entries:
+            _, data = self._entries.popitem(last=False)
+            self.resident_bytes -= len(data)
+            self.evictions += 1
+
+    def set_max_bytes(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get_stats(self) -> dict:
+        """快取統計（命中率與佔用記憶體）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def discard(self, image_hashes: Iterable[Optional[str]]):
+        """移除圖片所有尺寸的快取"""
+        hashes = {image_hash for image_hash in image_hashes if image_hash}
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in hashes]:
+                self.resident_bytes -= len(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+# 程序內共用的快取
+_display_cache = DisplayImageCache()
+# 啟用時改以網址提供圖片 (utils.image_server.ImageServer)
+_image_server = None
+
+def get_display_cache() -> DisplayImageCache:
+    return _display_cache
+
+def configure_display_cache(max_bytes: int):
+    """依設定調整快取預算（每次 rerun 呼叫皆可，不會清除已快取的圖片）"""
+    if _display_cache.max_bytes != max_bytes:
+        _display_cache.set_max_bytes(max_bytes)
+
+def set_image_server(server):
+    """設定圖片伺服器，None 表示停用（圖片改為內嵌 bytes）"""
+    global _image_server
+    _image_server = server
+
+def forget_images(image_hashes: Iterable[Optional[str]]):
+    """衣物刪除後移除其顯示用圖片（快取與圖片伺服器的檔案）"""
+    image_hashes = list(image_hashes)
+    _display_cache.discard(image_hashes)
+    if _image_server is not None:
+        _image_server.remove(image_hashes)
+
+def _image_source(item) -> Union[str, Callable[[], Optional[str]], None]:
+    """延遲讀取的圖片傳入讀取函式，由快取在未命中時才呼叫"""
+    image = getattr(item, "image", None)
+    if image is None:
+        return None
+    return image.get
+
+def get_display_image(item, max_edge: int = GRID_MAX_EDGE) -> Optional[bytes]:
+    """取得衣物的顯示用圖片（快取命中時不會讀取衣物的圖片）"""
+    return _display_cache.get(item.image_hash, _image_source(item), max_edge)
+
+def get_display_source(item, max_edge: int = GRID_MAX_EDGE) -> Optional[Union[str, bytes]]:
+    """
+    取得可交給 st.image 的圖片來源
+
+    有圖片伺服器時回傳可被瀏覽器長期快取的網址，否則回傳快取中的 JPEG bytes。
+    """
+    if _image_server is not None:
+        url = _image_server.url_for(item.image_hash, _image_source(item), max_edge)
+        if url:
+            return url
+    return get_display_image(item, max_edge)
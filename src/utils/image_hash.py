@@ -0,0 +1,119 @@
+"""
+圖片雜湊工具
+提供感知雜湊 (dHash) 與漢明距離計算，用於辨識外觀相同但位元組不同的圖片
+"""
+import hashlib
+import io
+from typing import BinaryIO, TYPE_CHECKING
+
+# NumPy 與 PIL 只在計算感知雜湊時才匯入；BKTree 與原始檔案 hash 不需要它們
+if TYPE_CHECKING:
+    from PIL import Image
+
+def compute_raw_hash(fileobj: BinaryIO, chunk_size: int = 1 << 20) -> str:
+    """
+    以串流方式計算上傳檔案原始 bytes 的 SHA256（不解碼圖片）
+    
+    Args:
+        fileobj: 可 seek 的檔案物件
+        chunk_size: 每次讀取的大小
+        
+    Returns:
+        十六進位 SHA256 字串
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def compute_dhash(img_bytes: bytes, hash_size: int = 8) -> str:
+    """
+    計算圖片的差異雜湊 (dHash)
+    
+    Args:
+        img_bytes: 圖片 bytes
+        hash_size: 雜湊邊長，結果為 hash_size * hash_size 位元
+        
+    Returns:
+        十六進位字串 (預設 64 位元 → 16 字元)
+    """
+    from PIL import Image
+    return compute_dhash_from_image(Image.open(io.BytesIO(img_bytes)), hash_size)
+
+def compute_dhash_from_image(img: 'Image.Image', hash_size: int = 8) -> str:
+    """計算已解碼圖片的差異雜湊 (dHash)，避免重複解碼"""
+    import numpy as np
+    from PIL import Image
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    
+    pixels = np.asarray(img, dtype=np.int16)
+    # 每列相鄰像素比較亮度，一次完成所有位元
+    diff = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(diff.ravel()).tobytes().hex()
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """計算兩個十六進位雜湊之間的漢明距離"""
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
+
+class BKTree:
+    """
+    以漢明距離建立的 BK-tree
+    查詢「距離 d 以內」的雜湊時只需走訪部分節點，不必逐一比對
+    """
+    
+    def __init__(self):
+        # 節點結構: [雜湊整數, 值列表, {距離: 子節點}]
+        self._root = None
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def add(self, hash_hex: str, value):
+        """加入一個雜湊與其對應值（相同雜湊會合併到同一節點）"""
+        hash_int = int(hash_hex, 16)
+        self._size += 1
+        
+        if self._root is None:
+            self._root = [hash_int, [value], {}]
+            return
+        
+        node = self._root
+        while True:
+            distance = (hash_int ^ node[0]).bit_count()
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_int, [value], {}]
+                return
+            node = child
+    
+    def search(self, hash_hex: str, max_distance: int) -> list:
+        """
+        查詢距離在 max_distance 以內的所有值
+        
+        Returns:
+            [(距離, 值), ...]，依距離由近到遠排序
+        """
+        if self._root is None:
+            return []
+        
+        hash_int = int(hash_hex, 16)
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = (hash_int ^ node[0]).bit_count()
+            if distance <= max_distance:
+                results.extend((distance, value) for value in node[1])
+            # 三角不等式：只有距離落在 [d - max, d + max] 的子樹可能有結果
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        
+        results.sort(key=lambda pair: pair[0])
+        return results
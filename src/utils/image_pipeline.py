@@ -0,0 +1,108 @@
+"""
+圖片平行前處理管線
+以 process pool 平行解碼、正規化、雜湊與編碼，限制同時處理中的圖片數量以控制記憶體
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Optional, Tuple
+from utils.image_processing import ImageOptions, PreparedImage, prepare_image
+
+# 程序內共用的 process pool（延遲建立）
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """取得（必要時建立）共用的 process pool"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # 使用 spawn，避免在多執行緒的 Streamlit 程序中 fork
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_workers = max_workers
+        return _executor
+
+def _reset_executor():
+    """丟棄已損壞的 process pool，下次使用時重建"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+def _prepare_inline(raw_bytes: bytes, options: ImageOptions) -> Tuple[Optional[PreparedImage], Optional[str]]:
+    try:
+        return prepare_image(raw_bytes, options), None
+    except Exception as e:
+        return None, str(e)
+
+def prepare_images(
+    raw_items: Iterable[bytes],
+    options: ImageOptions,
+    max_workers: int = 0,
+    max_in_flight: int = 0
+) -> Iterator[Tuple[Optional[PreparedImage], Optional[str]]]:
+    """
+    平行前處理多張圖片，依輸入順序逐一產出結果
+
+    raw_items 會被延遲讀取，同時最多只有 max_in_flight 張圖片在處理中。
+
+    Args:
+        raw_items: 上傳檔案原始 bytes（可為 generator）
+        options: 前處理參數
+        max_workers: process 數量，0 表示使用 CPU 核心數
+        max_in_flight: 同時處理中的圖片上限，0 表示 max_workers 的兩倍
+
+    Yields:
+        (PreparedImage 或 None, 錯誤訊息或 None)
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or max_workers * 2
+
+    if max_workers == 1:
+        for raw_bytes in raw_items:
+            yield _prepare_inline(raw_bytes, options)
+        return
+
+    executor = _get_executor(max_workers)
+    pending = deque()  # [(future, raw_bytes)]，保留原始 bytes 以便 pool 損壞時改為同步處理
+    items = iter(raw_items)
+    exhausted = False
+
+    while pending or not exhausted:
+        # 補滿處理中的工作
+        while not exhausted and len(pending) < max_in_flight:
+            raw_bytes = next(items, None)
+            if raw_bytes is None:
+                exhausted = True
+                break
+            try:
+                pending.append((executor.submit(prepare_image, raw_bytes, options), raw_bytes))
+            except (BrokenProcessPool, RuntimeError):
+                _reset_executor()
+                pending.append((None, raw_bytes))
+
+        if not pending:
+            break
+
+        # 依提交順序取回最前面的結果
+        future, raw_bytes = pending.popleft()
+        if future is None:
+            yield _prepare_inline(raw_bytes, options)
+            continue
+        try:
+            yield future.result(), None
+        except BrokenProcessPool:
+            _reset_executor()
+            yield _prepare_inline(raw_bytes, options)
+        except Exception as e:
+            yield None, str(e)
@@ -0,0 +1,347 @@
+"""
+圖片前處理工具
+統一處理上傳圖片的方向、色彩模式與尺寸，分別產生送 AI 與儲存用的 JPEG
+"""
+import hashlib
+import io
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from utils.image_hash import compute_dhash_from_image
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """圖片前處理參數"""
+    ai_max_edge: int = 1024
+    ai_quality: int = 80
+    ai_max_bytes: int = 300_000
+    storage_max_edge: int = 1600
+    storage_quality: int = 88
+    auto_crop: bool = False
+    crop_min_confidence: float = 0.6
+
+    @classmethod
+    def from_config(cls, config) -> 'ImageOptions':
+        """從 AppConfig 建立"""
+        return cls(
+            ai_max_edge=config.ai_image_max_edge,
+            ai_quality=config.ai_image_quality,
+            ai_max_bytes=config.ai_image_max_bytes,
+            storage_max_edge=config.storage_image_max_edge,
+            storage_quality=config.storage_image_quality,
+            auto_crop=config.auto_crop_enabled,
+            crop_min_confidence=config.auto_crop_min_confidence
+        )
+
+@dataclass(frozen=True)
+class MontageLayout:
+    """拼圖模式的格子設定"""
+    tile_size: int = 384
+    columns: int = 3
+    rows: int = 3
+
+    @property
+    def tiles_per_montage(self) -> int:
+        return self.columns * self.rows
+
+    @classmethod
+    def from_config(cls, config) -> 'MontageLayout':
+        """從 AppConfig 建立"""
+        return cls(
+            tile_size=config.montage_tile_size,
+            columns=config.montage_grid_columns,
+            rows=config.montage_grid_rows
+        )
+
+@dataclass
+class PreparedImage:
+    """前處理完成的圖片"""
+    ai_bytes: bytes       # 送 Gemini 的縮圖
+    storage_bytes: bytes  # 存入資料庫的圖片
+    image_hash: str       # 上傳圖片的 SHA256 (見 legacy_image_hash，與既有資料相容)
+    phash: str            # 感知雜湊
+    original_size: tuple  # 原始 (寬, 高)
+    cropped: bool = False     # 是否已自動裁切主體
+    crop_confidence: float = 0.0
+    pixels_saved: int = 0     # 裁切省下的像素數
+    bytes_saved: int = 0      # 裁切省下的 AI + 儲存 bytes (依像素比例估算)
+
+def normalize_image(img: Image.Image) -> Image.Image:
+    """
+    修正 EXIF 方向並轉為 RGB
+    透明背景 (RGBA / LA / 帶透明色的 P 模式) 會以白底合成，避免 JPEG 儲存失敗
+    """
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def encode_jpeg(
+    img: Image.Image,
+    max_edge: int,
+    quality: int,
+    max_bytes: int = 0,
+    min_quality: int = 50
+) -> bytes:
+    """
+    縮放並編碼為 JPEG
+
+    Args:
+        img: RGB 圖片
+        max_edge: 最長邊上限 (像素)
+        quality: JPEG 品質
+        max_bytes: 位元組預算，0 表示不限制
+        min_quality: 為符合預算時可降到的最低品質
+
+    Returns:
+        JPEG bytes
+    """
+    if max(img.size) > max_edge:
+        img = img.copy()
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    while True:
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        data = buffer.getvalue()
+
+        if not max_bytes or len(data) <= max_bytes:
+            return data
+
+        # 先降品質，到底後再縮小尺寸
+        if quality > min_quality:
+            quality = max(min_quality, quality - 10)
+        elif max(img.size) > 256:
+            img = img.resize(
+                (int(img.width * 0.8), int(img.height * 0.8)),
+                Image.Resampling.LANCZOS
+            )
+        else:
+            return data
+
+def detect_subject_bbox(
+    img: Image.Image,
+    margin_ratio: float = 0.04
+) -> Tuple[Optional[Tuple[int, int, int, int]], float]:
+    """
+    以背景色差與邊緣強度偵測衣物主體範圍（不需 ML 模型）
+
+    以圖片四周邊框估計背景色，與背景色差異大或邊緣明顯的像素視為前景，
+    再由列 / 欄的前景比例找出主體外框。
+
+    Args:
+        img: RGB 圖片
+        margin_ratio: 外框四周保留的邊界比例
+
+    Returns:
+        (外框 (left, upper, right, lower) 或 None, 信心度 0-1)
+    """
+    # 縮小後計算即可，外框再換算回原尺寸
+    small = img.copy()
+    small.thumbnail((256, 256), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+    height, width = pixels.shape[:2]
+    if height < 16 or width < 16:
+        return None, 0.0
+
+    # 邊框像素估計背景
+    border = max(2, int(min(height, width) * 0.04))
+    border_mask = np.zeros((height, width), dtype=bool)
+    border_mask[:border, :] = True
+    border_mask[-border:, :] = True
+    border_mask[:, :border] = True
+    border_mask[:, -border:] = True
+
+    background = np.median(pixels[border_mask], axis=0)
+    color_diff = np.abs(pixels - background).max(axis=2)
+    border_noise = float(color_diff[border_mask].std())
+
+    # 灰階梯度強度
+    gray = pixels.mean(axis=2)
+    gradient = np.zeros_like(gray)
+    gradient[:, 1:] += np.abs(np.diff(gray, axis=1))
+    gradient[1:, :] += np.abs(np.diff(gray, axis=0))
+
+    color_threshold = max(24.0, 3.0 * border_noise)
+    foreground = (color_diff > color_threshold) | (gradient > 2.0 * color_threshold)
+
+    rows = np.flatnonzero(foreground.mean(axis=1) > 0.02)
+    cols = np.flatnonzero(foreground.mean(axis=0) > 0.02)
+    if rows.size == 0 or cols.size == 0:
+        return None, 0.0
+
+    # 信心度：背景越均勻、邊框內越少前景，越可信
+    uniformity = float(np.clip(1.0 - border_noise / 32.0, 0.0, 1.0))
+    border_clean = float(np.clip(1.0 - foreground[border_mask].mean() * 5.0, 0.0, 1.0))
+    bbox_area = (rows[-1] - rows[0] + 1) * (cols[-1] - cols[0] + 1) / (height * width)
+    size_score = 1.0 if bbox_area >= 0.05 else bbox_area / 0.05
+    confidence = uniformity * border_clean * size_score
+
+    scale_x = img.width / width
+    scale_y = img.height / height
+    margin_x = int(img.width * margin_ratio)
+    margin_y = int(img.height * margin_ratio)
+    bbox = (
+        max(0, int(cols[0] * scale_x) - margin_x),
+        max(0, int(rows[0] * scale_y) - margin_y),
+        min(img.width, int((cols[-1] + 1) * scale_x) + margin_x),
+        min(img.height, int((rows[-1] + 1) * scale_y) + margin_y)
+    )
+    return bbox, confidence
+
+def _scaled_pixels(size: Tuple[int, int], max_edge: int) -> int:
+    """縮放到最長邊不超過 max_edge 後的像素數 (與 encode_jpeg 相同)"""
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, round(width * scale)) * max(1, round(height * scale))
+
+def estimate_bytes_saved(
+    full_size: Tuple[int, int],
+    cropped_size: Tuple[int, int],
+    encoded: List[Tuple[int, int, int]]
+) -> int:
+    """
+    估算裁切省下的 bytes，不必再編碼一次未裁切的圖片
+
+    假設相同品質下每像素的 bytes 相同，依縮放後的像素比例推算未裁切時的大小。
+
+    Args:
+        full_size / cropped_size: 未裁切與裁切後的 (寬, 高)
+        encoded: 每個輸出的 (實際 bytes, 最長邊上限, 位元組預算，0 表示不限制)
+    """
+    saved = 0
+    for size, max_edge, max_bytes in encoded:
+        ratio = _scaled_pixels(full_size, max_edge) / _scaled_pixels(cropped_size, max_edge)
+        full_bytes = size * ratio
+        if max_bytes:
+            full_bytes = min(full_bytes, max(size, max_bytes))
+        saved += int(full_bytes) - size
+    return saved
+
+def legacy_image_hash(img: Image.Image) -> Optional[str]:
+    """
+    與先前上傳流程相同的圖片 hash：解碼後以 PIL 預設參數存成 JPEG 的 SHA256
+
+    資料庫中既有衣物的 image_hash 與標籤快取都以此為鍵，重複檢查必須沿用；
+    hash 只取決於上傳的圖片，不受縮圖、品質與裁切設定影響。
+    先前無法存成 JPEG 的模式 (透明圖等) 沒有既有資料，回傳 None。
+    """
+    buffer = io.BytesIO()
+    try:
+        img.save(buffer, format='JPEG')
+    except (OSError, ValueError):
+        return None
+    return hashlib.sha256(buffer.getvalue()).hexdigest()
+
+def prepare_image(raw_bytes: bytes, options: ImageOptions) -> PreparedImage:
+    """
+    解碼上傳檔案並產生 AI 與儲存用的 JPEG
+
+    Args:
+        raw_bytes: 上傳檔案的原始 bytes
+        options: 前處理參數
+
+    Returns:
+        PreparedImage
+    """
+    img = Image.open(io.BytesIO(raw_bytes))
+    original_size = img.size
+    image_hash = legacy_image_hash(img)
+    img = normalize_image(img)
+
+    full_img = img
+    crop_confidence = 0.0
+    if options.auto_crop:
+        bbox, crop_confidence = detect_subject_bbox(img)
+        # 信心不足或幾乎沒有可裁切的背景時保留原圖
+        if bbox and crop_confidence >= options.crop_min_confidence:
+            crop_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+            if crop_area < 0.9 * img.width * img.height:
+                img = img.crop(bbox)
+
+    storage_bytes = encode_jpeg(img, options.storage_max_edge, options.storage_quality)
+    ai_bytes = encode_jpeg(img, options.ai_max_edge, options.ai_quality, options.ai_max_bytes)
+
+    prepared = PreparedImage(
+        ai_bytes=ai_bytes,
+        storage_bytes=storage_bytes,
+        image_hash=image_hash or hashlib.sha256(storage_bytes).hexdigest(),
+        phash=compute_dhash_from_image(img),
+        original_size=original_size,
+        crop_confidence=crop_confidence
+    )
+
+    if img is not full_img:
+        # 統計省下的像素與 bytes（bytes 依像素比例估算，避免為了統計再編碼兩次原圖）
+        prepared.cropped = True
+        prepared.pixels_saved = full_img.width * full_img.height - img.width * img.height
+        prepared.bytes_saved = estimate_bytes_saved(full_img.size, img.size, [
+            (len(storage_bytes), options.storage_max_edge, 0),
+            (len(ai_bytes), options.ai_max_edge, options.ai_max_bytes)
+        ])
+
+    return prepared
+
+def build_montages(
+    img_bytes_list: List[bytes],
+    layout: MontageLayout,
+    quality: int = 85
+) -> List[bytes]:
+    """
+    將多張衣物圖片拼成附編號的網格圖
+
+    編號從 1 開始並跨拼圖連續，超過一張拼圖容量時會產生多張拼圖。
+
+    Args:
+        img_bytes_list: 圖片 bytes 列表 (依序對應編號 1..N)
+        layout: 格子設定
+        quality: 拼圖 JPEG 品質
+
+    Returns:
+        拼圖 JPEG bytes 列表
+    """
+    tile = layout.tile_size
+    label_size = max(16, tile // 8)
+    try:
+        font = ImageFont.load_default(size=label_size)
+    except TypeError:
+        font = ImageFont.load_default()
+
+    montages = []
+    per_montage = layout.tiles_per_montage
+    for start in range(0, len(img_bytes_list), per_montage):
+        chunk = img_bytes_list[start:start + per_montage]
+        rows = (len(chunk) + layout.columns - 1) // layout.columns
+        columns = min(layout.columns, len(chunk))
+        canvas = Image.new('RGB', (columns * tile, rows * tile), (255, 255, 255))
+        draw = ImageDraw.Draw(canvas)
+
+        for offset, img_bytes in enumerate(chunk):
+            img = normalize_image(Image.open(io.BytesIO(img_bytes)))
+            img.thumbnail((tile - 8, tile - 8), Image.Resampling.LANCZOS)
+
+            x = (offset % layout.columns) * tile
+            y = (offset // layout.columns) * tile
+            canvas.paste(img, (x + (tile - img.width) // 2, y + (tile - img.height) // 2))
+
+            # 格線與編號
+            draw.rectangle((x, y, x + tile - 1, y + tile - 1), outline=(180, 180, 180), width=2)
+            label = str(start + offset + 1)
+            draw.rectangle((x + 2, y + 2, x + 2 + label_size * (len(label) + 1), y + 2 + label_size + 8), fill=(0, 0, 0))
+            draw.text((x + 2 + label_size // 2, y + 4), label, fill=(255, 255, 255), font=font)
+
+        buffer = io.BytesIO()
+        canvas.save(buffer, format='JPEG', quality=quality, optimize=True)
+        montages.append(buffer.getvalue())
+
+    return montages
@@ -0,0 +1,215 @@
+"""
+衣物圖片靜態伺服器
+以內容雜湊作為網址 (/img/<image_hash>_<尺寸>.jpg)，回應長效 immutable 快取標頭，
+瀏覽器與代理伺服器可跨 rerun、跨 Session 重用同一張圖片，不必每次重新下載
+
+網址只由圖片 SHA256 組成，無法從網址推得其他圖片；同一張圖片的內容永不改變，因此可永久快取。
+存放的檔案依總大小與最後使用時間淘汰，衣物刪除時一併移除其圖片檔。
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional, Tuple
+from utils.display_cache import get_display_cache
+
+_PATH_PATTERN = re.compile(r"^/img/([0-9a-f]{64})_(\d+)\.jpg$")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 檢查過期檔案的最短間隔 (秒)
+PRUNE_INTERVAL = 300
+
+def _make_handler(store_dir: str):
+    class ImageRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = _PATH_PATTERN.match(self.path.split("?", 1)[0])
+            if not match:
+                self.send_error(404)
+                return
+
+            etag = f'"{match.group(1)}_{match.group(2)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            file_path = os.path.join(store_dir, f"{match.group(1)}_{match.group(2)}.jpg")
+            try:
+                with open(file_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ImageRequestHandler
+
+class ImageServer:
+    """在背景執行緒中提供內容定址圖片的 HTTP 伺服器"""
+
+    def __init__(
+        self,
+        store_dir: str,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        public_url: str = "",
+        max_bytes: int = 0,
+        max_age_seconds: float = 0
+    ):
+        """
+        Args:
+            store_dir: 圖片檔存放資料夾
+            host: 監聽位址，預設只接受本機連線（其他機器的瀏覽器應經反向代理存取，並設定 public_url）
+            port: 監聽埠
+            public_url: 瀏覽器存取伺服器的網址（例如經反向代理時），預設為 http://localhost:<port>
+            max_bytes: 圖片檔總大小上限，超過時刪除最久未使用的檔案（0 表示不限制）
+            max_age_seconds: 超過此時間未使用的檔案會被刪除（0 表示不限制）
+        """
+        self.store_dir = store_dir
+        self.host = host
+        self.port = port
+        self.public_url = (public_url or f"http://localhost:{port}").rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.running = False
+        # 已存在的檔案 {檔名: (bytes, 最後使用時間)}，依最後使用排序，避免每次渲染都檢查檔案
+        self._files: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self.stored_bytes = 0
+        self.evictions = 0
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """登錄上次執行留下的檔案（以修改時間作為最後使用時間）並套用上限"""
+        existing = []
+        for entry in os.scandir(self.store_dir):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".tmp"):
+                # 寫到一半中斷的暫存檔
+                self._unlink(entry.name)
+                continue
+            if _PATH_PATTERN.match(f"/img/{entry.name}"):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for mtime, name, size in sorted(existing):
+                self._files[name] = (size, mtime)
+                self.stored_bytes += size
+        self.prune()
+
+    def _unlink(self, file_name: str):
+        try:
+            os.remove(os.path.join(self.store_dir, file_name))
+        except OSError:
+            pass
+
+    def _drop(self, file_name: str):
+        """從清單移除並刪除檔案（呼叫端需持有鎖）"""
+        size, _ = self._files.pop(file_name)
+        self.stored_bytes -= size
+        self._unlink(file_name)
+
+    def prune(self):
+        """刪除過期與超出大小上限的檔案（最久未使用的優先）"""
+        now = time.time()
+        with self._lock:
+            self._last_prune = now
+            if self.max_age_seconds:
+                for file_name, (_, last_used) in list(self._files.items()):
+                    if now - last_used <= self.max_age_seconds:
+                        break
+                    self._drop(file_name)
+                    self.evictions += 1
+            # 至少保留最近使用的一個檔案（剛寫入的檔案即使超過上限也要能提供）
+            while self.max_bytes and self.stored_bytes > self.max_bytes and len(self._files) > 1:
+                self._drop(next(iter(self._files)))
+                self.evictions += 1
+
+    def remove(self, image_hashes: Iterable[Optional[str]]) -> int:
+        """刪除圖片的所有尺寸檔案（衣物刪除後不再能透過網址取得），回傳刪除的檔案數"""
+        prefixes = tuple(f"{image_hash}_" for image_hash in image_hashes if image_hash)
+        if not prefixes:
+            return 0
+        with self._lock:
+            names = [name for name in self._files if name.startswith(prefixes)]
+            for file_name in names:
+                self._drop(file_name)
+        return len(names)
+
+    def start(self) -> bool:
+        """啟動伺服器，失敗時（例如埠已被佔用）回傳 False，畫面會改用內嵌圖片"""
+        if self.running:
+            return True
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), _make_handler(self.store_dir))
+        except OSError as e:
+            print(f"圖片伺服器啟動失敗: {str(e)}")
+            return False
+
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="image-server", daemon=True).start()
+        self.running = True
+        return True
+
+    def url_for(self, image_hash: Optional[str], image_data, max_edge: int) -> Optional[str]:
+        """
+        取得圖片網址，第一次使用時將縮放後的圖片寫入檔案
+
+        image_data 可為 base64 字串或回傳它的函式（見 DisplayImageCache.get）
+
+        Returns:
+            圖片網址；伺服器未啟動、缺少 hash 或解碼失敗時回傳 None
+        """
+        if not self.running or not image_hash or not _PATH_PATTERN.match(f"/img/{image_hash}_{max_edge}.jpg"):
+            return None
+
+        file_name = f"{image_hash}_{max_edge}.jpg"
+        now = time.time()
+        with self._lock:
+            entry = self._files.get(file_name)
+            if entry is not None:
+                self._files[file_name] = (entry[0], now)
+                self._files.move_to_end(file_name)
+
+        if entry is None:
+            data = get_display_cache().get(image_hash, image_data, max_edge)
+            if data is None:
+                return None
+            # 先寫入暫存檔再改名，避免伺服器讀到寫到一半的檔案
+            file_path = os.path.join(self.store_dir, file_name)
+            tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+            with self._lock:
+                previous = self._files.pop(file_name, None)
+                self.stored_bytes += len(data) - (previous[0] if previous else 0)
+                self._files[file_name] = (len(data), now)
+
+        if entry is None or now - self._last_prune > PRUNE_INTERVAL:
+            self.prune()
+        return f"{self.public_url}/img/{file_name}"
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        self.running = False
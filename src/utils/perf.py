@@ -0,0 +1,163 @@
+"""
+效能計時工具
+以裝飾器記錄服務方法與頁面渲染的耗時，程序內彙總次數、p50 / p95、傳輸量與錯誤數，
+可匯出為 JSON 或 Prometheus 文字格式
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+class _Stat:
+    """單一名稱的統計（保留最近的樣本計算百分位數）"""
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_bytes = 0
+        self.samples = deque(maxlen=max_samples)
+
+class PerfRegistry:
+    """程序內共用的計時統計"""
+
+    def __init__(self, max_samples: int = 512):
+        self.max_samples = max_samples
+        self._stats: Dict[str, _Stat] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, error: bool = False):
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None:
+                stat = self._stats[name] = _Stat(self.max_samples)
+            stat.count += 1
+            stat.total_seconds += seconds
+            stat.max_seconds = max(stat.max_seconds, seconds)
+            stat.total_bytes += nbytes
+            stat.samples.append(seconds)
+            if error:
+                stat.errors += 1
+
+    @staticmethod
+    def _percentile(sorted_samples: list, q: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        index = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+        return sorted_samples[index]
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        目前的統計
+
+        Returns:
+            {名稱: {"count", "errors", "total_s", "p50_ms", "p95_ms", "max_ms", "bytes"}}
+        """
+        with self._lock:
+            stats = {name: (stat, sorted(stat.samples)) for name, stat in self._stats.items()}
+
+        return {
+            name: {
+                "count": stat.count,
+                "errors": stat.errors,
+                "total_s": round(stat.total_seconds, 4),
+                "p50_ms": round(self._percentile(samples, 0.5) * 1000, 2),
+                "p95_ms": round(self._percentile(samples, 0.95) * 1000, 2),
+                "max_ms": round(stat.max_seconds * 1000, 2),
+                "bytes": stat.total_bytes
+            }
+            for name, (stat, samples) in stats.items()
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = "wardrobe_app") -> str:
+        """以 Prometheus 文字格式匯出（summary + counters）"""
+        lines = [
+            f"# HELP {prefix}_call_seconds Duration of instrumented calls.",
+            f"# TYPE {prefix}_call_seconds summary"
+        ]
+        snapshot = self.snapshot()
+        for name, stat in sorted(snapshot.items()):
+            label = f'name="{name}"'
+            lines.append(f'{prefix}_call_seconds{{{label},quantile="0.5"}} {round(stat["p50_ms"] / 1000, 6)}')
+            lines.append(f'{prefix}_call_seconds{{{label},quantile="0.95"}} {round(stat["p95_ms"] / 1000, 6)}')
+            lines.append(f"{prefix}_call_seconds_sum{{{label}}} {stat['total_s']}")
+            lines.append(f"{prefix}_call_seconds_count{{{label}}} {stat['count']}")
+
+        for metric, key, help_text in (
+            ("call_errors_total", "errors", "Instrumented calls that raised."),
+            ("call_bytes_total", "bytes", "Payload bytes handled by instrumented calls.")
+        ):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, stat in sorted(snapshot.items()):
+                lines.append(f'{prefix}_{metric}{{name="{name}"}} {stat[key]}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+# 程序內共用的統計
+_registry = PerfRegistry()
+
+def get_registry() -> PerfRegistry:
+    return _registry
+
+def timed(name: Optional[str] = None, bytes_fn: Optional[Callable] = None):
+    """
+    計時裝飾器
+
+    Args:
+        name: 統計名稱，預設為函式的 __qualname__ (例如 WardrobeService.get_wardrobe)
+        bytes_fn: bytes_fn(result, *args, **kwargs) 回傳本次處理的 bytes 數
+    """
+    def decorator(func):
+        metric_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                # st.rerun / st.stop 以 BaseException 中斷執行，不算錯誤
+                _registry.record(metric_name, time.perf_counter() - started, error=isinstance(e, Exception))
+                raise
+            nbytes = 0
+            if bytes_fn is not None:
+                try:
+                    nbytes = bytes_fn(result, *args, **kwargs) or 0
+                except Exception:
+                    nbytes = 0
+            _registry.record(metric_name, time.perf_counter() - started, nbytes)
+            return result
+
+        wrapper.__timed__ = True
+        return wrapper
+    return decorator
+
+def instrument(cls):
+    """
+    類別裝飾器：為所有公開方法加上計時
+
+    已個別以 @timed 裝飾的方法、property 與 generator 方法不會重複處理。
+    """
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_"):
+            continue
+        if isinstance(value, staticmethod):
+            func = value.__func__
+            if not getattr(func, "__timed__", False) and not inspect.isgeneratorfunction(func):
+                setattr(cls, attr, staticmethod(timed()(func)))
+        elif inspect.isfunction(value):
+            if not getattr(value, "__timed__", False) and not inspect.isgeneratorfunction(value):
+                setattr(cls, attr, timed()(value))
+    return cls
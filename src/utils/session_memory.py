@@ -0,0 +1,195 @@
+"""
+Session State 記憶體統計
+估算每個 Session 的 st.session_state 佔用量（依鍵細分），超過預算時捨棄可重建的鍵，
+並在程序內保留各 Session 的最近統計，找出佔用最多的 Session
+"""
+import sys
+import threading
+import time
+import types
+from typing import Dict, Iterable, List, Optional
+
+# 可以捨棄的鍵：讀取端會在缺少時重新初始化並從共用快取或服務重建
+# 只列一般的鍵：元件 (widget) 的值由前端每次執行時送回，捨棄也無法釋放
+REBUILDABLE_KEYS = (
+    "processed_files",       # 上傳頁重新初始化，已上傳的檔案改由原始檔 hash 判定為重複
+    "selected_items",        # 批次刪除的選取，衣櫥頁由勾選框狀態重建
+    "recommended_item_ids",  # 由 ai_recommendation 重新解析
+    "weather_data",          # 天氣小工具重新查詢（WeatherService 有跨 Session 快取）
+    "rerun_timings"
+)
+
+# 跨 Session 共用的物件（st.cache_resource 取得），不計入個別 Session
+SHARED_KEYS = ("supabase_client",)
+
+# 不往下追蹤的型別（類別、模組、函式等屬於程序而非 Session）
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+def estimate_size(obj, seen: Optional[set] = None) -> int:
+    """
+    估算物件（含其內容）佔用的 bytes
+
+    走訪容器、dataclass 與一般物件的屬性，同一物件只計算一次。
+    BytesIO (上傳的檔案) 的 sys.getsizeof 已包含緩衝區大小。
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, _OPAQUE_TYPES):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, seen) + estimate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += estimate_size(value, seen)
+    else:
+        attrs = getattr(obj, "__dict__", None)
+        if attrs is not None:
+            size += estimate_size(attrs, seen)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += estimate_size(getattr(obj, slot), seen)
+    return size
+
+def measure_state(state: dict, shared_keys: Iterable[str] = SHARED_KEYS) -> Dict[str, int]:
+    """各鍵佔用的 bytes（共用物件不計）"""
+    shared = set(shared_keys)
+    seen: set = set()
+    return {
+        str(key): estimate_size(value, seen)
+        for key, value in state.items()
+        if key not in shared
+    }
+
+def enforce_budget(
+    state,
+    sizes: Dict[str, int],
+    budget_bytes: int,
+    rebuildable_keys: Iterable[str] = REBUILDABLE_KEYS
+) -> List[str]:
+    """
+    超過預算時由大到小捨棄可重建的鍵
+
+    Args:
+        state: st.session_state (或任何支援 del 的對應)
+        sizes: measure_state 的結果，捨棄的鍵會同步移除
+        budget_bytes: 預算，0 表示不限制
+
+    Returns:
+        被捨棄的鍵
+    """
+    if budget_bytes <= 0:
+        return []
+
+    evicted = []
+    total = sum(sizes.values())
+    candidates = sorted(
+        (key for key in rebuildable_keys if sizes.get(key)),
+        key=lambda key: sizes[key],
+        reverse=True
+    )
+    for key in candidates:
+        if total <= budget_bytes:
+            break
+        try:
+            del state[key]
+        except KeyError:
+            continue
+        total -= sizes.pop(key)
+        evicted.append(key)
+    return evicted
+
+class SessionMemoryRegistry:
+    """程序內各 Session 最近一次的 Session State 統計（超過 max_age_seconds 未更新者視為已結束）"""
+
+    def __init__(self, max_age_seconds: float = 3600, top_keys: int = 5):
+        self.max_age_seconds = max_age_seconds
+        self.top_keys = top_keys
+        self._sessions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.total_evictions = 0
+
+    def update(
+        self,
+        session_id: str,
+        user: Optional[str],
+        sizes: Dict[str, int],
+        budget_bytes: int,
+        evicted: Optional[List[str]] = None
+    ) -> dict:
+        """記錄 Session 的統計並回傳該筆紀錄"""
+        now = time.time()
+        total = sum(sizes.values())
+        top = sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:self.top_keys]
+        with self._lock:
+            previous = self._sessions.get(session_id, {})
+            entry = {
+                "session_id": session_id,
+                "user": user,
+                "total_bytes": total,
+                "peak_bytes": max(total, previous.get("peak_bytes", 0)),
+                "keys": len(sizes),
+                "top_keys": dict(top),
+                "over_budget": bool(budget_bytes) and total > budget_bytes,
+                "evictions": previous.get("evictions", 0) + len(evicted or []),
+                "updated_at": now
+            }
+            self._sessions[session_id] = entry
+            self.total_evictions += len(evicted or [])
+            self._prune(now)
+        return entry
+
+    def _prune(self, now: float):
+        """移除過久未更新的 Session（呼叫端需持有鎖）"""
+        expired = [
+            session_id for session_id, entry in self._sessions.items()
+            if now - entry["updated_at"] > self.max_age_seconds
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+    def largest(self, limit: int = 10, user: Optional[str] = None) -> List[dict]:
+        """佔用最多的 Session（大到小），指定 user 時只列出該使用者的 Session"""
+        with self._lock:
+            self._prune(time.time())
+            entries = [
+                dict(entry) for entry in self._sessions.values()
+                if user is None or entry["user"] == user
+            ]
+        entries.sort(key=lambda entry: entry["total_bytes"], reverse=True)
+        return entries[:limit]
+
+    def get_stats(self) -> dict:
+        """所有 Session 的合計"""
+        with self._lock:
+            self._prune(time.time())
+            totals = [entry["total_bytes"] for entry in self._sessions.values()]
+            over_budget = sum(1 for entry in self._sessions.values() if entry["over_budget"])
+        return {
+            "sessions": len(totals),
+            "total_bytes": sum(totals),
+            "max_bytes": max(totals, default=0),
+            "over_budget": over_budget,
+            "evictions": self.total_evictions
+        }
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._sessions.clear()
+            self.total_evictions = 0
+
+# 程序內共用的統計
+_session_registry = SessionMemoryRegistry()
+
+def get_session_registry() -> SessionMemoryRegistry:
+    return _session_registry
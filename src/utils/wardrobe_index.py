@@ -0,0 +1,217 @@
+"""
+衣櫥欄式索引
+以 NumPy 陣列保存每件衣物的中繼資料（類別、顏色、風格以整數代碼表示），
+分類統計與依類別 / 顏色 / 風格 / 保暖度的篩選都以向量運算完成，
+新增與刪除衣物時直接更新陣列，不需重新讀取整個衣櫥
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 以代碼保存的欄位
+CATEGORICAL_COLUMNS = ("category", "color", "style")
+# 空值的代表名稱（統計與篩選都使用）
+UNCATEGORIZED = "其他"
+
+def _field(item, name: str):
+    """從 ClothingItem 或資料列 dict 取值"""
+    return item.get(name) if isinstance(item, dict) else getattr(item, name)
+
+def _timestamp(value: Union[datetime, str, None]) -> float:
+    if not value:
+        return 0.0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+class _Vocabulary:
+    """字串與整數代碼的對照（代碼只增不減，空值視為「其他」）"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        value = value or UNCATEGORIZED
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values: Iterable[str]) -> np.ndarray:
+        """已知值的代碼（未出現過的值略過）"""
+        return np.array([self.codes[value] for value in values if value in self.codes], dtype=np.int32)
+
+class WardrobeIndex:
+    """
+    單一使用者衣櫥的欄式索引
+
+    陣列依加入順序存放，刪除時只標記 (alive = False)，
+    已刪除的列超過一半時才壓縮。查詢結果依 created_at 新到舊排序，與衣櫥頁面的順序一致。
+    索引跨 Session 共用，更新與查詢以鎖保護。
+    """
+
+    def __init__(self, capacity: int = 64):
+        capacity = max(capacity, 16)
+        self._size = 0
+        self._dead = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.warmth = np.zeros(capacity, dtype=np.int16)
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.codes = {column: np.zeros(capacity, dtype=np.int32) for column in CATEGORICAL_COLUMNS}
+        self.vocab = {column: _Vocabulary() for column in CATEGORICAL_COLUMNS}
+        self._positions: Dict[int, int] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, items: Sequence) -> 'WardrobeIndex':
+        """從 ClothingItem 或資料列建立（需含 id、category、color、style、warmth、created_at）"""
+        index = cls(capacity=len(items) * 2)
+        index.add(items)
+        return index
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._positions
+
+    def _reserve(self, needed: int):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ("ids", "warmth", "created", "alive"):
+            array = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+        for column, array in self.codes.items():
+            grown = np.zeros(new_capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self.codes[column] = grown
+
+    def add(self, items: Sequence):
+        """新增衣物（已存在的 id 會先移除再加入，等同更新）"""
+        items = [item for item in items if _field(item, "id") is not None]
+        if not items:
+            return
+        with self._lock:
+            self.remove([_field(item, "id") for item in items])
+            self._reserve(self._size + len(items))
+
+            start = self._size
+            end = start + len(items)
+            self.ids[start:end] = [_field(item, "id") for item in items]
+            self.warmth[start:end] = [_field(item, "warmth") or 0 for item in items]
+            self.created[start:end] = [_timestamp(_field(item, "created_at")) for item in items]
+            self.alive[start:end] = True
+            for column in CATEGORICAL_COLUMNS:
+                vocab = self.vocab[column]
+                self.codes[column][start:end] = [vocab.encode(_field(item, column)) for item in items]
+
+            for position in range(start, end):
+                self._positions[int(self.ids[position])] = position
+            self._size = end
+
+    def remove(self, item_ids: Iterable[int]) -> int:
+        """移除衣物，回傳實際移除的件數"""
+        removed = 0
+        with self._lock:
+            for item_id in item_ids:
+                position = self._positions.pop(item_id, None)
+                if position is not None:
+                    self.alive[position] = False
+                    removed += 1
+            self._dead += removed
+            if self._dead and self._dead * 2 > self._size:
+                self._compact()
+        return removed
+
+    def _compact(self):
+        """移除已刪除的列（呼叫端需持有鎖）"""
+        keep = np.flatnonzero(self.alive[:self._size])
+        size = len(keep)
+        for name in ("ids", "warmth", "created", "alive"):
+            array = getattr(self, name)
+            array[:size] = array[keep]
+            array[size:self._size] = 0
+        for array in self.codes.values():
+            array[:size] = array[keep]
+        self._size = size
+        self._dead = 0
+        self._positions = {int(item_id): position for position, item_id in enumerate(self.ids[:size])}
+
+    def _mask(
+        self,
+        category: Optional[Iterable[str]] = None,
+        color: Optional[Iterable[str]] = None,
+        style: Optional[Iterable[str]] = None,
+        warmth_range: Optional[Tuple[int, int]] = None
+    ) -> np.ndarray:
+        """符合條件的列（呼叫端需持有鎖）"""
+        mask = self.alive[:self._size].copy()
+        for column, values in (("category", category), ("color", color), ("style", style)):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            mask &= np.isin(self.codes[column][:self._size], self.vocab[column].lookup(values))
+        if warmth_range is not None:
+            low, high = warmth_range
+            warmth = self.warmth[:self._size]
+            mask &= (warmth >= low) & (warmth <= high)
+        return mask
+
+    def query(
+        self,
+        category: Optional[Iterable[str]] = None,
+        color: Optional[Iterable[str]] = None,
+        style: Optional[Iterable[str]] = None,
+        warmth_range: Optional[Tuple[int, int]] = None
+    ) -> List[int]:
+        """
+        符合所有條件的衣物 id（新到舊）
+
+        Args:
+            category / color / style: 允許的值（None 表示不限制）
+            warmth_range: (最低, 最高) 保暖度，包含兩端
+        """
+        with self._lock:
+            positions = np.flatnonzero(self._mask(category, color, style, warmth_range))
+            order = np.argsort(-self.created[positions], kind="stable")
+            return self.ids[positions[order]].tolist()
+
+    def count(self, **filters) -> int:
+        """符合條件的件數（參數同 query）"""
+        with self._lock:
+            return int(np.count_nonzero(self._mask(**filters)))
+
+    def value_counts(self, column: str, **filters) -> Dict[str, int]:
+        """欄位各值的件數（多到少），可加上與 query 相同的篩選條件"""
+        vocab = self.vocab[column]
+        with self._lock:
+            mask = self._mask(**filters)
+            counts = np.bincount(self.codes[column][:self._size][mask], minlength=len(vocab.values))
+        codes = np.flatnonzero(counts)
+        codes = codes[np.argsort(-counts[codes], kind="stable")]
+        return {vocab.values[code]: int(counts[code]) for code in codes}
+
+    def category_counts(self) -> Dict[str, int]:
+        return self.value_counts("category")
+
+    def values(self, column: str) -> List[str]:
+        """欄位目前出現的值（依件數多到少）"""
+        return list(self.value_counts(column))
+
+    def warmth_bounds(self) -> Tuple[int, int]:
+        """目前衣物的保暖度範圍"""
+        with self._lock:
+            warmth = self.warmth[:self._size][self.alive[:self._size]]
+        if not len(warmth):
+            return 0, 0
+        return int(warmth.min()), int(warmth.max())
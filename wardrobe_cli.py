@@ -0,0 +1,313 @@
+"""
+衣櫥命令列工具
+離線批次匯入照片資料夾、匯出與還原衣櫥，重用 WardrobeService 與 AIService
+
+用法:
+    python wardrobe_cli.py import ./photos --username alice
+    python wardrobe_cli.py import ./photos --username alice --checkpoint alice.ckpt.json
+    python wardrobe_cli.py export alice.tar.gz --username alice
+    python wardrobe_cli.py restore alice.tar.gz --username bob
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from dotenv import load_dotenv
+from config import AppConfig
+from database.models import ClothingItem
+from database.supabase_client import SupabaseClient
+from api.ai_service import AIService
+from api.backup_service import BackupService
+from api.batch_tuner import AdaptiveBatchSizer
+from api.tag_cache import TagCache
+from api.upload_scheduler import UploadCandidate, UploadScheduler, iter_batches
+from api.wardrobe_service import WardrobeService
+from utils.image_hash import BKTree, compute_raw_hash
+from utils.image_pipeline import prepare_images
+from utils.image_processing import ImageOptions
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+class Checkpoint:
+    """匯入進度檔，記錄每個檔案的處理結果以便中斷後續傳"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}  # {相對路徑: {"status": ..., "name": ...}}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def mark(self, rel_path: str, status: str, name: str = ""):
+        self.files[rel_path] = {"status": status, "name": name}
+
+    def save(self):
+        """寫入暫存檔後取代，避免中斷時留下損壞的進度檔"""
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+def _build_wardrobe_service(config: AppConfig) -> WardrobeService:
+    return WardrobeService(SupabaseClient(config.supabase_url, config.supabase_key))
+
+def _build_services(config: AppConfig, rate_limit: int):
+    """建立 CLI 使用的服務"""
+    wardrobe_service = _build_wardrobe_service(config)
+    ai_service = AIService(
+        config.gemini_api_key,
+        rate_limit,
+        TagCache(config.tag_cache_path, config.tag_cache_use_phash, config.tag_cache_phash_distance)
+            if config.tag_cache_enabled else None,
+        batch_sizer=AdaptiveBatchSizer(
+            min_size=config.batch_size_min,
+            max_size=config.max_batch_upload,
+            target_seconds=config.batch_target_seconds,
+            max_payload_bytes=config.batch_max_payload_kb * 1024
+        ) if config.adaptive_batch_size else None
+    )
+    return ai_service, wardrobe_service
+
+def _resolve_user_id(args, wardrobe_service: WardrobeService):
+    user_id = args.user_id or wardrobe_service.get_user_id(args.username)
+    if not user_id:
+        print(f"找不到使用者: {args.username}")
+    return user_id
+
+def _find_images(directory: str) -> list:
+    """遞迴列出資料夾內的圖片（依路徑排序，確保續傳時順序一致）"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, file_name))
+    return sorted(paths)
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return compute_raw_hash(f)
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def cmd_import(args, config: AppConfig) -> int:
+    """匯入資料夾內的衣物照片"""
+    ai_service, wardrobe_service = _build_services(config, args.rate_limit)
+
+    user_id = _resolve_user_id(args, wardrobe_service)
+    if not user_id:
+        return 1
+
+    directory = os.path.abspath(args.directory)
+    checkpoint = Checkpoint(args.checkpoint)
+    all_paths = _find_images(directory)
+    pending = [p for p in all_paths if os.path.relpath(p, directory) not in checkpoint.files]
+    print(f"📁 找到 {len(all_paths)} 張圖片，其中 {len(all_paths) - len(pending)} 張已在進度檔中")
+    if not pending:
+        return 0
+
+    started = time.time()
+    stats = {"duplicate": 0, "failed": 0, "saved": 0}
+
+    # === 階段 1: 平行計算原始檔案 hash，排除重複 ===
+    raw_index = wardrobe_service.get_raw_hash_index(user_id)
+    if raw_index is None:
+        # 讀取失敗時不逐檔重試，改由階段 2 的圖片 hash 檢查重複
+        print("⚠️ 無法讀取既有檔案的 hash，略過快速重複檢查")
+        raw_index = {}
+    new_paths, new_raw_hashes, seen_raw_hashes = [], [], set()
+    with ThreadPoolExecutor(max_workers=args.hash_workers) as pool:
+        for path, raw_hash in zip(pending, pool.map(_hash_file, pending)):
+            rel_path = os.path.relpath(path, directory)
+            existing_name = raw_index.get(raw_hash)
+            if existing_name is not None or raw_hash in seen_raw_hashes:
+                stats["duplicate"] += 1
+                checkpoint.mark(rel_path, "duplicate", existing_name or "")
+                continue
+            new_paths.append(path)
+            new_raw_hashes.append(raw_hash)
+            seen_raw_hashes.add(raw_hash)
+    checkpoint.save()
+    print(f"🔑 hash 完成: {len(new_paths)} 張新檔案，{stats['duplicate']} 張重複")
+
+    # === 階段 2: 平行前處理並排除重複 (於標籤上一批時進行) ===
+    existing_hashes = wardrobe_service.get_image_hashes(user_id)
+    options = ImageOptions.from_config(config)
+
+    def iter_candidates():
+        batch_phash_index = BKTree()
+        prepared_results = prepare_images(
+            (_read_file(path) for path in new_paths),
+            options,
+            max_workers=args.workers,
+            max_in_flight=args.workers * 2 if args.workers else 0
+        )
+        for path, raw_hash, (prepared, error) in zip(new_paths, new_raw_hashes, prepared_results):
+            rel_path = os.path.relpath(path, directory)
+            if error:
+                stats["failed"] += 1
+                checkpoint.mark(rel_path, "failed", error)
+                print(f"❌ {rel_path} 讀取失敗: {error}")
+                continue
+
+            if prepared.image_hash in existing_hashes:
+                stats["duplicate"] += 1
+                checkpoint.mark(rel_path, "duplicate")
+                continue
+
+            if config.near_duplicate_check:
+                matches = wardrobe_service.find_near_duplicates(
+                    user_id, prepared.phash, config.near_duplicate_distance
+                ) or batch_phash_index.search(prepared.phash, config.near_duplicate_distance)
+                if matches:
+                    stats["duplicate"] += 1
+                    checkpoint.mark(rel_path, "duplicate", str(matches[0][1]))
+                    continue
+                batch_phash_index.add(prepared.phash, rel_path)
+
+            existing_hashes.add(prepared.image_hash)
+            yield UploadCandidate(rel_path, raw_hash, prepared)
+
+    # === 階段 3: 依速率限制分批標籤並批次寫入 ===
+    next_batch_size = ai_service.suggest_batch_size if ai_service.batch_sizer else lambda: args.batch_size
+    scheduler = UploadScheduler(ai_service, user_id)
+
+    for batch, tags_list in scheduler.run(iter_batches(iter_candidates(), next_batch_size)):
+        if not tags_list:
+            stats["failed"] += len(batch)
+            print(f"❌ {len(batch)} 張辨識失敗，下次執行會重試")
+            continue
+
+        items = []
+        for candidate, tags in zip(batch, tags_list):
+            item = ClothingItem(
+                name=tags['name'],
+                category=tags['category'],
+                color=tags['color'],
+                style=tags.get('style', ''),
+                warmth=tags['warmth'],
+                image_hash=candidate.prepared.image_hash,
+                phash=candidate.prepared.phash,
+                raw_hash=candidate.raw_hash,
+                user_id=user_id
+            )
+            items.append((item, candidate.prepared.storage_bytes))
+
+        success, result = wardrobe_service.save_items(items)
+        if success:
+            stats["saved"] += len(items)
+            for candidate, (item, _) in zip(batch, items):
+                checkpoint.mark(candidate.file_name, "done", item.name)
+        else:
+            stats["failed"] += len(items)
+            print(f"❌ 寫入失敗: {result}")
+        checkpoint.save()
+
+        elapsed = time.time() - started
+        done = stats["saved"] + stats["duplicate"] + stats["failed"]
+        print(
+            f"✅ {done}/{len(pending)} · 已存 {stats['saved']} · "
+            f"{done / elapsed:.2f} 張/秒 · API {ai_service.usage.total_calls} 次 · "
+            f"送出 {ai_service.usage.total_request_bytes / 1024 / 1024:.1f} MB · "
+            f"{ai_service.usage.total_tokens} tokens"
+        )
+
+    checkpoint.save()
+    elapsed = time.time() - started
+    processed = stats["saved"] + stats["duplicate"] + stats["failed"]
+    print("\n=== 匯入完成 ===")
+    print(f"已存入: {stats['saved']}  重複: {stats['duplicate']}  失敗: {stats['failed']}")
+    print(f"耗時: {elapsed:.1f} 秒 ({processed / elapsed:.2f} 張/秒)")
+    usage = ai_service.usage
+    print(
+        f"API 呼叫: {usage.total_calls} 次，送出 {usage.total_request_bytes / 1024 / 1024:.2f} MB，"
+        f"{usage.total_tokens} tokens"
+    )
+    tag_usage = usage.summary().get("tag")
+    if tag_usage:
+        print(
+            f"每張圖片: {tag_usage['tokens_per_image']} tokens / {tag_usage['bytes_per_image'] / 1024:.0f} KB，"
+            f"平均延遲 {tag_usage['avg_latency']:.1f} 秒 (p95 {tag_usage['p95_latency']:.1f} 秒)"
+        )
+    if ai_service.tag_cache:
+        print(f"標籤快取命中: {ai_service.tag_cache.hits} 張")
+    return 0 if stats["failed"] == 0 else 2
+
+def cmd_export(args, config: AppConfig) -> int:
+    """匯出衣櫥到 tar 檔"""
+    wardrobe_service = _build_wardrobe_service(config)
+    user_id = _resolve_user_id(args, wardrobe_service)
+    if not user_id:
+        return 1
+
+    started = time.time()
+    stats = BackupService(wardrobe_service).export_wardrobe(user_id, args.output, args.page_size)
+    print(
+        f"📦 已匯出 {stats['items']} 件衣物、{stats['images']} 張圖片 "
+        f"({stats['image_bytes'] / 1024 / 1024:.1f} MB)，耗時 {time.time() - started:.1f} 秒 → {args.output}"
+    )
+    return 0
+
+def cmd_restore(args, config: AppConfig) -> int:
+    """從 tar 檔還原衣櫥"""
+    wardrobe_service = _build_wardrobe_service(config)
+    user_id = _resolve_user_id(args, wardrobe_service)
+    if not user_id:
+        return 1
+
+    def report(stats):
+        print(f"✅ 已還原 {stats['restored']} · 重複 {stats['duplicate']} · 失敗 {stats['failed']}")
+
+    stats = BackupService(wardrobe_service).restore_wardrobe(user_id, args.archive, args.batch_size, report)
+    print("\n=== 還原完成 ===")
+    print(f"已還原: {stats['restored']}  重複: {stats['duplicate']}  失敗: {stats['failed']}  缺少圖片: {stats['missing']}")
+    return 0 if stats["failed"] == 0 else 2
+
+def _add_user_arguments(parser: argparse.ArgumentParser):
+    user_group = parser.add_mutually_exclusive_group(required=True)
+    user_group.add_argument("--username", help="使用者名稱")
+    user_group.add_argument("--user-id", help="使用者 ID")
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="衣櫥命令列工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="匯入資料夾內的衣物照片")
+    import_parser.add_argument("directory", help="照片資料夾")
+    _add_user_arguments(import_parser)
+    import_parser.add_argument("--checkpoint", help="進度檔路徑（中斷後以相同路徑重新執行即可續傳）")
+    import_parser.add_argument("--workers", type=int, default=0, help="前處理 process 數 (0 = CPU 核心數)")
+    import_parser.add_argument("--hash-workers", type=int, default=4, help="計算 hash 的執行緒數")
+    import_parser.add_argument("--batch-size", type=int, default=10, help="未啟用自動調整時的批次大小")
+    import_parser.add_argument("--rate-limit", type=int, help="API 請求間隔秒數（預設使用設定值）")
+    import_parser.set_defaults(handler=cmd_import)
+
+    export_parser = subparsers.add_parser("export", help="匯出衣櫥到 tar 檔 (.tar / .tar.gz)")
+    export_parser.add_argument("output", help="輸出檔案路徑")
+    _add_user_arguments(export_parser)
+    export_parser.add_argument("--page-size", type=int, default=50, help="每次查詢的筆數")
+    export_parser.set_defaults(handler=cmd_export)
+
+    restore_parser = subparsers.add_parser("restore", help="從 tar 檔還原衣櫥（略過已存在的圖片）")
+    restore_parser.add_argument("archive", help="備份檔路徑")
+    _add_user_arguments(restore_parser)
+    restore_parser.add_argument("--batch-size", type=int, default=20, help="每次寫入的筆數")
+    restore_parser.set_defaults(handler=cmd_restore)
+
+    args = parser.parse_args()
+    config = AppConfig.from_env()
+    if getattr(args, "rate_limit", None) is None:
+        args.rate_limit = config.api_rate_limit_seconds
+    sys.exit(args.handler(args, config))
+
+if __name__ == "__main__":
+    main()